@@ -38,6 +38,8 @@ import ctypes
 import random
 import traceback
 
+import numpy as np
+
 import gpu
 import bpy
 from bpy_extras.view3d_utils import region_2d_to_origin_3d
@@ -129,30 +131,39 @@ class BufferedRender_Batch:
         self.batch = None
         self._quarantine.setdefault(self.shader, set())
 
+    # corner offsets of the two triangles that make up each point / line quad
+    _point_offsets = np.array([(0,0), (1,0), (0,1), (0,1), (1,0), (1,1)], dtype=np.float32)
+    _line_offsets  = np.array([(0,0), (0,1), (1,1), (0,0), (1,1), (1,0)], dtype=np.float32)
+
     def buffer(self, pos, norm, sel, warn, pin, seam):
         if self.shader == None: return
+        # pack into contiguous arrays, which batch_for_shader can fill vertex buffers from directly
+        vec3 = lambda v: np.ascontiguousarray(v, dtype=np.float32).reshape((-1, 3))
+        val1 = lambda v: np.ascontiguousarray(v, dtype=np.float32).reshape(-1)
+        pos, norm = vec3(pos), vec3(norm)
+        sel, warn, pin, seam = val1(sel), val1(warn), val1(pin), val1(seam)
         if self.shader_type == 'POINTS':
             data = {
                 # repeat each value 6 times
-                'vert_pos':    [p for p in pos  for __ in range(6)],
-                'vert_norm':   [n for n in norm for __ in range(6)],
-                'selected':    [s for s in sel  for __ in range(6)],
-                'warning':     [w for w in warn for __ in range(6)],
-                'pinned':      [p for p in pin  for __ in range(6)],
-                'seam':        [p for p in seam for __ in range(6)],
-                'vert_offset': [o for _ in pos for o in [(0,0), (1,0), (0,1), (0,1), (1,0), (1,1)]],
+                'vert_pos':    np.repeat(pos,  6, axis=0),
+                'vert_norm':   np.repeat(norm, 6, axis=0),
+                'selected':    np.repeat(sel,  6),
+                'warning':     np.repeat(warn, 6),
+                'pinned':      np.repeat(pin,  6),
+                'seam':        np.repeat(seam, 6),
+                'vert_offset': np.tile(self._point_offsets, (len(pos), 1)),
             }
         elif self.shader_type == 'LINES':
             data = {
                 # repeat each value 6 times
-                'vert_pos0':   [p0 for p0 in pos [0::2] for __ in range(6)],
-                'vert_pos1':   [p1 for p1 in pos [1::2] for __ in range(6)],
-                'vert_norm':   [n  for n  in norm[0::2] for __ in range(6)],
-                'selected':    [s  for s  in sel [0::2] for __ in range(6)],
-                'warning':     [w  for w  in warn[0::2] for __ in range(6)],
-                'pinned':      [p  for p  in pin [0::2] for __ in range(6)],
-                'seam':        [s  for s  in seam[0::2] for __ in range(6)],
-                'vert_offset': [o for _ in pos[0::2] for o in [(0,0), (0,1), (1,1), (0,0), (1,1), (1,0)]],
+                'vert_pos0':   np.repeat(pos [0::2], 6, axis=0),
+                'vert_pos1':   np.repeat(pos [1::2], 6, axis=0),
+                'vert_norm':   np.repeat(norm[0::2], 6, axis=0),
+                'selected':    np.repeat(sel [0::2], 6),
+                'warning':     np.repeat(warn[0::2], 6),
+                'pinned':      np.repeat(pin [0::2], 6),
+                'seam':        np.repeat(seam[0::2], 6),
+                'vert_offset': np.tile(self._line_offsets, (len(pos) // 2, 1)),
         }
         elif self.shader_type == 'TRIS':
             data = {
@@ -21,9 +21,11 @@ Created by Jonathan Denning, Jonathan Williamson
 
 import time
 from struct import pack
-from hashlib import md5
+from hashlib import md5, blake2b
 
 import bpy
+import numpy as np
+from bpy.app.handlers import persistent
 from bmesh.types import BMesh
 from mathutils import Vector, Matrix
 
@@ -133,7 +135,9 @@ def hash_object(obj:bpy.types.Object):
         (min(c[0] for c in bbox), min(c[1] for c in bbox), min(c[2] for c in bbox)),
         (max(c[0] for c in bbox), max(c[1] for c in bbox), max(c[2] for c in bbox)),
     )
-    vsum   = tuple(sum((v.co for v in me.vertices), Vector((0,0,0))))
+    co = np.empty(len(me.vertices) * 3, dtype=np.float32)
+    me.vertices.foreach_get('co', co)
+    vsum   = tuple(co.reshape((-1, 3)).sum(axis=0, dtype=np.float64).tolist())
     xform  = tuple(e for l in obj.matrix_world for e in l)
     mods = []
     for mod in obj.modifiers:
@@ -148,6 +152,37 @@ def hash_object(obj:bpy.types.Object):
     # print(f'  time: {time.time() - t}')
     return hashed
 
+def hash_object_geometry(obj:bpy.types.Object, *, extra=None, mesh=None, depsgraph=None):
+    '''
+    returns hex digest of the evaluated (modifiers applied) geometry of obj.
+    unlike hash_object, every vertex coordinate and every face is hashed, and
+    the digest does not depend on session (safe to use as key of on-disk cache).
+    if mesh is given, it must be the evaluated mesh of obj (ex: from to_mesh())
+    '''
+    if obj is None: return None
+    assert type(obj) is bpy.types.Object, "Only call hash_object_geometry on mesh objects!"
+    assert type(obj.data) is bpy.types.Mesh, "Only call hash_object_geometry on mesh objects!"
+    obj_eval = None
+    if mesh is None:
+        if depsgraph is None: depsgraph = bpy.context.evaluated_depsgraph_get()
+        obj_eval = obj.evaluated_get(depsgraph)
+        mesh = obj_eval.to_mesh()
+    try:
+        nv, nl, np_ = len(mesh.vertices), len(mesh.loops), len(mesh.polygons)
+        co = np.empty(nv * 3, dtype=np.float32)
+        mesh.vertices.foreach_get('co', co)
+        loops = np.empty(nl, dtype=np.int32)
+        mesh.loops.foreach_get('vertex_index', loops)
+        polys = np.empty(np_, dtype=np.int32)
+        mesh.polygons.foreach_get('loop_total', polys)
+    finally:
+        if obj_eval is not None: obj_eval.to_mesh_clear()
+    hasher = blake2b(digest_size=20)
+    hasher.update(bytes(repr((nv, nl, np_, extra)), 'utf8'))
+    for data in (co, loops, polys):
+        hasher.update(memoryview(data))
+    return hasher.hexdigest()
+
 def hash_bmesh(bme:BMesh):
     if bme is None: return None
     assert type(bme) is BMesh, 'Only call hash_bmesh on BMesh objects!'
@@ -166,3 +201,140 @@ def hash_bmesh(bme:BMesh):
     vsum   = tuple(sum((v.co for v in bme.verts), Vector((0,0,0))))
     hashed = (counts, tuple(bbox.min) if bbox.min else None, tuple(bbox.max) if bbox.max else None, vsum)
     return hashed
+
+
+#################################################################################
+# fingerprints
+#
+# fingerprints are hex digests of contiguous buffers (vertex coordinates, loop
+# indices, modifier settings), hashed with one update call per buffer.  results
+# are cached per datablock (keyed by session_uid) until a depsgraph update marks
+# the datablock as changed, so checking an unchanged datablock is a dict lookup.
+#
+# NOTE: changes that have not been evaluated by the depsgraph yet (ex: writing
+#       to mesh then immediately asking for fingerprint) are not seen until the
+#       next depsgraph update.  call fingerprint_invalidate() in those cases.
+# NOTE: the depsgraph handler must be added with fingerprint_register() (see
+#       add-on register), otherwise cached fingerprints are never invalidated.
+
+_fingerprints = {}      # session_uid -> { (kind, max_samples): digest }
+
+def fingerprint_buffers(*buffers, extra=None, max_samples=None):
+    '''
+    returns hex digest of given arrays.  if max_samples is given, arrays with
+    more rows than max_samples are sampled with a stride, so the digest is
+    cheaper but might miss changes to rows that were skipped
+    '''
+    hasher = blake2b(digest_size=20)
+    hasher.update(bytes(repr((extra, max_samples, [(np.shape(b), str(np.asarray(b).dtype)) for b in buffers])), 'utf8'))
+    for data in buffers:
+        data = np.asarray(data)
+        if max_samples and len(data) > max_samples:
+            data = data[::-(-len(data) // max_samples)]
+        hasher.update(memoryview(np.ascontiguousarray(data)))
+    return hasher.hexdigest()
+
+def _fingerprint_cached(id_data, kind, max_samples, fn):
+    cache = _fingerprints.setdefault(id_data.session_uid, {})
+    key = (kind, max_samples)
+    if key not in cache: cache[key] = fn()
+    return cache[key]
+
+def fingerprint_mesh(me:bpy.types.Mesh, *, max_samples=None):
+    ''' returns fingerprint of vertex coordinates and face topology of (original) mesh datablock me '''
+    def compute():
+        nv, nl, np_ = len(me.vertices), len(me.loops), len(me.polygons)
+        co = np.empty((nv, 3), dtype=np.float32)
+        me.vertices.foreach_get('co', co.ravel())
+        loops = np.empty(nl, dtype=np.int32)
+        me.loops.foreach_get('vertex_index', loops)
+        polys = np.empty(np_, dtype=np.int32)
+        me.polygons.foreach_get('loop_total', polys)
+        return fingerprint_buffers(co, loops, polys, extra=(nv, nl, np_, len(me.edges)), max_samples=max_samples)
+    return _fingerprint_cached(me, 'mesh', max_samples, compute)
+
+def _modifier_settings(mod):
+    settings = [mod.type, mod.name, mod.show_viewport]
+    for prop in mod.bl_rna.properties:
+        if prop.identifier in {'rna_type', 'name', 'show_viewport'}: continue
+        if prop.type in {'BOOLEAN', 'INT', 'FLOAT', 'STRING', 'ENUM'}:
+            v = getattr(mod, prop.identifier)
+            if type(v) is set: v = tuple(sorted(v))
+            elif getattr(prop, 'is_array', False): v = tuple(v)
+            settings.append((prop.identifier, v))
+        elif prop.type == 'POINTER':
+            v = getattr(mod, prop.identifier)
+            settings.append((prop.identifier, getattr(v, 'name', None)))
+    return settings
+
+def fingerprint_modifiers(obj:bpy.types.Object):
+    ''' returns fingerprint of settings of modifier stack of obj '''
+    def compute():
+        settings = [ _modifier_settings(mod) for mod in obj.modifiers ]
+        return fingerprint_buffers(np.frombuffer(bytes(repr(settings), 'utf8'), dtype=np.uint8))
+    return _fingerprint_cached(obj, 'modifiers', None, compute)
+
+def fingerprint_object(obj:bpy.types.Object, *, max_samples=None, xform=True):
+    '''
+    returns fingerprint of mesh object obj: mesh geometry, modifier stack settings,
+    and (if xform) world transform.  does not depend on session, so can be used as
+    key of on-disk cache (with xform=False for local-space data)
+    '''
+    if obj is None: return None
+    assert type(obj) is bpy.types.Object, "Only call fingerprint_object on mesh objects!"
+    assert type(obj.data) is bpy.types.Mesh, "Only call fingerprint_object on mesh objects!"
+    # not cached itself: combining cached parts is cheap, and the parts are invalidated separately
+    mx = np.array(obj.matrix_world, dtype=np.float64) if xform else np.empty(0)
+    return fingerprint_buffers(mx, extra=(fingerprint_mesh(obj.data, max_samples=max_samples), fingerprint_modifiers(obj)))
+
+def fingerprint_invalidate(id_data=None):
+    ''' forgets cached fingerprints of id_data (or of all datablocks if None) '''
+    if id_data is None: _fingerprints.clear()
+    else: _fingerprints.pop(id_data.session_uid, None)
+
+#################################################################################
+# evaluation counts
+#
+# fingerprints only cover original data.  evaluated geometry of an object also
+# changes when its dependencies change (modifier targets, armature pose, shape
+# keys, drivers), which the depsgraph reports as geometry update of the object.
+
+_evaluations = {}       # session_uid -> number of geometry or transform updates
+
+def evaluation_count(obj:bpy.types.Object):
+    '''
+    returns number of depsgraph updates to evaluated geometry or world transform
+    of obj seen since counting started.  compare counts to detect change
+    '''
+    return _evaluations.get(obj.session_uid, 0)
+
+@persistent
+def _fingerprint_depsgraph_update(scene, depsgraph):
+    for update in depsgraph.updates:
+        id_data = update.id.original
+        if type(id_data) is bpy.types.Object and (update.is_updated_geometry or update.is_updated_transform):
+            _evaluations[id_data.session_uid] = _evaluations.get(id_data.session_uid, 0) + 1
+        if not _fingerprints: continue
+        _fingerprints.pop(id_data.session_uid, None)
+        if type(id_data) is bpy.types.Object and update.is_updated_geometry and id_data.data is not None:
+            # edits to mesh in edit mode are reported on object
+            _fingerprints.pop(id_data.data.session_uid, None)
+
+@persistent
+def _fingerprint_load(*args):
+    _fingerprints.clear()
+
+def fingerprint_register():
+    ''' adds handlers that invalidate fingerprints and count evaluations.  call from add-on register() '''
+    if _fingerprint_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(_fingerprint_depsgraph_update)
+    if _fingerprint_load not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(_fingerprint_load)
+
+def fingerprint_unregister():
+    ''' removes handlers added by fingerprint_register.  call from add-on unregister() '''
+    if _fingerprint_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(_fingerprint_depsgraph_update)
+    if _fingerprint_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_fingerprint_load)
+    _fingerprints.clear()
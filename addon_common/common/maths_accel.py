@@ -27,6 +27,7 @@ from itertools import chain
 from concurrent.futures import ProcessPoolExecutor
 
 import gpu
+import numpy as np
 from mathutils import Matrix, Vector, Quaternion
 from bmesh.types import BMVert
 from mathutils.geometry import intersect_line_plane, intersect_point_tri
@@ -75,8 +76,33 @@ class Accel2D:
         verts = [ co for e in edges for co in e.verts ]
         return Accel2D(label, verts, edges, [], Point_to_Point2Ds)
 
+    def _project_batch(self, verts, edges, faces, project2D):
+        '''
+        projects every vertex involved (including verts of edges and faces) with a single
+        call to project2D, which takes (N,3) arrays of points and normals and returns
+        (xy, valid) arrays of shape (N,K,2) and (N,K).  results are memoized per vertex
+        so the same vertex is not reprojected for each edge and face that uses it.
+        '''
+        allverts = list({ v: None for v in chain(verts, (v for ef in chain(edges, faces) for v in ef.verts)) })
+        if not allverts: return
+        co = np.array([tuple(v.co)     for v in allverts], dtype=np.float64)
+        no = np.array([tuple(v.normal) for v in allverts], dtype=np.float64)
+        xy, valid = project2D(co, no)
+        self._pts2D.update({
+            v: [ Point2D(pt) for (pt, ok) in zip(v_xy.tolist(), v_valid) if ok ]
+            for (v, v_xy, v_valid) in zip(allverts, xy, valid)
+        })
+
+    def _vert_Point2Ds(self, v):
+        if v in self._pts2D: return self._pts2D[v]
+        return self.Point_to_Point2Ds(v.co, v.normal)
+
+    def _insert_vert(self, vert):
+        for pt in self._vert_Point2Ds(vert):
+            self._put(self.compute_ij(pt), vert)
+
     def _insert_edge(self, edge):
-        pts_list = zip(*[ self.Point_to_Point2Ds(v.co, v.normal) for v in edge.verts ])
+        pts_list = zip(*[ self._vert_Point2Ds(v) for v in edge.verts ])
         for co0, co1 in pts_list:
             (i0, j0), (i1, j1) = self.compute_ij(co0), self.compute_ij(co1)
             mini, minj, maxi, maxj = min(i0, i1), min(j0, j1), max(i0, i1), max(j0, j1)
@@ -84,29 +110,48 @@ class Accel2D:
                 for j in range(minj, maxj + 1):
                     self._put((i, j), edge)
 
+    def _insert_face(self, face):
+        ''' returns (sizei*sizej, sizei, sizej) of largest spread (for debugging) '''
+        max_spread = (0, 0, 0)
+        for ef_pts in zip(*[ self._vert_Point2Ds(v) for v in face.verts ]):
+            bbox2 = BBox2D((self.compute_ij(pt) for pt in ef_pts))
+            mini, minj, maxi, maxj = int(bbox2.mx), int(bbox2.my), int(bbox2.Mx), int(bbox2.My)
+            sizei, sizej = maxi - mini + 1, maxj - minj + 1
+            if (spread := sizei*sizej) > max_spread[0]: max_spread = (spread, sizei, sizej)
+            for i in range(mini, maxi + 1):
+                for j in range(minj, maxj + 1):
+                    self._put((i, j), face)
+        return max_spread
+
     @profiler.function
-    def __init__(self, label, verts, edges, faces, Point_to_Point2Ds):
+    def __init__(self, label, verts, edges, faces, Point_to_Point2Ds, *, project2D=None):
         self.verts = list(verts) if verts else []
         self.edges = list(edges) if edges else []
         self.faces = list(faces) if faces else []
         self.Point_to_Point2Ds = Point_to_Point2Ds
-
-        vert_type, edge_type, face_type = ( type(elems[0] if elems else None) for elems in [self.verts, self.edges, self.faces] )
-        self._is_vert = lambda elem: isinstance(elem, vert_type)
-        self._is_edge = lambda elem: isinstance(elem, edge_type)
-        self._is_face = lambda elem: isinstance(elem, face_type)
+        self.project2D = project2D
+        self._pts2D = {}
+        if project2D:
+            with time_it('batch project', enabled=Accel2D.DEBUG):
+                self._project_batch(self.verts, self.edges, self.faces, project2D)
+
+        self._vert_type, self._edge_type, self._face_type = ( type(elems[0] if elems else None) for elems in [self.verts, self.edges, self.faces] )
+        self._is_vert = lambda elem: isinstance(elem, self._vert_type)
+        self._is_edge = lambda elem: isinstance(elem, self._edge_type)
+        self._is_face = lambda elem: isinstance(elem, self._face_type)
         self.bins = {}
+        self._elem_bins = {}    # elem => list of bins (ij) that contain elem, so elem can be removed
 
         # collect all involved pts so we can find bbox
         with time_it('collect', enabled=Accel2D.DEBUG):
             bbox = BBox2D()
             with time_it('collect verts', enabled=Accel2D.DEBUG):
-                bbox.insert_points(pt for v in verts for pt in Point_to_Point2Ds(v.co, v.normal))
+                bbox.insert_points(pt for v in verts for pt in self._vert_Point2Ds(v))
             with time_it('collect edges and faces', enabled=Accel2D.DEBUG):
                 bbox.insert_points(
                     pt
                     for ef in chain(edges, faces)
-                    for ef_pts in zip(*[Point_to_Point2Ds(v.co, v.normal) for v in ef.verts])
+                    for ef_pts in zip(*[self._vert_Point2Ds(v) for v in ef.verts])
                     for pt in ef_pts
                 )
         if bbox.count == 0:
@@ -128,26 +173,16 @@ class Accel2D:
         # inserting verts
         with time_it('insert verts', enabled=Accel2D.DEBUG):
             for v in verts:
-                for pt in Point_to_Point2Ds(v.co, v.normal):
-                    tot_inserted += 1
-                    i, j = self.compute_ij(pt)
-                    self._put((i, j), v)
+                self._insert_vert(v)
 
         # inserting edges and faces
         with time_it('insert edges and faces', enabled=Accel2D.DEBUG):
             for e in edges:
                 self._insert_edge(e)
             for ef in faces:
-                ef_pts_list = zip(*[Point_to_Point2Ds(v.co, v.normal) for v in ef.verts])
-                for ef_pts in ef_pts_list:
-                    tot_inserted += 1
-                    bbox2 = BBox2D((self.compute_ij(pt) for pt in ef_pts))
-                    mini, minj, maxi, maxj = int(bbox2.mx), int(bbox2.my), int(bbox2.Mx), int(bbox2.My)
-                    sizei, sizej = maxi - mini + 1, maxj - minj + 1
-                    if (spread := sizei*sizej) > max_spread[0]: max_spread = (spread, sizei, sizej)
-                    for i in range(mini, maxi + 1):
-                        for j in range(minj, maxj + 1):
-                            self._put((i, j), ef)
+                max_spread = max(max_spread, self._insert_face(ef))
+        if Accel2D.DEBUG:
+            tot_inserted = sum(len(b) for b in self._elem_bins.values())
 
         if Accel2D.DEBUG:
             # debug reporting
@@ -183,6 +218,37 @@ class Accel2D:
         # assert 0 <= ij[0] < self.bin_len and 0 <= ij[1] < self.bin_len, f'{ij} is outside {self.bin_len}x{self.bin_len}'
         if ij in self.bins: self.bins[ij].add(o)
         else:               self.bins[ij] = { o }
+        if o in self._elem_bins: self._elem_bins[o].append(ij)
+        else:                    self._elem_bins[o] = [ ij ]
+
+    @profiler.function
+    def insert(self, *, verts=(), edges=(), faces=()):
+        '''
+        inserts verts, edges, and faces into existing bins.  bins are not resized, so
+        elements projecting outside the original bbox are clamped to the border bins
+        '''
+        verts, edges, faces = list(verts), list(edges), list(faces)
+        # (re)project verts, as they might have moved since last projection
+        if self.project2D: self._project_batch(verts, edges, faces, self.project2D)
+        if verts and self._vert_type is type(None): self._vert_type = type(verts[0])
+        if edges and self._edge_type is type(None): self._edge_type = type(edges[0])
+        if faces and self._face_type is type(None): self._face_type = type(faces[0])
+        for v in verts: self._insert_vert(v)
+        for e in edges: self._insert_edge(e)
+        for f in faces: self._insert_face(f)
+
+    @profiler.function
+    def remove(self, *, verts=(), edges=(), faces=()):
+        ''' removes verts, edges, and faces.  elements do not need to be valid '''
+        for elem in chain(verts, edges, faces):
+            for ij in self._elem_bins.pop(elem, ()):
+                self.bins[ij].discard(elem)
+
+    def move(self, *, verts=(), edges=(), faces=()):
+        ''' reinserts verts, edges, and faces after they have moved '''
+        verts, edges, faces = list(verts), list(edges), list(faces)
+        self.remove(verts=verts, edges=edges, faces=faces)
+        self.insert(verts=verts, edges=edges, faces=faces)
 
     def _get(self, ij):
         return self.bins[ij] if ij in self.bins else set()
@@ -222,3 +288,467 @@ class Accel2D:
     def get_faces(self, v2d, within):
         return self.get(v2d, within, fn_filter=self._is_face)
 
+
+class Accel2D_CSR_Bins:
+    '''
+    bins of a single element type for Accel2D_CSR.  bin b holds ids[offsets[b]:offsets[b+1]],
+    and id i refers to elems[i].  elements inserted after construction are kept in a small
+    overflow dict (bin => list of ids), and removed elements are masked out with alive.
+    '''
+
+    def __init__(self, elems, offsets, ids):
+        self.elems = elems
+        self.offsets = offsets
+        self.ids = ids
+        self.alive = np.ones(len(elems), dtype=bool)
+        self.extra = {}         # bin => list of ids inserted after construction
+        self.extra_bins = {}    # id => list of bins in extra
+        self._index = None      # elem => id (built only once needed)
+
+    def index(self):
+        if self._index is None:
+            self._index = { elem: i for (i, elem) in enumerate(self.elems) }
+        return self._index
+
+    def append(self, elems, bins, ids):
+        ''' appends elems, where local element ids[k] goes into bin bins[k] '''
+        base = len(self.elems)
+        index = self.index()
+        for (i, elem) in enumerate(elems, start=base):
+            index[elem] = i
+        self.elems.extend(elems)
+        self.alive = np.concatenate((self.alive, np.ones(len(elems), dtype=bool)))
+        for (b, i) in zip(bins.tolist(), (ids + base).tolist()):
+            if b in self.extra: self.extra[b].append(i)
+            else:               self.extra[b] = [ i ]
+            if i in self.extra_bins: self.extra_bins[i].append(b)
+            else:                    self.extra_bins[i] = [ b ]
+
+    def remove(self, elems):
+        index = self.index()
+        for elem in elems:
+            i = index.pop(elem, None)
+            if i is None: continue
+            self.alive[i] = False
+            for b in self.extra_bins.pop(i, ()):
+                self.extra[b].remove(i)
+
+    def get_ids(self, ranges, bins):
+        '''
+        returns ids of alive elements in the given index ranges (into ids) and
+        overflow bins.  element can be in several neighboring bins, so dedup
+        '''
+        found = [ self.ids[start:stop] for (start, stop) in ranges ]
+        if self.extra:
+            found += [ np.array(self.extra[b], dtype=np.int64) for b in bins if self.extra.get(b) ]
+        if not found: return np.zeros(0, dtype=np.int64)
+        ids = np.unique(np.concatenate(found))
+        return ids[self.alive[ids]]
+
+
+class Accel2D_CSR:
+    '''
+    array-backed alternative to Accel2D.  the uniform grid is stored in compressed
+    sparse-row layout: for each element type, bin b holds the element ids
+    ids[offsets[b]:offsets[b+1]], where b = i * bin_len + j.  bin assignment is
+    computed with NumPy from the projected coordinates, and queries gather
+    contiguous index ranges (one per grid row) rather than building sets.
+    '''
+    margin = Accel2D.margin
+    DEBUG = False
+
+    @profiler.function
+    def __init__(self, label, verts, edges, faces, Point_to_Point2Ds, *, project2D=None):
+        self.verts = list(verts) if verts else []
+        self.edges = list(edges) if edges else []
+        self.faces = list(faces) if faces else []
+        self.Point_to_Point2Ds = Point_to_Point2Ds
+        self.project2D = project2D
+
+        with time_it('project', enabled=Accel2D_CSR.DEBUG):
+            xy, valid, elem_data = self._project(self.verts, self.edges, self.faces)
+
+        # find bbox of all projected points
+        pts = xy[valid]
+        if len(pts):
+            mn, mx = pts.min(axis=0), pts.max(axis=0)
+        else:
+            mn, mx = np.zeros(2), np.zeros(2)
+        tot_points = sum(len(rows) for (_, rows) in elem_data)
+
+        self.min = Point2D((mn[0] - self.margin, mn[1] - self.margin))
+        self.max = Point2D((mx[0] + self.margin, mx[1] + self.margin))
+        self.size = self.max - self.min  # includes margin
+        self.sizex, self.sizey = self.size
+        self.minx, self.miny = self.min
+        self.bin_len = ceil(sqrt(tot_points) + 0.1)
+
+        with time_it('bin', enabled=Accel2D_CSR.DEBUG):
+            nbins = self.bin_len * self.bin_len
+            ij = self._compute_ij_array(xy)
+            self.vert_bins, self.edge_bins, self.face_bins = (
+                Accel2D_CSR_Bins(list(elems), *self._build_bins(nbins, *self._bin_pairs(offsets, rows, ij, valid)))
+                for (elems, (offsets, rows)) in zip((self.verts, self.edges, self.faces), elem_data)
+            )
+
+        if Accel2D_CSR.DEBUG:
+            counts = sum(np.diff(b.offsets) for b in (self.vert_bins, self.edge_bins, self.face_bins))
+            nonzero = np.count_nonzero(counts)
+            term_printer.boxed(
+                f'Counts: v={len(self.verts)} e={len(self.edges)} f={len(self.faces)}',
+                f'        total pts={tot_points}',
+                f'Size: min={self.min}, max={self.max} size={self.size}',
+                f'Bins: {self.bin_len}x{self.bin_len} non-zero={nonzero}/{nbins} ({100*nonzero/nbins:0.0f}%)',
+                f'Inserts: v={len(self.vert_bins.ids)} e={len(self.edge_bins.ids)} f={len(self.face_bins.ids)}',
+                title=f'Accel2D_CSR: {label}', color='black', highlight='green',
+            )
+
+    def _project(self, verts, edges, faces):
+        '''
+        projects every vertex involved (including verts of edges and faces).
+        returns (xy, valid, elem_data), where xy and valid are arrays of shape (N,K,2)
+        and (N,K) for the K (symmetry) copies of each vertex, and elem_data holds
+        the vertex rows of verts, edges, and faces in compressed sparse-row layout.
+        uses project2D if given; otherwise, Point_to_Point2Ds is called per vertex
+        '''
+        allverts = { v: None for v in chain(verts, (v for ef in chain(edges, faces) for v in ef.verts)) }
+        vert_rows = { v: i for (i, v) in enumerate(allverts) }
+        allverts = list(allverts)
+
+        def elem_rows(elems, fn_verts):
+            lens = np.fromiter((len(fn_verts(e)) for e in elems), dtype=np.int64, count=len(elems))
+            offsets = np.zeros(len(elems) + 1, dtype=np.int64)
+            np.cumsum(lens, out=offsets[1:])
+            rows = np.fromiter((vert_rows[v] for e in elems for v in fn_verts(e)), dtype=np.int64, count=int(offsets[-1]))
+            return (offsets, rows)
+        elem_data = [
+            elem_rows(verts, lambda v: (v,)),
+            elem_rows(edges, lambda e: e.verts),
+            elem_rows(faces, lambda f: f.verts),
+        ]
+
+        if self.project2D:
+            co = np.array([tuple(v.co)     for v in allverts], dtype=np.float64).reshape((-1, 3))
+            no = np.array([tuple(v.normal) for v in allverts], dtype=np.float64).reshape((-1, 3))
+            xy, valid = self.project2D(co, no)
+            return (xy, valid, elem_data)
+
+        projected = [
+            [ pt for pt in self.Point_to_Point2Ds(v.co, v.normal) if pt is not None ]
+            for v in allverts
+        ]
+        k = max(map(len, projected), default=1)
+        xy = np.zeros((len(projected), k, 2), dtype=np.float64)
+        valid = np.zeros((len(projected), k), dtype=bool)
+        for i, pts in enumerate(projected):
+            for j, pt in enumerate(pts):
+                xy[i, j] = tuple(pt)
+                valid[i, j] = True
+        return (xy, valid, elem_data)
+
+    def _compute_ij_array(self, xy):
+        ''' vectorized compute_ij.  returns int array with same shape as xy '''
+        bl = self.bin_len
+        size = np.array((self.sizex, self.sizey), dtype=np.float64)
+        mins = np.array((self.minx, self.miny), dtype=np.float64)
+        ij = np.floor(bl * (xy - mins) / size)
+        return np.clip(np.nan_to_num(ij), 0, bl - 1).astype(np.int64)
+
+    def _bin_pairs(self, offsets, rows, ij, valid):
+        '''
+        finds every bin that overlaps the bbox of each fully-projected copy of each element
+        (whose vertex rows are offsets/rows in CSR layout).
+        returns (bins, elem_ids), sorted by bin then elem id, without duplicates
+        '''
+        nelems = len(offsets) - 1
+        if nelems == 0 or len(rows) == 0 or ij.shape[1] == 0:
+            return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        starts = offsets[:-1]
+
+        # ij bbox of each copy of each element (elements always have at least one vertex)
+        cij, cvalid = ij[rows], valid[rows]                                 # (R,K,2), (R,K)
+        lo = np.minimum.reduceat(cij, starts, axis=0)                       # (E,K,2)
+        hi = np.maximum.reduceat(cij, starts, axis=0)
+        ok = np.logical_and.reduceat(cvalid, starts, axis=0)                # (E,K)
+        elems, copies = np.nonzero(ok)
+        lo, hi = lo[elems, copies], hi[elems, copies]
+
+        # expand each bbox into the bins it covers
+        ni = hi[:, 0] - lo[:, 0] + 1
+        nj = hi[:, 1] - lo[:, 1] + 1
+        counts = ni * nj
+        rect = np.repeat(np.arange(len(elems)), counts)
+        rect_start = np.zeros(len(elems), dtype=np.int64)
+        np.cumsum(counts[:-1], out=rect_start[1:])
+        local = np.arange(len(rect)) - rect_start[rect]
+        bins = (lo[rect, 0] + local // nj[rect]) * self.bin_len + (lo[rect, 1] + local % nj[rect])
+
+        # dedup (bin, elem) pairs; sorting by key groups ids by bin
+        keys = np.unique(bins * nelems + elems[rect])
+        return np.divmod(keys, nelems)
+
+    @staticmethod
+    def _build_bins(nbins, bins, ids):
+        ''' returns (offsets, ids) of sorted (bin, id) pairs in CSR layout '''
+        offsets = np.zeros(nbins + 1, dtype=np.int64)
+        np.cumsum(np.bincount(bins, minlength=nbins), out=offsets[1:])
+        return (offsets, ids)
+
+    @profiler.function
+    def insert(self, *, verts=(), edges=(), faces=()):
+        '''
+        inserts verts, edges, and faces into overflow bins.  bins are not resized, so
+        elements projecting outside the original bbox are clamped to the border bins
+        '''
+        verts, edges, faces = list(verts), list(edges), list(faces)
+        if not (verts or edges or faces): return
+        xy, valid, elem_data = self._project(verts, edges, faces)
+        ij = self._compute_ij_array(xy)
+        for (elem_bins, elems, (offsets, rows)) in zip((self.vert_bins, self.edge_bins, self.face_bins), (verts, edges, faces), elem_data):
+            if not elems: continue
+            elem_bins.append(elems, *self._bin_pairs(offsets, rows, ij, valid))
+
+    @profiler.function
+    def remove(self, *, verts=(), edges=(), faces=()):
+        ''' removes verts, edges, and faces.  elements do not need to be valid '''
+        if verts: self.vert_bins.remove(verts)
+        if edges: self.edge_bins.remove(edges)
+        if faces: self.face_bins.remove(faces)
+
+    def move(self, *, verts=(), edges=(), faces=()):
+        ''' reinserts verts, edges, and faces after they have moved '''
+        verts, edges, faces = list(verts), list(edges), list(faces)
+        self.remove(verts=verts, edges=edges, faces=faces)
+        self.insert(verts=verts, edges=edges, faces=faces)
+
+    @profiler.function
+    def compute_ij(self, v2d):
+        bl = self.bin_len
+        return (
+            clamp(int(bl * (v2d.x - self.minx) / self.sizex), 0, bl - 1),
+            clamp(int(bl * (v2d.y - self.miny) / self.sizey), 0, bl - 1)
+        )
+
+    def _window(self, v2d, within):
+        ''' returns (i0, j0, i1, j1) of bins within distance of v2d, or None '''
+        if v2d is None or not (isfinite(v2d.x) and isfinite(v2d.y)): return None
+        delta = Vec2D((within, within))
+        i0, j0 = self.compute_ij(v2d - delta)
+        i1, j1 = self.compute_ij(v2d + delta)
+        return (i0, j0, i1, j1)
+
+    def ranges(self, offsets, v2d, within):
+        '''
+        returns list of (start, stop) index ranges into the ids array that cover
+        all bins within distance of v2d (one range per grid row)
+        '''
+        if not (window := self._window(v2d, within)): return []
+        i0, j0, i1, j1 = window
+        bl = self.bin_len
+        return [
+            (start, stop)
+            for i in range(i0, i1 + 1)
+            if (start := int(offsets[i*bl + j0])) < (stop := int(offsets[i*bl + j1 + 1]))
+        ]
+
+    def _get_ids(self, elem_bins, v2d, within):
+        if not (window := self._window(v2d, within)): return np.zeros(0, dtype=np.int64)
+        i0, j0, i1, j1 = window
+        bl = self.bin_len
+        bins = (
+            i*bl + j
+            for i in range(i0, i1 + 1)
+            for j in range(j0, j1 + 1)
+        ) if elem_bins.extra else ()
+        return elem_bins.get_ids(self.ranges(elem_bins.offsets, v2d, within), bins)
+
+    def get_vert_ids(self, v2d, within): return self._get_ids(self.vert_bins, v2d, within)
+    def get_edge_ids(self, v2d, within): return self._get_ids(self.edge_bins, v2d, within)
+    def get_face_ids(self, v2d, within): return self._get_ids(self.face_bins, v2d, within)
+
+    @profiler.function
+    def get_verts(self, v2d, within):
+        elems = self.vert_bins.elems
+        return [ elem for i in self.get_vert_ids(v2d, within).tolist() if (elem := elems[i]).is_valid ]
+
+    @profiler.function
+    def get_edges(self, v2d, within):
+        elems = self.edge_bins.elems
+        return [ elem for i in self.get_edge_ids(v2d, within).tolist() if (elem := elems[i]).is_valid ]
+
+    @profiler.function
+    def get_faces(self, v2d, within):
+        elems = self.face_bins.elems
+        return [ elem for i in self.get_face_ids(v2d, within).tolist() if (elem := elems[i]).is_valid ]
+
+
+class Accel3D_Boxes:
+    '''
+    top-level acceleration structure over a small number of world-space axis-aligned
+    bounding boxes (ex: one per source object).  with at most a few hundred boxes,
+    testing all boxes at once with NumPy is faster than walking a tree in Python, so
+    boxes are stored as flat (N,3) arrays.  queries take an optional mask to skip
+    boxes (ex: objects toggled off) without rebuilding.
+    '''
+
+    padding = 1e-5      # boxes grow by this fraction of their size (or of their distance from origin, if larger)
+
+    def __init__(self, mins, maxs):
+        ''' mins and maxs are (N,3) arrays of box corners '''
+        mins = np.array(mins, dtype=np.float64).reshape((-1, 3))
+        maxs = np.array(maxs, dtype=np.float64).reshape((-1, 3))
+        # boxes with nan (empty objects) are never reached
+        self.valid = ~(np.isnan(mins).any(axis=1) | np.isnan(maxs).any(axis=1))
+        # pad boxes, so points on a box face (or within float error of it) are not culled.
+        # flat boxes (ex: planes) have zero extent along an axis, so pad by the largest extent
+        extent = (maxs - mins).max(axis=1, initial=0.0)
+        reach = np.maximum(np.abs(mins), np.abs(maxs)).max(axis=1, initial=0.0)
+        pad = Accel3D_Boxes.padding * np.maximum(extent, reach) + np.finfo(np.float32).tiny
+        self.mins = mins - pad[:, None]
+        self.maxs = maxs + pad[:, None]
+
+    def __len__(self):
+        return len(self.mins)
+
+    def ray_order(self, o, d, max_dist=float('inf'), mask=None):
+        '''
+        returns (indices, entry distances) of boxes hit by ray (origin o, direction d),
+        sorted by entry distance along ray.  entry distance is 0 if o is inside box
+        '''
+        o, d = np.array(tuple(o), dtype=np.float64), np.array(tuple(d), dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inv = 1.0 / d
+            t0 = (self.mins - o) * inv
+            t1 = (self.maxs - o) * inv
+        # a zero direction component gives nan when o lies on a slab plane; treat as inside slab
+        tnear = np.nan_to_num(np.minimum(t0, t1), nan=-np.inf)
+        tfar  = np.nan_to_num(np.maximum(t0, t1), nan=np.inf)
+        enter = np.maximum(tnear.max(axis=1), 0.0)
+        leave = tfar.min(axis=1)
+        hit = self.valid & (enter <= leave) & (enter <= max_dist)
+        if mask is not None: hit &= mask
+        idx = np.flatnonzero(hit)
+        order = np.argsort(enter[idx], kind='stable')
+        return (idx[order].tolist(), enter[idx][order].tolist())
+
+    def point_order(self, p, max_dist=float('inf'), mask=None):
+        '''
+        returns (indices, distances) of boxes within max_dist of point p,
+        sorted by distance from p to box (0 if p is inside box)
+        '''
+        p = np.array(tuple(p), dtype=np.float64)
+        delta = np.maximum(np.maximum(self.mins - p, p - self.maxs), 0.0)
+        dist = np.linalg.norm(delta, axis=1)
+        near = self.valid & (dist <= max_dist)
+        if mask is not None: near &= mask
+        idx = np.flatnonzero(near)
+        order = np.argsort(dist[idx], kind='stable')
+        return (idx[order].tolist(), dist[idx][order].tolist())
+
+
+class Accel3D_Segments:
+    '''
+    uniform grid over 3D line segments (ex: boundary edges of target) for
+    nearest-segment queries.  each segment is binned into every cell its bounding
+    box overlaps, and the bins are stored in compressed sparse-row layout
+    (cell_offsets, cell_ids) over a dense grid.  the grid is a snapshot; it is
+    not updated when segments move, so rebuild it when needed (ex: once per stroke)
+    '''
+
+    max_cells_per_segment = 4.0     # grid resolution is chosen so cells hold about this many segments
+
+    def __init__(self, p0, p1):
+        ''' p0 and p1 are (N,3) arrays of segment end points '''
+        self.p0 = np.array(p0, dtype=np.float64).reshape((-1, 3))
+        self.p1 = np.array(p1, dtype=np.float64).reshape((-1, 3))
+        self.d  = self.p1 - self.p0
+        self.l2 = np.einsum('ij,ij->i', self.d, self.d)
+        count = len(self.p0)
+        if not count:
+            self.mins = np.zeros(3)
+            self.size = 1.0
+            self.dims = np.ones(3, dtype=np.int64)
+            self.cell_offsets = np.zeros(2, dtype=np.int64)
+            self.cell_ids = np.zeros(0, dtype=np.int64)
+            return
+
+        seg_mins = np.minimum(self.p0, self.p1)
+        seg_maxs = np.maximum(self.p0, self.p1)
+        self.mins = seg_mins.min(axis=0)
+        extent = np.maximum(seg_maxs.max(axis=0) - self.mins, zero_threshold)
+        # cells about as large as a segment, but never more cells than a small multiple of the segment count
+        size = max(float(np.sqrt(self.l2).mean()), float(np.prod(extent) / count) ** (1/3), zero_threshold)
+        while True:
+            dims = np.maximum(np.ceil(extent / size).astype(np.int64), 1)
+            if np.prod(dims) <= self.max_cells_per_segment * count + 1: break
+            size *= 1.5
+        self.size, self.dims = size, dims
+
+        lo = self._cells(seg_mins)
+        hi = self._cells(seg_maxs)
+        span = hi - lo + 1
+        counts = np.prod(span, axis=1)
+        ids = np.repeat(np.arange(count), counts)
+        # position of each (segment, cell) pair within its segment's box of cells
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        sx, sy = span[ids, 0], span[ids, 1]
+        ijk = lo[ids] + np.stack((local % sx, (local // sx) % sy, local // (sx * sy)), axis=1)
+        keys = self._keys(ijk)
+        order = np.argsort(keys, kind='stable')
+        self.cell_ids = ids[order]
+        self.cell_offsets = np.zeros(int(np.prod(dims)) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=int(np.prod(dims))), out=self.cell_offsets[1:])
+
+    def __len__(self):
+        return len(self.p0)
+
+    def _cells(self, p):
+        return np.clip(np.floor((p - self.mins) / self.size).astype(np.int64), 0, self.dims - 1)
+
+    def _keys(self, ijk):
+        return ijk[..., 0] + self.dims[0] * (ijk[..., 1] + self.dims[1] * ijk[..., 2])
+
+    def _shell(self, ijk, r):
+        ''' returns keys of cells at Chebyshev distance r from cell ijk '''
+        rng = np.arange(-r, r + 1)
+        offs = np.stack(np.meshgrid(rng, rng, rng, indexing='ij'), axis=-1).reshape((-1, 3))
+        if r: offs = offs[np.abs(offs).max(axis=1) == r]
+        cells = ijk + offs
+        cells = cells[np.all((cells >= 0) & (cells < self.dims), axis=1)]
+        return self._keys(cells)
+
+    def _closest(self, p, ids):
+        t = np.einsum('ij,ij->i', p - self.p0[ids], self.d[ids]) / np.where(self.l2[ids] > 0, self.l2[ids], 1.0)
+        pp = self.p0[ids] + self.d[ids] * np.clip(t, 0.0, 1.0)[:, None]
+        return (pp, np.linalg.norm(pp - p, axis=1))
+
+    def nearest(self, p, max_dist=float('inf')):
+        '''
+        returns (closest point, distance, segment index) of segment nearest to point p,
+        or (None, None, None) if there are no segments within max_dist.
+        cells are visited in growing shells around the cell of p (clamped to grid)
+        until no unvisited cell can hold a nearer segment
+        '''
+        if not len(self): return (None, None, None)
+        p = np.array(tuple(p), dtype=np.float64)
+        ijk = self._cells(p)
+        best = (None, float('inf'), None)
+        seen = np.zeros(len(self), dtype=bool)
+        for r in range(int(self.dims.max()) + 1):
+            # unvisited cells are at least r-1 cells away from p (projecting p onto grid never increases distances)
+            bound = max(r - 1, 0) * self.size
+            if bound > min(best[1], max_dist): break
+            keys = self._shell(ijk, r)
+            if not len(keys): continue
+            starts, ends = self.cell_offsets[keys], self.cell_offsets[keys + 1]
+            lens = ends - starts
+            if not lens.sum(): continue
+            ids = self.cell_ids[np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(lens.sum())]
+            ids = ids[~seen[ids]]
+            if not len(ids): continue
+            seen[ids] = True
+            pp, dist = self._closest(p, ids)
+            k = int(np.argmin(dist))
+            if dist[k] < best[1]: best = (pp[k], float(dist[k]), int(ids[k]))
+        if best[0] is None or best[1] > max_dist: return (None, None, None)
+        return best
@@ -21,8 +21,11 @@ Created by Jonathan Denning, Jonathan Williamson, and Patrick Moore
 
 from functools import wraps
 import os
+import sys
+import json
 import time
 import inspect
+import threading
 import contextlib
 
 from .blender import get_path_from_addon_root
@@ -190,6 +193,11 @@ class Profiler:
 
     @contextlib.contextmanager
     def code(self, *args, enabled=True, **kwargs):
+        if TraceProfiler._enabled and enabled and args:
+            # record as span of trace (cheap) rather than as profiled code
+            with trace_profiler.span(args[0]):
+                yield None
+            return
         if not Profiler._enabled or not enabled:
             yield None
             return
@@ -313,6 +321,180 @@ class Profiler:
 profiler = Profiler()
 Globals.set(profiler)
 
+
+
+class TraceProfiler:
+    '''
+    low-overhead alternative to Profiler, which has two parts:
+    - a statistical sampler: a background thread that records the call stack of
+      the profiled thread (via sys._current_frames) every interval seconds
+    - a span recorder: regions marked with span() (or with profiler.code while
+      tracing) are recorded as (name, thread, start, end) with perf_counter_ns
+    results can be saved as Chrome trace (chrome://tracing, Perfetto) or as
+    speedscope JSON (https://www.speedscope.app)
+    '''
+
+    _enabled = False
+
+    def __init__(self):
+        self._thread = None
+        self._stop = threading.Event()
+        self.clear()
+
+    def clear(self):
+        self.frames = []            # list of (name, file, line)
+        self._frame_ids = {}        # (name, file, line) -> index into frames
+        self.samples = []           # list of (time ns, thread id, tuple of frame indices, root first)
+        self.spans = []             # list of (name, thread id, start ns, end ns)
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = self.start_ns
+
+    @property
+    def is_running(self):
+        return TraceProfiler._enabled
+
+    def start(self, *, interval=0.001, thread_id=None):
+        ''' starts sampling thread thread_id (default: calling thread) every interval seconds, and recording spans '''
+        if TraceProfiler._enabled: return
+        self.clear()
+        self._stop.clear()
+        target = thread_id if thread_id is not None else threading.get_ident()
+        self._thread = threading.Thread(target=self._sample, args=(target, interval), daemon=True)
+        # sampler needs GIL to take a sample, so ask running thread to release it at least as often
+        self._switchinterval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switchinterval, interval))
+        TraceProfiler._enabled = True
+        self._thread.start()
+
+    def stop(self):
+        if not TraceProfiler._enabled: return
+        TraceProfiler._enabled = False
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        sys.setswitchinterval(self._switchinterval)
+        self.end_ns = time.perf_counter_ns()
+
+    def _frame_id(self, code, line):
+        key = (code.co_name, code.co_filename, line)
+        i = self._frame_ids.get(key)
+        if i is None:
+            i = self._frame_ids[key] = len(self.frames)
+            self.frames.append(key)
+        return i
+
+    def _sample(self, thread_id, interval):
+        while not self._stop.wait(interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None: break     # thread has finished
+            t = time.perf_counter_ns()
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame.f_code, frame.f_code.co_firstlineno))
+                frame = frame.f_back
+            self.samples.append((t, thread_id, tuple(reversed(stack))))
+            del frame
+
+    @contextlib.contextmanager
+    def span(self, name):
+        if not TraceProfiler._enabled:
+            yield None
+            return
+        start = time.perf_counter_ns()
+        try:
+            yield None
+        finally:
+            self.spans.append((name, threading.get_ident(), start, time.perf_counter_ns()))
+
+    def function(self, fn):
+        ''' decorator that records calls to fn as spans (only checks a flag when not tracing) '''
+        name = fn.__qualname__
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TraceProfiler._enabled: return fn(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.spans.append((name, threading.get_ident(), start, time.perf_counter_ns()))
+        return wrapper
+
+    def _end_ns(self):
+        return time.perf_counter_ns() if TraceProfiler._enabled else self.end_ns
+
+    def to_chrome_trace(self):
+        ''' returns dict in Chrome trace event format (timestamps in microseconds) '''
+        us = lambda ns: (ns - self.start_ns) / 1000
+        pid = os.getpid()
+        events = [
+            { 'name': name, 'ph': 'X', 'ts': us(t0), 'dur': (t1 - t0) / 1000, 'pid': pid, 'tid': tid, 'cat': 'span' }
+            for (name, tid, t0, t1) in self.spans
+        ]
+        # stack frames are nodes of call tree, keyed by path of frame indices
+        stack_frames, node_ids = {}, {}
+        def node(stack):
+            if stack not in node_ids:
+                parent = node(stack[:-1]) if len(stack) > 1 else None
+                node_ids[stack] = str(len(node_ids))
+                name, filename, line = self.frames[stack[-1]]
+                stack_frames[node_ids[stack]] = { 'name': f'{name} ({os.path.basename(filename)}:{line})', 'category': 'python' }
+                if parent is not None: stack_frames[node_ids[stack]]['parent'] = parent
+            return node_ids[stack]
+        samples = [
+            { 'cpu': 0, 'tid': tid, 'ts': us(t), 'name': 'sample', 'sf': node(stack), 'weight': 1 }
+            for (t, tid, stack) in self.samples if stack
+        ]
+        return { 'traceEvents': events, 'stackFrames': stack_frames, 'samples': samples, 'displayTimeUnit': 'ms' }
+
+    def to_speedscope(self, name='RetopoFlow'):
+        ''' returns dict in speedscope file format, with one sampled profile and one evented profile (spans) per thread '''
+        frames = [ { 'name': n, 'file': f, 'line': l } for (n, f, l) in self.frames ]
+        span_frames = {}
+        def span_frame(n):
+            if n not in span_frames:
+                span_frames[n] = len(frames)
+                frames.append({ 'name': n })
+            return span_frames[n]
+        end_ns = self._end_ns()
+        profiles = []
+        for tid in sorted({ tid for (_, tid, _) in self.samples }):
+            samples = [ (t, stack) for (t, stid, stack) in self.samples if stid == tid ]
+            # weight each sample by the time until the next sample
+            times = [ t for (t, _) in samples ] + [end_ns]
+            profiles.append({
+                'type': 'sampled', 'name': f'{name} samples (thread {tid})', 'unit': 'nanoseconds',
+                'startValue': 0, 'endValue': end_ns - self.start_ns,
+                'samples': [ list(stack) for (_, stack) in samples ],
+                'weights': [ times[i+1] - times[i] for i in range(len(samples)) ],
+            })
+        for tid in sorted({ tid for (_, tid, _, _) in self.spans }):
+            # evented profiles need properly nested open/close events
+            events = []
+            for (n, stid, t0, t1) in self.spans:
+                if stid != tid or t1 == t0: continue
+                f = span_frame(n)
+                events += [ (t0 - self.start_ns, 1, -t1, f), (t1 - self.start_ns, 0, -t0, f) ]
+            events.sort()
+            profiles.append({
+                'type': 'evented', 'name': f'{name} spans (thread {tid})', 'unit': 'nanoseconds',
+                'startValue': 0, 'endValue': end_ns - self.start_ns,
+                'events': [ { 'type': 'O' if opening else 'C', 'frame': f, 'at': at } for (at, opening, _, f) in events ],
+            })
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name, 'exporter': 'RetopoFlow TraceProfiler',
+            'shared': { 'frames': frames },
+            'profiles': profiles,
+        }
+
+    def save_chrome_trace(self, path):
+        with open(path, 'wt') as f: json.dump(self.to_chrome_trace(), f)
+
+    def save_speedscope(self, path, name='RetopoFlow'):
+        with open(path, 'wt') as f: json.dump(self.to_speedscope(name=name), f)
+
+trace_profiler = TraceProfiler()
+
 # class CodeProfiler:
 #     def __init__(self, *args, **kwargs):
 #         self.args = args
@@ -19,35 +19,92 @@ Created by Jonathan Denning, Jonathan Williamson, and Patrick Moore
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
-from collections import namedtuple
+import zlib
+import tempfile
+from collections import deque
+
+
+class UndoStep:
+    '''
+    state of step is live (state), packed into compressed bytes kept in memory (packed),
+    or packed and spilled to file (spilled is (offset, length) into file).
+    stub holds part of state that is not packed (ex: references to tools)
+    '''
+
+    __slots__ = ('key', 'repeatable', 'state', 'stub', 'packed', 'spilled', 'size', 'packable')
+
+    def __init__(self, key, repeatable, state):
+        self.key        = key
+        self.repeatable = repeatable
+        self.state      = state
+        self.stub       = None
+        self.packed     = None
+        self.spilled    = None
+        self.size       = 0         # bytes held in memory
+        self.packable   = True
 
 
 class UndoStack:
-    def __init__(self, fn_create_state, fn_restore_state, *, max_size=100):
-        self._fn_step = namedtuple('UndoStep', 'key repeatable state')
+    '''
+    fn_create_state(key) returns state to push.
+    fn_restore_state(state, ...) restores state.
+    fn_swap_state(state, ...) is optional.  if given, popping a step calls it to
+    restore state, and it must return the state that reverts the restore.  this allows
+    states that only record changes (deltas) rather than full copies.
+
+    if max_bytes is given, steps are limited by memory as well as count.  when the
+    (estimated) memory of all steps is over budget, oldest steps are packed with
+    fn_pack_state(state) -> (stub, bytes) or None (cannot pack), compressed, and then
+    spilled to a temp file.  packed steps are unpacked on demand with
+    fn_unpack_state(stub, bytes) -> state.  fn_sizeof_state(state) estimates memory of
+    live states.  the top undo step is always kept live.
+    '''
+
+    def __init__(
+        self, fn_create_state, fn_restore_state, *,
+        max_size=100, fn_swap_state=None,
+        max_bytes=None, fn_sizeof_state=None, fn_pack_state=None, fn_unpack_state=None,
+        compress_level=1,
+    ):
         self._fn_create = fn_create_state
         self._fn_restore = fn_restore_state
+        self._fn_swap = fn_swap_state
+        self._fn_sizeof = fn_sizeof_state
+        self._fn_pack = fn_pack_state
+        self._fn_unpack = fn_unpack_state
         self._max_size = max_size
+        self._max_bytes = max_bytes if (max_bytes and fn_sizeof_state and fn_pack_state and fn_unpack_state) else None
+        self._compress_level = compress_level
+        self._spill_file = None
+        self._spill_live = 0        # bytes in spill file that belong to steps still in stack
         self.clear()
 
     def _pop(self, *, undo=True):
         stack = (self._undo if undo else self._redo)
-        return stack.pop()
+        step = stack.pop()
+        self._load(step)
+        return step
 
     def _restore(self, step, *args, **kwargs):
         self._fn_restore(step.state, *args, **kwargs)
 
-    def _push_step(self, key, *, repeatable=False, undo=True, clear=True):
-        step = self._fn_step(key, repeatable, self._fn_create(key))
+    def _push_step(self, key, *, repeatable=False, undo=True, clear=True, state=None):
+        if state is None: state = self._fn_create(key)
+        step = UndoStep(key, repeatable, state)
         if undo:
+            # previous top might have changed since it was pushed (ex: open delta)
+            if self._undo: self._update_size(self._undo[-1])
             self._undo.append(step)
             if clear:
+                self._drop(self._redo)
                 self._redo.clear()
             # limit stack size
             while len(self._undo) > self._max_size:
-                self._undo.pop(0)
+                self._drop([self._undo.popleft()])
         else:
             self._redo.append(step)
+        self._update_size(step)
+        self._limit_memory()
 
     def _is_empty(self, *, undo=True):
         return not bool(self._undo if undo else self._redo)
@@ -64,15 +121,37 @@ class UndoStack:
         top = self._top(undo=undo)
         return top.key if top else None
 
+    def top_state(self, *, undo=True):
+        top = self._top(undo=undo)
+        if not top: return None
+        self._load(top)
+        return top.state
+
     def clear(self):
-        self._undo = []
-        self._redo = []
+        if hasattr(self, '_undo'):
+            self._drop(self._undo)
+            self._drop(self._redo)
+        self._undo = deque()
+        self._redo = deque()
         self._changes = 0
+        if self._spill_file:
+            self._spill_file.close()
+            self._spill_file = None
+        self._spill_live = 0
 
     @property
     def changes(self):
         return self._changes
 
+    @property
+    def memory(self):
+        ''' returns (bytes in memory, bytes spilled to file) '''
+        steps = [*self._undo, *self._redo]
+        return (
+            sum(step.size for step in steps),
+            sum(step.spilled[1] for step in steps if step.spilled),
+        )
+
     def push(self, key, *, repeatable=False):
         # skip pushing to undo if action is repeatable and we are repeating actions
         top = self._top()
@@ -83,9 +162,14 @@ class UndoStack:
     def pop(self, *args, undo=True, **kwargs):
         if self._is_empty(undo=undo): return
         key = 'undo' if undo else 'redo'
-        self._push_step(key, undo=not undo, clear=undo)
-        step = self._pop(undo=undo)
-        self._restore(step, *args, **kwargs)
+        if self._fn_swap:
+            step = self._pop(undo=undo)
+            state = self._fn_swap(step.state, *args, **kwargs)
+            self._push_step(key, undo=not undo, clear=undo, state=state)
+        else:
+            self._push_step(key, undo=not undo, clear=undo)
+            step = self._pop(undo=undo)
+            self._restore(step, *args, **kwargs)
         self._changes += 1
 
     #### the following code is not working??
@@ -96,6 +180,23 @@ class UndoStack:
     #     self._redo.clear()
     #     self._changes += 1
 
+    def find(self, fn_test):
+        ''' returns depth (0: top) of newest undo step whose state passes fn_test, or None '''
+        for (depth, step) in enumerate(reversed(self._undo)):
+            self._load(step)
+            if fn_test(step.state): return depth
+        return None
+
+    def squash(self, count):
+        '''
+        replaces top count undo steps with oldest of them, so that popping restores state
+        from before all of them.  ex: when newer steps cannot be restored one by one
+        '''
+        if count <= 1: return
+        steps = [self._undo.pop() for _ in range(min(count, len(self._undo)))]
+        self._drop(steps[:-1])
+        self._undo.append(steps[-1])
+
     def cancel(self, *args, **kwargs):
         if self._is_empty(): return
         step = self._pop()
@@ -106,3 +207,74 @@ class UndoStack:
         if self._is_empty(): return
         self._top().repeatable = False
 
+    ##########################################################
+    # memory budget
+
+    def _update_size(self, step):
+        if self._max_bytes and step.state is not None:
+            step.size = self._fn_sizeof(step.state)
+
+    def _limit_memory(self):
+        if not self._max_bytes: return
+        # oldest steps first.  top undo step is kept live
+        steps = [*list(self._undo)[:-1], *self._redo]
+        total = sum(step.size for step in steps) + (self._undo[-1].size if self._undo else 0)
+        for step in steps:
+            if total <= self._max_bytes: return
+            if step.state is None or not step.packable: continue
+            size = step.size
+            self._pack(step)
+            total += step.size - size
+        for step in steps:
+            if total <= self._max_bytes: return
+            if step.packed is None: continue
+            total -= step.size
+            self._spill(step)
+
+    def _pack(self, step):
+        packed = self._fn_pack(step.state)
+        if packed is None:
+            step.packable = False
+            return
+        step.stub, data = packed
+        step.packed = zlib.compress(data, self._compress_level)
+        step.state = None
+        step.size = len(step.packed)
+
+    def _spill(self, step):
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(prefix='undo_')
+        f = self._spill_file
+        f.seek(0, 2)
+        step.spilled = (f.tell(), len(step.packed))
+        f.write(step.packed)
+        self._spill_live += len(step.packed)
+        step.packed = None
+        step.size = 0
+
+    def _load(self, step):
+        ''' makes state of step live '''
+        if step.state is not None: return
+        if step.spilled is not None:
+            offset, length = step.spilled
+            self._spill_file.seek(offset)
+            data = self._spill_file.read(length)
+            self._release_spill(step)
+        else:
+            data = step.packed
+        step.state = self._fn_unpack(step.stub, zlib.decompress(data))
+        step.stub, step.packed = None, None
+        self._update_size(step)
+
+    def _drop(self, steps):
+        ''' releases spill file storage of steps removed from stack '''
+        for step in steps:
+            if step.spilled is not None: self._release_spill(step)
+
+    def _release_spill(self, step):
+        self._spill_live -= step.spilled[1]
+        step.spilled = None
+        if self._spill_live == 0 and self._spill_file:
+            # nothing left in file, so reclaim space
+            self._spill_file.seek(0)
+            self._spill_file.truncate()
@@ -426,6 +426,37 @@ class Actions:
         # indicates if currently navigating
         self.is_navigating = False
 
+    @property
+    def hit_pos(self):
+        self._resolve_hit()
+        return self._hit_pos
+    @hit_pos.setter
+    def hit_pos(self, hit_pos):
+        self._hit_fn = None
+        self._hit_pos = hit_pos
+
+    @property
+    def hit_norm(self):
+        self._resolve_hit()
+        return self._hit_norm
+    @hit_norm.setter
+    def hit_norm(self, hit_norm):
+        self._hit_fn = None
+        self._hit_norm = hit_norm
+
+    def defer_hit(self, fn):
+        '''
+        defers updating hit_pos and hit_norm until either is read, at which point
+        fn() is called and must return (hit_pos, hit_norm).  setting either drops fn
+        '''
+        self._hit_fn = fn
+
+    def _resolve_hit(self):
+        fn = self.__dict__.get('_hit_fn')
+        if not fn: return
+        self._hit_fn = None
+        self._hit_pos, self._hit_norm = fn()
+
     def call_action_operator(self, action, *args, **kwargs):
         ops_props = self.keymaps_blender_operators[action]
         if not ops_props: return
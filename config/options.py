@@ -28,6 +28,7 @@ import shelve
 import platform
 import tempfile
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from collections.abc import Iterable
 
@@ -78,11 +79,13 @@ retopoflow_urls = {
 retopoflow_files = {
     'options filename':     'RetopoFlow_options.json',
     'screenshot filename':  'RetopoFlow_screenshot.png',
-    'instrument filename':  'RetopoFlow_instrument.txt',
+    'instrument filename':  'RetopoFlow_instrument.rfil',
     'log filename':         'RetopoFlow_log.txt',
     # 'debug filename':       'RetopoFlow_debug.txt',     # hard-coded in __init__.py
     'backup filename':      'RetopoFlow_backup.blend',    # if working on unsaved blend file
     'profiler filename':    'RetopoFlow_profiler.txt',
+    'trace filename':       'RetopoFlow_trace.json',              # Chrome trace (chrome://tracing, Perfetto)
+    'speedscope filename':  'RetopoFlow_trace.speedscope.json',   # speedscope (https://www.speedscope.app)
     'keymaps filename':     'RetopoFlow_keymaps.json',
 }
 
@@ -194,6 +197,13 @@ class Options:
         'preload help images':  False,
         'async mesh loading':   True,   # True: load source meshes asynchronously
         'async image loading':  True,
+        'render chunk size':    2000,   # number of target elements per render buffer; only buffers with changed elements are regathered
+        'target incremental write': True,   # True: if target topology is unchanged, only write changed coordinates and selection back to mesh datablock
+        'source packed':        True,   # True: sources use packed arrays of evaluated mesh (no BMesh); False: sources use BMesh
+        'source cache':         True,   # True: cache packed source geometry on disk (requires 'source packed'), next to the .blend file
+        'source cache folder':  '.retopoflow_cache',
+        'source cache max size': 2048,  # MB; least recently used entries are deleted when saving a new entry would exceed this
+        'source query threads': 1,      # number of threads for batched queries over sources (>1 only helps if BVH queries release the GIL)
 
         # AUTO SAVE
         'last auto save path':  '',     # file path of last auto save (used for recover)
@@ -220,13 +230,19 @@ class Options:
 
         # DEBUG, PROFILE, INSTRUMENT SETTINGS
         'profiler':             False,  # enable profiler?
+        'trace profiler':       False,  # sample call stacks and record spans while running (saved as Chrome trace and speedscope)
+        'trace profiler interval': 0.001,   # seconds between call stack samples
         'instrument':           False,  # enable instrumentation?
+        'instrument keyframe interval': 100,    # record full target every n actions (other actions only record changes)
         'debug level':          0,      # debug level, 0--5 (for printing to console). 0=no print; 5=print all
         'debug actions':        False,  # print actions (except MOUSEMOVE) to console
 
         # UNDO SETTINGS
         'undo change tool':     False,  # should undo change the selected tool?
         'undo depth':           100,    # size of undo stack
+        'undo mode':            'delta',# 'delta': record only changes made by each action; 'copy': copy target on every push
+        'undo checkpoint interval': 50, # in delta mode, copy target every n pushes even if topology did not change (0: never)
+        'undo memory budget':   512,    # MB of memory for undo stack; older steps are compressed, then spilled to temp file (0: unlimited)
 
         'select dist':              10,         # pixels away to select
         'action dist':              20,         # pixels away to allow action
@@ -239,10 +255,15 @@ class Options:
         'visible dist offset':      0.1,        # rf_sources.visibility_preset_*
         'selection occlusion test': True,       # True: do not select occluded geometry
         'selection backface test':  True,       # True: do not select geometry that is facing away
+        'visible tile size':        64,         # pixels; occlusion rays are bucketed into screen tiles of this size
 
         'accel recompute delay':    0.125,      # seconds to wait to prevent recomputing accel structs too quickly after navigation
+        'accel backend':            'csr',      # 'csr': array-backed Accel2D_CSR; 'dict': set-based Accel2D
+        'accel update fraction':    0.10,       # patch accel structs in place if fewer than this fraction of elements changed; otherwise rebuild
         'view change delay':        0.250,      # seconds to wait before calling view change callbacks (> accel recompute delay)
         'target change delay':      0.010,      # seconds to wait before calling target change callbacks
+        'mouse raycast delay':      0.0,        # seconds between raycasts under mouse while it moves faster than 'mouse raycast speed' (0: no limit); skipped raycasts are done when hit is read
+        'mouse raycast speed':      1000,       # pixels per second
 
         'move rotate object if no selection': True,
 
@@ -397,6 +418,7 @@ class Options:
         'relax strength':               0.5,
         'relax below alpha':            0.6,
         'relax algorithm':              '3D',
+        'relax backend':                'packed',   # 'packed': vectorized forces on packed brush-local submesh; 'bmesh': per-element forces
         'relax mask boundary':          'include',
         'relax mask symmetry':          'maintain',
         'relax mask occluded':          'exclude',
@@ -465,9 +487,11 @@ class Options:
     last_change = 0     # when did we last changed an option?
     write_delay = 1.0   # seconds to wait before writing db to file
     write_error = False # True when we failed to write options to file
+    _writer = None      # single worker thread that writes db to file (see clean)
 
     def __init__(self):
         self._callbacks = []
+        self._subscribers = {}  # key => callbacks to call when option key changes (see subscribe)
         self._calling = False
         if not Options.fndb:
             Options.fndb = get_path_from_addon_root(retopoflow_files['options filename'])
@@ -487,19 +511,33 @@ class Options:
         if self[key] == val: return
         oldval = self[key]
         Options.db[key] = val
-        self.dirty()
-        self.clean()
+        self.dirty(key)
 
     def add_callback(self, callback):
+        ''' callback is called whenever any option changes (see subscribe) '''
         self._callbacks += [callback]
     def remove_callback(self, callback):
         self._callbacks = [cb for cb in self._callbacks if cb != callback]
+        for key in self._subscribers:
+            self._subscribers[key] = [cb for cb in self._subscribers[key] if cb != callback]
     def clear_callbacks(self):
         self._callbacks = []
-    def call_callbacks(self):
+        self._subscribers = {}
+    def subscribe(self, keys, callback):
+        ''' callback is called only when one of given option keys changes '''
+        if type(keys) is str: keys = [keys]
+        for key in keys:
+            assert key in Options.default_options, f'Attempting to subscribe to "{key}", but key does not exist'
+            self._subscribers.setdefault(key, []).append(callback)
+    def call_callbacks(self, keys=None):
+        ''' calls callbacks subscribed to keys (all subscribed callbacks if keys is None) and all add_callback callbacks '''
+        subscribed = self._subscribers.values() if keys is None else (self._subscribers.get(key, []) for key in keys)
+        callbacks = dict.fromkeys([*self._callbacks, *(cb for cbs in subscribed for cb in cbs)])
         self._calling = True
-        for callback in self._callbacks: callback()
-        self._calling = False
+        try:
+            for callback in callbacks: callback()
+        finally:
+            self._calling = False
 
     def get_path(self, key):
         return get_path_from_addon_root(retopoflow_files[key])
@@ -513,43 +551,78 @@ class Options:
             p = '%s.%03d.%s' % (p0, i, p1)
         return p
 
-    def update_external_vars(self):
-        Debugger.set_error_level(self['debug level'])
-        Logger.set_log_filename(retopoflow_files['log filename'])
-        # Profiler.set_profiler_enabled(self['profiler'] and retopoflow_profiler)
-        Profiler.set_profiler_filename(self.get_path('profiler filename'))
-        Drawing.set_custom_dpi_mult(self['ui scale'])
-        UI_Document.show_tooltips = self['show tooltips']
-        UI_Document.tooltip_delay = self['tooltip delay']
-        self.call_callbacks()
-
-    def dirty(self):
+    def update_external_vars(self, keys=None):
+        ''' pushes options to other modules.  if keys is given, only what depends on keys is updated '''
+        def changed(key): return keys is None or key in keys
+        if changed('debug level'):   Debugger.set_error_level(self['debug level'])
+        if keys is None:
+            Logger.set_log_filename(retopoflow_files['log filename'])
+            # Profiler.set_profiler_enabled(self['profiler'] and retopoflow_profiler)
+            Profiler.set_profiler_filename(self.get_path('profiler filename'))
+        if changed('ui scale'):      Drawing.set_custom_dpi_mult(self['ui scale'])
+        if changed('show tooltips'): UI_Document.show_tooltips = self['show tooltips']
+        if changed('tooltip delay'): UI_Document.tooltip_delay = self['tooltip delay']
+        self.call_callbacks(keys)
+
+    def dirty(self, key=None):
+        ''' key is the option that changed (None: any option may have changed) '''
         Options.is_dirty = True
         Options.last_change = time.time()
-        self.update_external_vars()
+        self.update_external_vars(None if key is None else {key})
+        self._schedule_clean()
+
+    def _schedule_clean(self):
+        # a single timer is shared by all changes; it is pushed back until write_delay has passed since last change
+        if not bpy.app.timers.is_registered(Options._clean_timer):
+            bpy.app.timers.register(Options._clean_timer, first_interval=Options.write_delay, persistent=True)
+
+    @staticmethod
+    def _clean_timer():
+        remaining = Options.last_change + Options.write_delay - time.time()
+        if remaining > 0: return remaining
+        options.clean(raise_exception=False)
+        return None
 
     def clean(self, force=False, raise_exception=True, retry=True):
+        '''
+        writes db to file once write_delay has passed since last change.  write happens on a worker
+        thread, unless force is True.  if retry, a write that is not due yet is scheduled
+        '''
         if not Options.is_dirty:
             # nothing has changed
             return
         if not force and time.time() < Options.last_change + Options.write_delay:
             # we haven't waited long enough before storing db
-            if retry: bpy.app.timers.register(self.clean, first_interval=Options.write_delay)
+            if retry: self._schedule_clean()
             return
         dprint('Writing options:', Options.db)
+        data = json.dumps(Options.db, indent=2, sort_keys=True)
+        Options.is_dirty = False
+        if not force:
+            if not Options._writer: Options._writer = ThreadPoolExecutor(max_workers=1)
+            Options._writer.submit(self._write, data, False)
+            return
+        if Options._writer:
+            # wait for pending writes, so they do not overwrite this one
+            Options._writer.submit(lambda: None).result()
+        self._write(data, raise_exception)
+
+    def _write(self, data, raise_exception):
+        '''
+        writes data to temp file next to fndb, then renames it over fndb, so that fndb is
+        never left partially written (ex: Blender crashes mid-write)
+        '''
+        temp = None
         try:
-            json.dump(
-                Options.db,
-                open(Options.fndb, 'wt'),
-                indent=2,
-                sort_keys=True,
-            )
-            Options.is_dirty = False
-        except PermissionError as e:
-            self.write_error = True
-            if raise_exception: raise e
+            fd, temp = tempfile.mkstemp(prefix='.tmp_', suffix='.json', dir=os.path.dirname(Options.fndb))
+            with os.fdopen(fd, 'wt') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp, Options.fndb)
         except Exception as e:
             self.write_error = True
+            if temp and os.path.exists(temp): os.remove(temp)
             if raise_exception: raise e
 
     def read(self):
@@ -581,7 +654,6 @@ class Options:
         if version:
             Options.db['rf version'] = retopoflow_product['version']
         self.dirty()
-        self.clean()
 
     def set_default(self, key, val):
         # does not dirty nor invoke write!
@@ -685,28 +757,31 @@ class Themes:
 
 
 class Visualization_Settings:
+    # options that source and target settings depend on
+    watch_keys = [
+        'color theme',
+        'normal offset multiplier',
+        'constrain offset',
+        'target vert size',
+        'target edge size',
+        *[f'target alpha poly {p}'         for p in ['', 'selected', 'warning', 'pinned', 'seam']],
+        *[f'target alpha poly mirror {p}'  for p in ['', 'selected', 'warning', 'pinned', 'seam']],
+        *[f'target alpha line {p}'         for p in ['', 'selected', 'warning', 'pinned', 'seam']],
+        *[f'target alpha line mirror {p}'  for p in ['', 'selected', 'warning', 'pinned', 'seam']],
+        *[f'target alpha point {p}'        for p in ['', 'selected', 'warning', 'pinned', 'seam']],
+        *[f'target alpha point mirror {p}' for p in ['', 'selected', 'warning', 'pinned', 'seam']],
+        'target alpha point highlight',
+        'target alpha mirror',
+    ]
+    watch_keys = [w.strip() for w in watch_keys]  # strip watched properties to remove trailing spaces
+
     def __init__(self):
         self._last = {}
         self.update_settings()
 
     def update_settings(self):
-        watch = [
-            'color theme',
-            'normal offset multiplier',
-            'constrain offset',
-            'target vert size',
-            'target edge size',
-            *[f'target alpha poly {p}'         for p in ['', 'selected', 'warning', 'pinned', 'seam']],
-            *[f'target alpha poly mirror {p}'  for p in ['', 'selected', 'warning', 'pinned', 'seam']],
-            *[f'target alpha line {p}'         for p in ['', 'selected', 'warning', 'pinned', 'seam']],
-            *[f'target alpha line mirror {p}'  for p in ['', 'selected', 'warning', 'pinned', 'seam']],
-            *[f'target alpha point {p}'        for p in ['', 'selected', 'warning', 'pinned', 'seam']],
-            *[f'target alpha point mirror {p}' for p in ['', 'selected', 'warning', 'pinned', 'seam']],
-            'target alpha point highlight',
-            'target alpha mirror',
-        ]
-        watch = [w.strip() for w in watch]  # strip watched properties to remove trailing spaces
-        if all(getattr(self._last, key, None) == options[key] for key in watch): return
+        watch = Visualization_Settings.watch_keys
+        if all(self._last.get(key, None) == options[key] for key in watch): return
         for key in watch: self._last[key] = options[key]
 
         color_mesh = themes['mesh']
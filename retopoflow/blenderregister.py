@@ -37,6 +37,7 @@ from bpy.app.handlers import persistent
 
 from ..addon_common.hive.hive import Hive
 from ..addon_common.common.decorators import add_cache
+from ..addon_common.common.hasher import fingerprint_register, fingerprint_unregister
 from ..addon_common.cookiecutter.cookiecutter import CookieCutter
 
 
@@ -1246,8 +1247,10 @@ if not import_succeeded:
 def register():
     for cls in RF_classes: bpy.utils.register_class(cls)
     bpy.types.VIEW3D_MT_editor_menus.append(VIEW3D_PT_RetopoFlow.draw_popover)
+    fingerprint_register()
 
 def unregister():
     if import_succeeded: ImagePreloader.quit()
+    fingerprint_unregister()
     bpy.types.VIEW3D_MT_editor_menus.remove(VIEW3D_PT_RetopoFlow.draw_popover)
     for cls in reversed(RF_classes): bpy.utils.unregister_class(cls)
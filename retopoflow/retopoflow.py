@@ -58,7 +58,7 @@ from ..addon_common.common.fontmanager import FontManager
 from ..addon_common.common.fsm import FSM
 from ..addon_common.common.globals import Globals
 from ..addon_common.common.image_preloader import ImagePreloader
-from ..addon_common.common.profiler import profiler
+from ..addon_common.common.profiler import profiler, trace_profiler
 from ..addon_common.common.utils import delay_exec, abspath, StopWatch
 from ..addon_common.common.ui_styling import load_defaultstylings
 from ..addon_common.common.ui_core import UI_Element
@@ -116,6 +116,9 @@ class RetopoFlow(
     def start(self):
         bpy.ops.ed.undo_push(message="RetopoFlow Entry")
 
+        if options['trace profiler']:
+            trace_profiler.start(interval=options['trace profiler interval'])
+
         sw = StopWatch()
 
         RetopoFlow.instance = self
@@ -165,6 +168,7 @@ class RetopoFlow(
         self.end_normalize(self.context)
         self.blender_ui_reset()
         self.undo_clear()
+        self.instrument_end()
         self.done_target()
         self.done_sources()
         FontManager.unload_fontids()
@@ -172,11 +176,22 @@ class RetopoFlow(
         bpy.ops.object.mode_set(mode='OBJECT')
         bpy.ops.object.mode_set(mode='EDIT')
         self.unmark_sources_target()  # DO THIS AS ONE OF LAST
+        self.trace_end()
         sessionoptions.clear()
         RetopoFlow.instance = None
         
         bpy.ops.ed.undo_push(message="RetopoFlow Exit")
 
+    def trace_end(self):
+        if not trace_profiler.is_running: return
+        trace_profiler.stop()
+        try:
+            trace_profiler.save_chrome_trace(options.get_path('trace filename'))
+            trace_profiler.save_speedscope(options.get_path('speedscope filename'))
+        except OSError as e:
+            print(f'RetopoFlow: could not save trace: {e}')
+        trace_profiler.clear()
+
 
 
     @FSM.on_state('loading', 'enter')
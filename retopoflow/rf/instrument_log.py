@@ -0,0 +1,200 @@
+'''
+Copyright (C) 2023 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+'''
+Binary, append-only instrumentation log.
+
+NOTE: this module only depends on the Python standard library and NumPy (no
+      bpy, no relative imports), so that it can be loaded outside of
+      Blender by scripts/instrument_replay.py.
+
+The log is a sequence of records, each holding named columns (NumPy arrays).
+
+    file    := MAGIC record*
+    record  := u32 size | 4s kind | u32 index | f64 time | f64 cost | u16 len | action | u16 ncols | column*
+    column  := u8 len | name | u8 len | dtype | u8 ndim | u32 shape[ndim] | data
+
+kind is one of
+    SESS    start of session (columns: none; action holds name of .blend file)
+    KEYF    keyframe: full target (columns: co, edges, face_offsets, face_verts, symmetry)
+    DLTA    change since previous record (columns: vert_index, vert_co)
+
+index is the action index within session, time is wall-clock time of action
+(seconds), and cost is the time spent gathering the record (seconds).  size
+covers everything after the size field, so a partial record at the end of the
+file (ex: Blender crashed mid-write) is detected and ignored.
+'''
+
+import os
+import time
+import struct
+import threading
+from queue import Queue
+from collections import namedtuple
+
+import numpy as np
+
+
+MAGIC = b'RFIL\x01\x00\x00\x00'
+
+_header = struct.Struct('<4sIddH')
+
+LogRecord = namedtuple('LogRecord', 'kind index time cost action columns')
+
+
+def encode_record(kind, index, timestamp, cost, action, columns):
+    action = action.encode('utf-8')[:0xffff]
+    parts = [_header.pack(kind, index, timestamp, cost, len(action)), action, struct.pack('<H', len(columns))]
+    for (name, data) in columns.items():
+        data = np.ascontiguousarray(data)
+        name, dtype = name.encode('utf-8'), data.dtype.str.encode('ascii')
+        parts += [
+            struct.pack('<B', len(name)), name,
+            struct.pack('<B', len(dtype)), dtype,
+            struct.pack(f'<B{data.ndim}I', data.ndim, *data.shape),
+            data.tobytes(),
+        ]
+    body = b''.join(parts)
+    return struct.pack('<I', len(body)) + body
+
+def decode_record(body):
+    kind, index, timestamp, cost, nact = _header.unpack_from(body, 0)
+    offset = _header.size
+    action = body[offset:offset+nact].decode('utf-8')
+    offset += nact
+    ncols, = struct.unpack_from('<H', body, offset)
+    offset += 2
+    columns = {}
+    for _ in range(ncols):
+        n = body[offset]; name = body[offset+1:offset+1+n].decode('utf-8'); offset += 1 + n
+        n = body[offset]; dtype = np.dtype(body[offset+1:offset+1+n].decode('ascii')); offset += 1 + n
+        ndim = body[offset]; shape = struct.unpack_from(f'<{ndim}I', body, offset+1); offset += 1 + 4 * ndim
+        count = int(np.prod(shape, dtype=np.int64))
+        columns[name] = np.frombuffer(body, dtype=dtype, count=count, offset=offset).reshape(shape)
+        offset += count * dtype.itemsize
+    return LogRecord(kind, index, timestamp, cost, action, columns)
+
+
+class InstrumentLogWriter:
+    '''
+    appends records to log file.  records are encoded on the calling thread and
+    written by a background thread, so writing never blocks the caller
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = Queue()
+        self._thread = None
+
+    def write(self, kind, index, action, columns, *, cost=0.0, timestamp=None):
+        if timestamp is None: timestamp = time.time()
+        self._queue.put(encode_record(kind, index, timestamp, cost, action, columns))
+        if not self._thread:
+            self._thread = threading.Thread(target=self._write_out, daemon=True)
+            self._thread.start()
+
+    def _write_out(self):
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, 'ab') as f:
+            if new: f.write(MAGIC)
+            while True:
+                data = self._queue.get()
+                if data is None: break
+                f.write(data)
+                if self._queue.empty(): f.flush()
+
+    def close(self):
+        ''' waits for all records to be written '''
+        if not self._thread: return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+
+class InstrumentLogReader:
+    ''' reads records of log file, grouped into sessions '''
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(MAGIC):
+            raise ValueError(f'{self.path} is not a RetopoFlow instrumentation log')
+        offset = len(MAGIC)
+        while offset + 4 <= len(data):
+            size, = struct.unpack_from('<I', data, offset)
+            if offset + 4 + size > len(data): break     # partial record
+            yield decode_record(data[offset+4:offset+4+size])
+            offset += 4 + size
+
+    def sessions(self):
+        ''' returns list of sessions, each a list of records '''
+        sessions = []
+        for record in self:
+            if record.kind == b'SESS' or not sessions: sessions.append([])
+            sessions[-1].append(record)
+        return sessions
+
+
+class InstrumentReplay:
+    '''
+    rebuilds target at any action index of a session by starting from the
+    nearest keyframe and applying the deltas that follow it
+    '''
+
+    def __init__(self, records):
+        self.records = [ r for r in records if r.kind in {b'KEYF', b'DLTA'} ]
+
+    def __len__(self):
+        return len(self.records)
+
+    def mesh_at(self, i):
+        '''
+        returns target after record i, in same layout as RFTarget.to_json:
+        dict with verts, edges, faces, symmetry
+        '''
+        k = next((j for j in range(i, -1, -1) if self.records[j].kind == b'KEYF'), None)
+        if k is None: raise ValueError(f'no keyframe at or before record {i}')
+        key = self.records[k].columns
+        co = np.array(key['co'], dtype=np.float32)
+        for record in self.records[k+1:i+1]:
+            cols = record.columns
+            co[cols['vert_index']] = cols['vert_co']
+        offsets, fverts = key['face_offsets'], key['face_verts'].tolist()
+        return {
+            'verts':    co.tolist(),
+            'edges':    key['edges'].tolist(),
+            'faces':    [ fverts[i0:i1] for (i0, i1) in zip(offsets[:-1].tolist(), offsets[1:].tolist()) ],
+            'symmetry': [ bool(s) for s in key['symmetry'].tolist() ],
+        }
+
+    def timings(self):
+        '''
+        returns list of (record index, action index, action, duration, cost), where duration
+        is time until next action (None for last) and cost is time spent recording action
+        '''
+        times = [ r.time for r in self.records ]
+        return [
+            (i, r.index, r.action, (times[i+1] - times[i]) if i + 1 < len(times) else None, r.cost)
+            for (i, r) in enumerate(self.records)
+        ]
@@ -56,7 +56,7 @@ class RetopoFlow_Drawing:
             self.rftarget_draw.replace_opts(target_opts)
             # self.document.body.dirty(cause='--> options changed', children=True)
             for d in self.rfsources_draw: d.replace_opts(source_opts)
-        options.add_callback(callback)
+        options.subscribe(['ui scale', *visualization.watch_keys], callback)
         self._draw_count = 0
 
     @DrawCallbacks.on_predraw()
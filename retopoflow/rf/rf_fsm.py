@@ -81,6 +81,9 @@ class RetopoFlow_FSM(CookieCutter): # CookieCutter must be here in order to over
             self._last_rfwidget = self.rftool.rfwidget
             tag_redraw_all('RFWidget change')
 
+        if self.update_sources():
+            tag_redraw_all('RF_FSM source change')
+
         rftarget_version = self.rftarget.get_version()
         if self.rftarget_version != rftarget_version:
             self.rftarget_version = rftarget_version
@@ -96,10 +99,32 @@ class RetopoFlow_FSM(CookieCutter): # CookieCutter must be here in order to over
             self.callback_view_change()
             tag_redraw_all('RF_FSM view change')
 
-        self.actions.hit_pos,self.actions.hit_norm,_,_ = self.raycast_sources_mouse()
+        self.update_mouse_hit()
         fpsdiv = self.document.body.getElementById('fpsdiv')
         if fpsdiv: fpsdiv.innerText = f'UI FPS: {self.document._draw_fps:.2f}'
 
+    def update_mouse_hit(self):
+        '''
+        updates actions.hit_pos and actions.hit_norm.  raycast_sources_mouse caches the hit,
+        so nothing is raycast unless mouse, view, or sources changed.  while the mouse moves
+        quickly, raycasting is limited to once per 'mouse raycast delay' seconds, and the
+        skipped raycasts are done only if a tool reads the hit
+        '''
+        mouse, now = self.actions.mouse, time.time()
+        delay, last = options['mouse raycast delay'], getattr(self, '_mouse_hit_last', None)
+        if delay > 0 and mouse and last:
+            last_mouse, last_time = last
+            elapsed = now - last_time
+            if elapsed < delay and (mouse - last_mouse).length > options['mouse raycast speed'] * elapsed:
+                self.actions.defer_hit(self._raycast_mouse_hit)
+                return
+        self._mouse_hit_last = (Point2D(mouse), now) if mouse else None
+        self.actions.hit_pos,self.actions.hit_norm = self._raycast_mouse_hit()
+
+    def _raycast_mouse_hit(self):
+        p,n,_,_ = self.raycast_sources_mouse()
+        return (p, n)
+
     # @CallGovernor.limit(fn_delay=lambda:options['target change delay'])
     def callback_target_change(self):
         # throttling this fn will cause target_change and draw callbacks to get out-of-sync
@@ -444,7 +469,6 @@ class RetopoFlow_FSM(CookieCutter): # CookieCutter must be here in order to over
         self.context.workspace.status_text_set(f'Rotating selected: {statusbar}')
 
         self.fast_update_timer.start()
-        self.split_target_visualization_selected()
         self.set_accel_defer(True)
         tag_redraw_all('rotate init')
 
@@ -470,14 +494,15 @@ class RetopoFlow_FSM(CookieCutter): # CookieCutter must be here in order to over
         dx,dy = opts['rotate_x'].dot(delta),opts['rotate_y'].dot(delta)
         theta = math.atan2(dy, dx)
 
-        set2D_vert = self.set2D_vert
+        bmvs, nxys = [], []
         for bmv,xy in opts['bmverts']:
             if not bmv.is_valid: continue
             dxy = xy - opts['center']
             nx = dxy.x * math.cos(theta) - dxy.y * math.sin(theta)
             ny = dxy.x * math.sin(theta) + dxy.y * math.cos(theta)
-            nxy = Point2D((nx, ny)) + opts['center']
-            set2D_vert(bmv, nxy)
+            bmvs.append(bmv)
+            nxys.append(Point2D((nx, ny)) + opts['center'])
+        self.snap_verts(bmvs, 'raycast', xys=nxys)
         self.update_verts_faces(v for v,_ in opts['bmverts'])
         self.dirty()
         tag_redraw_all('rotate mouse move')
@@ -505,7 +530,6 @@ class RetopoFlow_FSM(CookieCutter): # CookieCutter must be here in order to over
     @FSM.on_state('rotate selected', 'exit')
     def rotate_selected_exit(self):
         self.fast_update_timer.stop()
-        self.clear_split_target_visualization()
         self.set_accel_defer(False)
         self._update_rftool_ui()
 
@@ -538,7 +562,6 @@ class RetopoFlow_FSM(CookieCutter): # CookieCutter must be here in order to over
         self.context.workspace.status_text_set(f'Scaling selected: {statusbar}')
 
         self.fast_update_timer.start()
-        self.split_target_visualization_selected()
         self.set_accel_defer(True)
         tag_redraw_all('scale init')
 
@@ -562,12 +585,13 @@ class RetopoFlow_FSM(CookieCutter): # CookieCutter must be here in order to over
 
         dist = (self.actions.mouse - opts['center']).length
 
-        set2D_vert = self.set2D_vert
+        bmvs, nxys = [], []
         for bmv,xy in opts['bmverts']:
             if not bmv.is_valid: continue
             dxy = xy - opts['center']
-            nxy = dxy * dist / opts['start_dist'] + opts['center']
-            set2D_vert(bmv, nxy)
+            bmvs.append(bmv)
+            nxys.append(dxy * dist / opts['start_dist'] + opts['center'])
+        self.snap_verts(bmvs, 'raycast', xys=nxys)
         self.update_verts_faces(v for v,_ in opts['bmverts'])
         self.dirty()
         tag_redraw_all('scale mouse move')
@@ -595,7 +619,6 @@ class RetopoFlow_FSM(CookieCutter): # CookieCutter must be here in order to over
     @FSM.on_state('scale selected', 'exit')
     def scale_selected_exit(self):
         self.fast_update_timer.stop()
-        self.clear_split_target_visualization()
         self.set_accel_defer(False)
         self._update_rftool_ui()
 
@@ -769,7 +792,6 @@ class RetopoFlow_FSM(CookieCutter): # CookieCutter must be here in order to over
     @FSM.on_state('smart selection painting', 'enter')
     def smart_selection_painting_enter(self):
         self.fast_update_timer.start()
-        self.split_target_visualization_visible()
         self.set_accel_defer(True)
 
 
@@ -821,7 +843,6 @@ class RetopoFlow_FSM(CookieCutter): # CookieCutter must be here in order to over
     def smart_selection_painting_exit(self):
         self.selection_painting_opts = None
         self.fast_update_timer.stop()
-        self.clear_split_target_visualization()
         self.set_accel_defer(False)
 
 
@@ -911,7 +932,6 @@ class RetopoFlow_FSM(CookieCutter): # CookieCutter must be here in order to over
     def move_enter(self):
         # if not self.move_done_released and options['hide cursor on tweak']: self.set_widget('hidden')
         if options['hide cursor on tweak']: Cursors.set('NONE')
-        self.split_target_visualization_selected()
         self.fast_update_timer.start()
         self.set_accel_defer(True)
 
@@ -956,5 +976,4 @@ class RetopoFlow_FSM(CookieCutter): # CookieCutter must be here in order to over
     def move_exit(self):
         self.fast_update_timer.stop()
         self.set_accel_defer(False)
-        self.clear_split_target_visualization()
 
@@ -19,43 +19,84 @@ Created by Jonathan Denning, Jonathan Williamson, and Patrick Moore
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
-import bpy
-import json
-from queue import Queue
+import os
+import time
 
+import bpy
+import numpy as np
+from bmesh.types import BMVert
 
 from ...config.options import options
+from ...addon_common.common.profiler import profiler
+from .instrument_log import InstrumentLogWriter
+
 
 class RetopoFlow_Instrumentation:
-    instrument_queue = Queue()
-    instrument_thread = None
+    '''
+    records every action (with state of target) into binary, append-only log file.
+    see instrument_log.py for file format, and scripts/instrument_replay.py for reading it.
+
+    most actions only move verts, so only the touched verts are recorded (DLTA).  the whole
+    target is recorded (KEYF) when topology changed, when the target is replaced (ex: undo
+    restores a checkpoint), or every 'instrument keyframe interval' records
+    '''
+
+    instrument_writer = None
 
+    def _instrument_start(self):
+        path = options.get_path('instrument filename')
+        RetopoFlow_Instrumentation.instrument_writer = InstrumentLogWriter(path)
+        self._instrument_index = 0
+        self._instrument_key = None
+        self._instrument_since_keyframe = 0
+        blend = os.path.basename(bpy.data.filepath) or '(unsaved)'
+        self.instrument_writer.write(b'SESS', 0, blend, {})
+
+    @profiler.function
     def instrument_write(self, action):
         if not options['instrument']: return
+        if not self.instrument_writer or not hasattr(self, '_instrument_index'): self._instrument_start()
+
+        start = time.perf_counter()
+        rftarget = self.rftarget
+        key = (id(rftarget), rftarget.get_topology_version(), rftarget._get_counts())
+        touched = None
+        if key == self._instrument_key and self._instrument_since_keyframe < options['instrument keyframe interval']:
+            touched = rftarget.get_touched_since(self._instrument_counter)
+        if touched is not None:
+            touched |= rftarget.get_touched_pending()
+            kind, columns = b'DLTA', self._instrument_delta(rftarget, touched)
+            self._instrument_since_keyframe += 1
+        else:
+            kind, columns = b'KEYF', self._instrument_keyframe(rftarget)
+            self._instrument_since_keyframe = 0
+        self._instrument_key = key
+        self._instrument_counter = rftarget.get_dirty_counter()
+
+        self.instrument_writer.write(kind, self._instrument_index, action, columns, cost=time.perf_counter()-start)
+        self._instrument_index += 1
+
+    def _instrument_keyframe(self, rftarget):
+        bme = rftarget.bme
+        bme.verts.index_update()
+        face_verts = [ [bmv.index for bmv in bmf.verts] for bmf in bme.faces ]
+        return {
+            'co':           np.array([bmv.co for bmv in bme.verts], dtype=np.float32).reshape((-1, 3)),
+            'edges':        np.array([(bme_.verts[0].index, bme_.verts[1].index) for bme_ in bme.edges], dtype=np.int32).reshape((-1, 2)),
+            'face_offsets': np.cumsum([0] + [len(fv) for fv in face_verts], dtype=np.int64).astype(np.int32),
+            'face_verts':   np.fromiter((i for fv in face_verts for i in fv), dtype=np.int32),
+            'symmetry':     np.array(list(rftarget.mirror_mod.xyz), dtype=np.uint8),
+        }
+
+    def _instrument_delta(self, rftarget, touched):
+        bmvs = [ bmv for bmv in touched if type(bmv) is BMVert and bmv.is_valid ]
+        rftarget.bme.verts.index_update()
+        return {
+            'vert_index': np.array([bmv.index for bmv in bmvs], dtype=np.int32),
+            'vert_co':    np.array([bmv.co for bmv in bmvs], dtype=np.float32).reshape((-1, 3)),
+        }
 
-        tb_name = options.get_path('instrument_filename')
-        if tb_name not in bpy.data.texts: bpy.data.texts.new(tb_name)
-        tb = bpy.data.texts[tb_name]
-
-        target_json = self.rftarget.to_json()
-        data = {'action': action, 'target': target_json}
-        data_str = json.dumps(data, separators=[',',':'], indent=0)
-        self.instrument_queue.put(data_str)
-
-        # write data to end of textblock asynchronously
-        # TODO: try writing to file (text/binary), because writing to textblock is _very_ slow! :(
-        def write_out():
-            while True:
-                if self.instrument_queue.empty():
-                    time.sleep(0.1)
-                    continue
-                data_str = self.instrument_queue.get()
-                data_str = data_str.splitlines()
-                tb.write('')        # position cursor to end
-                for line in data_str:
-                    tb.write(line)
-                tb.write('\n')
-        if not self.instrument_thread:
-            # executor only needed to start the following instrument_thread
-            executor = ThreadPoolExecutor()
-            self.instrument_thread = executor.submit(write_out)
+    def instrument_end(self):
+        if not self.instrument_writer: return
+        self.instrument_writer.close()
+        RetopoFlow_Instrumentation.instrument_writer = None
@@ -21,7 +21,9 @@ Created by Jonathan Denning, Jonathan Williamson
 
 import bpy
 import time
+import numpy as np
 from math import isinf, isnan
+from concurrent.futures import ThreadPoolExecutor
 
 from ...config.options import visualization, options
 from ...addon_common.common.maths import BBox
@@ -29,11 +31,12 @@ from ...addon_common.common.profiler import profiler, time_it
 from ...addon_common.common.debug import dprint
 from ...addon_common.common.maths import Point, Vec, Direction, Normal, Ray, XForm, Plane
 from ...addon_common.common.maths import Point2D
-from ...addon_common.common.maths_accel import Accel2D
+from ...addon_common.common.maths_accel import Accel2D, Accel3D_Boxes
 from ...addon_common.common.timerhandler import CallGovernor
 
 from ..rfmesh.rfmesh import RFSource
 from ..rfmesh.rfmesh_render import RFMeshRender
+from ..rfmesh.rfmesh_visibility import VisibilityPass, VisibilitySource
 
 
 class RetopoFlow_Sources:
@@ -64,6 +67,18 @@ class RetopoFlow_Sources:
         del self.rfsources_draw
         del self.rfsources
 
+    @profiler.function
+    def update_sources(self):
+        '''
+        sets up sources again whose objects were re-evaluated outside of RetopoFlow.
+        called once per frame, so queries never set up a source.  returns True if any changed
+        '''
+        changed = [ rfs for rfs in self.rfsources if rfs.check_changed() ]
+        if not changed: return False
+        dprint(f'{len(changed)} sources changed')
+        self.sources_bbox = BBox.merge(rfs.get_bbox() for rfs in self.rfsources)
+        return True
+
     @profiler.function
     def setup_sources_symmetry(self):
         xyplane,xzplane,yzplane = self.rftarget.get_xy_plane(),self.rftarget.get_xz_plane(),self.rftarget.get_yz_plane()
@@ -100,6 +115,40 @@ class RetopoFlow_Sources:
         n = rfsource.get_obj_name()
         return self.snap_sources.get(n, True)
 
+    ###################################################
+    # top-level acceleration structure over sources
+
+    def get_sources_accel(self):
+        '''
+        returns Accel3D_Boxes over world bboxes of all sources, which is rebuilt only
+        when a source changes.  snap toggles are handled per query (see _sources_snap_mask)
+        '''
+        key = tuple(rfs.get_version(selection=False) for rfs in self.rfsources)
+        if getattr(self, '_sources_accel_key', None) != key:
+            bounds = [ rfs.get_world_bounds() for rfs in self.rfsources ]
+            self._sources_accel = Accel3D_Boxes([ mn for (mn, _) in bounds ], [ mx for (_, mx) in bounds ])
+            self._sources_accel_key = key
+        return self._sources_accel
+
+    def _sources_snap_mask(self):
+        return np.array([ self.get_rfsource_snap(rfs) for rfs in self.rfsources ], dtype=bool)
+
+    def _iter_sources_Ray(self, ray:Ray):
+        ''' yields (rfsource, entry distance) of snappable sources whose bbox ray reaches, nearest first '''
+        idxs, dists = self.get_sources_accel().ray_order(ray.o, ray.d, max_dist=ray.max, mask=self._sources_snap_mask())
+        for (idx, dist) in zip(idxs, dists):
+            yield (self.rfsources[idx], dist)
+
+    def _map_sources(self, fn, rfsources):
+        '''
+        returns [fn(rfsource) for rfsource in rfsources], spread across a thread pool when
+        'source query threads' > 1.  only helps where the BVH queries release the GIL
+        '''
+        threads = min(options['source query threads'], len(rfsources))
+        if threads <= 1: return [ fn(rfsource) for rfsource in rfsources ]
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            return list(executor.map(fn, rfsources))
+
     ###################################################
     # ray casting functions
 
@@ -107,8 +156,8 @@ class RetopoFlow_Sources:
         if correct_mirror is None: correct_mirror = options['symmetry mirror input']
         ignore_backface = self.ray_ignore_backface_sources() if ignore_backface is None else ignore_backface
         bp,bn,bi,bd,bo = None,None,None,None,None
-        for rfsource in self.rfsources:
-            if not self.get_rfsource_snap(rfsource): continue
+        for rfsource, entry in self._iter_sources_Ray(ray):
+            if bp and bd < entry: break     # remaining sources are all farther than closest hit
             hp,hn,hi,hd = rfsource.raycast(ray, ignore_backface=ignore_backface)
             if hp is None:     continue     # did we miss?
             if isinf(hd):      continue     # is distance infinitely far away?
@@ -118,6 +167,31 @@ class RetopoFlow_Sources:
         if correct_mirror and bp and bn: bp, bn = self.mirror_point_normal(bp, bn)
         return (bp,bn,bi,bd)
 
+    @profiler.function
+    def raycast_sources_Rays(self, origins, directions, *, correct_mirror=None, ignore_backface=None):
+        '''
+        batched version of raycast_sources_Ray for unbounded rays.  origins and directions are (N,3)
+        arrays in world space.  returns (co, no, dist, hit) arrays, where hit is False for rays that
+        miss all sources
+        '''
+        if correct_mirror is None: correct_mirror = options['symmetry mirror input']
+        ignore_backface = self.ray_ignore_backface_sources() if ignore_backface is None else ignore_backface
+        origins = np.asarray(origins, dtype=np.float64).reshape((-1, 3))
+        directions = np.asarray(directions, dtype=np.float64).reshape((-1, 3))
+        count = len(origins)
+        co, no = np.zeros((count, 3)), np.zeros((count, 3))
+        dist = np.full(count, np.inf)
+        mask = self._sources_snap_mask()
+        rfsources = [ rfs for (rfs, m) in zip(self.rfsources, mask) if m ]
+        fn = lambda rfs: rfs.raycast_batch(origins, directions, ignore_backface=ignore_backface)
+        for (hp, hn, _, hd) in self._map_sources(fn, rfsources):
+            closer = hd < dist
+            co[closer], no[closer], dist[closer] = hp[closer], hn[closer], hd[closer]
+        hit = np.isfinite(dist)
+        if correct_mirror and hit.any():
+            co[hit], no[hit] = self.mirror_points_normals(co[hit], no[hit])
+        return (co, no, dist, hit)
+
     def raycast_sources_Ray_all(self, ray:Ray):
         return [
             hit
@@ -135,7 +209,27 @@ class RetopoFlow_Sources:
         return self.raycast_sources_Ray_all(self.Point2D_to_Ray(xy, min_dist=self.drawing.space.clip_start))
 
     def raycast_sources_mouse(self, *, correct_mirror=None, ignore_backface=None):
-        return self.raycast_sources_Point2D(self.actions.mouse, correct_mirror=correct_mirror, ignore_backface=ignore_backface)
+        '''
+        hit is cached until mouse, view, sources, or settings that affect the raycast change
+        '''
+        if correct_mirror is None: correct_mirror = options['symmetry mirror input']
+        ignore_backface = self.ray_ignore_backface_sources() if ignore_backface is None else ignore_backface
+        mouse = self.actions.mouse
+        if mouse is None: return None,None,None,None
+        mm = self.rftarget.mirror_mod
+        key = (
+            tuple(mouse),
+            self.get_view_version(),
+            self.drawing.space.clip_start,
+            tuple(rfs.get_version(selection=False) for rfs in self.rfsources),
+            tuple(self._sources_snap_mask().tolist()),
+            ignore_backface,
+            correct_mirror and (mm.x, mm.y, mm.z),
+        )
+        if getattr(self, '_raycast_mouse_key', None) != key:
+            self._raycast_mouse = self.raycast_sources_Point2D(mouse, correct_mirror=correct_mirror, ignore_backface=ignore_backface)
+            self._raycast_mouse_key = key
+        return self._raycast_mouse
 
     def raycast_sources_Point(self, xyz:Point, *, correct_mirror=None, ignore_backface=None):
         if xyz is None: return None,None,None,None
@@ -148,14 +242,53 @@ class RetopoFlow_Sources:
 
     def nearest_sources_Point(self, point:Point, max_dist=float('inf')): #sys.float_info.max):
         bp,bn,bi,bd = None,None,None,None
-        for rfsource in self.rfsources:
-            if not self.get_rfsource_snap(rfsource): continue
+        idxs, dists = self.get_sources_accel().point_order(point, max_dist=max_dist, mask=self._sources_snap_mask())
+        for (idx, dist) in zip(idxs, dists):
+            if bp is not None and bd < dist: break  # remaining sources are all farther than nearest point
+            rfsource = self.rfsources[idx]
             hp,hn,hi,hd = rfsource.nearest(point, max_dist=max_dist)
             if bp is None or (hp is not None and hd < bd):
                 bp,bn,bi,bd = hp,hn,hi,hd
         return (bp,bn,bi,bd)
 
 
+    @profiler.function
+    def nearest_sources_Points(self, points, max_dist=float('inf')):
+        '''
+        batched version of nearest_sources_Point.  points is (N,3) array of world-space points.
+        returns (co, no, dist, hit) arrays, where hit is False for points with no source within max_dist
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape((-1, 3))
+        count = len(points)
+        co, no = np.zeros((count, 3)), np.zeros((count, 3))
+        dist = np.full(count, np.inf)
+        accel = self.get_sources_accel()
+        idxs = np.flatnonzero(self._sources_snap_mask() & accel.valid)
+        if not count or not len(idxs): return (co, no, dist, np.zeros(count, dtype=bool))
+        # distance from each point to bbox of each source
+        delta = np.maximum(np.maximum(accel.mins[idxs, None, :] - points, points - accel.maxs[idxs, None, :]), 0.0)
+        box_dist = np.linalg.norm(delta, axis=2)
+
+        def merge(result, rows):
+            hp, hn, _, hd = result
+            closer = hd < dist[rows]
+            rows = rows[closer]
+            co[rows], no[rows], dist[rows] = hp[closer], hn[closer], hd[closer]
+
+        if min(options['source query threads'], len(idxs)) > 1:
+            rows = [ np.flatnonzero(bd <= max_dist) for bd in box_dist ]
+            fn = lambda k: self.rfsources[idxs[k]].nearest_batch(points[rows[k]], max_dist=max_dist)
+            for (k, result) in enumerate(self._map_sources(fn, range(len(idxs)))):
+                merge(result, rows[k])
+        else:
+            # visit nearer sources first, and skip points already closer to a hit than to bbox of source
+            for k in np.argsort(box_dist.min(axis=1), kind='stable'):
+                rows = np.flatnonzero((box_dist[k] <= max_dist) & (box_dist[k] < dist))
+                if not len(rows): continue
+                merge(self.rfsources[idxs[k]].nearest_batch(points[rows], max_dist=max_dist), rows)
+        return (co, no, dist, np.isfinite(dist))
+
+
     ###################################################
     # plane intersection
 
@@ -182,7 +315,7 @@ class RetopoFlow_Sources:
     def _raycast_hit_any(self, ray, ignore_backface):
         return any(
             rfsource.raycast_hit(ray, ignore_backface=ignore_backface)
-            for rfsource in self.rfsources if self.get_rfsource_snap(rfsource)
+            for (rfsource, _) in self._iter_sources_Ray(ray)
         )
 
     def gen_is_visible(self, *, bbox_factor_override=None, dist_offset_override=None, occlusion_test_override=None, backface_test_override=None):
@@ -211,6 +344,29 @@ class RetopoFlow_Sources:
 
         return is_visible
 
+    def gen_visibility_pass(self, *, bbox_factor_override=None, dist_offset_override=None, occlusion_test_override=None, backface_test_override=None):
+        '''
+        batched version of gen_is_visible.  returned VisibilityPass tests arrays of
+        world-space points and normals at once (see VisibilityPass.mask)
+        '''
+        backface_test  = options['selection backface test']  if backface_test_override  is None else backface_test_override
+        occlusion_test = options['selection occlusion test'] if occlusion_test_override is None else occlusion_test_override
+        bbox_factor    = options['visible bbox factor']      if bbox_factor_override    is None else bbox_factor_override
+        dist_offset    = options['visible dist offset']      if dist_offset_override    is None else dist_offset_override
+        return VisibilityPass(
+            self.get_view_projection(),
+            [
+                VisibilitySource(rfsource.get_bvh(), rfsource.xform.mx_p, rfsource.get_bbox().corners)
+                for rfsource in self.rfsources if self.get_rfsource_snap(rfsource)
+            ] if occlusion_test else [],
+            clip_start=self.drawing.space.clip_start,
+            max_dist_offset=self.sources_bbox.get_min_dimension() * bbox_factor + dist_offset,
+            ignore_backface=self.ray_ignore_backface_sources(),
+            backface_test=backface_test,
+            occlusion_test=occlusion_test,
+            tile_size=options['visible tile size'],
+        )
+
     def gen_is_nonvisible(self, *args, **kwargs):
         is_visible = self.gen_is_visible(*args, **kwargs)
         def is_nonvisible(*args, **kwargs):
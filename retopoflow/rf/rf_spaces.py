@@ -37,6 +37,18 @@ from ...addon_common.common.maths import Ray, XForm, Plane
 from ...addon_common.common.maths import Point2D, Vec2D, Direction2D
 from ...addon_common.common.decorators import blender_version_wrapper
 
+from ..rfmesh.rfmesh_visibility import VisibilityView
+
+
+class ViewProjection(VisibilityView):
+    '''
+    batched world-to-screen projection.  same math as location_3d_to_region_2d,
+    but projects whole (N,3) arrays of points with a single matrix multiply.
+    '''
+
+    def __init__(self, region, r3d):
+        super().__init__(r3d.perspective_matrix, r3d.view_matrix, r3d.is_perspective, region.width, region.height)
+
 
 class RetopoFlow_Spaces:
     '''
@@ -140,6 +152,32 @@ class RetopoFlow_Spaces:
         if xy is None: return None
         return Point2D(xy)
 
+    def get_view_projection(self):
+        '''
+        returns ViewProjection for current view, which is cached until view changes
+        '''
+        region, r3d = self.actions.region, self.actions.r3d
+        key = (self.get_view_version(), r3d.is_perspective, region.width, region.height)
+        if getattr(self, '_view_projection_key', None) != key:
+            self._view_projection = ViewProjection(region, r3d)
+            self._view_projection_key = key
+        return self._view_projection
+
+    def Points_to_Point2Ds(self, co):
+        '''
+        batched version of Point_to_Point2D.  co is (N,3) array of world-space points.
+        returns (xy, valid); see ViewProjection.project
+        '''
+        return self.get_view_projection().project(co)
+
+    def Point2Ds_to_Rays(self, xy, *, min_dist=0.0):
+        '''
+        batched version of Point2D_to_Ray.  xy is (N,2) array of screen positions.
+        returns (origins, directions) as (N,3) arrays, where origins are pushed min_dist along directions
+        '''
+        o, d = self.get_view_projection().rays_from(xy)
+        return (o + d * min_dist, d)
+
     alerted_small_clip_start = False
     def Point_to_depth(self, xyz):
         '''
@@ -193,6 +231,11 @@ class RetopoFlow_Spaces:
     def Point2D_in_area(self, p2D):
         return p2D and (0 <= p2D.x <= self.actions.size.x) and (0 <= p2D.y <= self.actions.size.y)
 
+    def Point2Ds_in_area(self, xy):
+        ''' batched version of Point2D_in_area.  xy is (...,2) array '''
+        x, y = xy[..., 0], xy[..., 1]
+        return (0 <= x) & (x <= self.actions.size.x) & (0 <= y) & (y <= self.actions.size.y)
+
 
     #############################################
     # return camera up and right vectors
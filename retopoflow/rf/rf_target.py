@@ -25,7 +25,9 @@ import traceback
 from itertools import chain
 
 import bpy
+import numpy as np
 
+from bmesh.types import BMVert, BMEdge, BMFace
 from mathutils import Vector
 from mathutils.geometry import intersect_line_line_2d as intersect_segment_segment_2d
 
@@ -36,12 +38,13 @@ from ...addon_common.common.profiler import profiler, time_it
 from ...addon_common.common.utils import iter_pairs, Dict
 from ...addon_common.common.maths import Point, Vec, Direction, Normal, Ray, XForm, BBox
 from ...addon_common.common.maths import Point2D, Vec2D, Direction2D
-from ...addon_common.common.maths_accel import Accel2D
+from ...addon_common.common.maths_accel import Accel2D, Accel2D_CSR, Accel3D_Segments
 from ...addon_common.common.text import fix_string
 
 from ..rfmesh.rfmesh import RFMesh, RFVert, RFEdge, RFFace
 from ..rfmesh.rfmesh import RFSource, RFTarget
 from ..rfmesh.rfmesh_render import RFMeshRender
+from ..rfmesh.rfmesh_snapshot import gather_co, gather_normal, xform_points, xform_normals
 
 
 class RetopoFlow_Target:
@@ -157,39 +160,37 @@ class RetopoFlow_Target:
         self.get_target().to_mesh_clear()
 
 
-    #########################################
-    # split target visualization
-
-    def clear_split_target_visualization(self):
-        self.rftarget_draw.split_visualization()
-
-    def split_target_visualization(self, verts=None, edges=None, faces=None):
-        self.rftarget_draw.split_visualization(verts=verts, edges=edges, faces=faces)
-
-    def split_target_visualization_selected(self):
-        self.rftarget_draw.split_visualization(
-            verts=self.get_selected_verts(),
-            edges=self.get_selected_edges(),
-            faces=self.get_selected_faces(),
-        )
-
-    def split_target_visualization_visible(self):
-        self.rftarget_draw.split_visualization(
-            verts=self.accel_vis_verts,
-            edges=self.accel_vis_edges,
-            faces=self.accel_vis_faces,
-        )
-
-
     #########################################
     # acceleration structures
 
     def set_accel_defer(self, defer): self.accel_defer_recomputing = defer
 
+    @staticmethod
+    def _new_accel2D(*args, **kwargs):
+        ''' creates 2D accel struct using backend chosen in options '''
+        Accel = Accel2D_CSR if options['accel backend'] == 'csr' else Accel2D
+        return Accel(*args, **kwargs)
+
     def get_accel_visible(self, **kwargs):
         accel_data = self._generate_accel_data_struct(**kwargs)
         return accel_data.accel
 
+    @profiler.function
+    def get_accel_boundary(self):
+        '''
+        returns Accel3D_Segments over world-space boundary (non-manifold, revealed) edges of target.
+        the accel struct is a snapshot, so build it once when a stroke starts and query it with
+        accel.nearest(co) when sliding verts along boundary
+        '''
+        bmes = [
+            bme for bme in self.rftarget.bme.edges
+            if RFMesh.fn_is_valid_revealed(bme) and not bme.is_manifold
+        ]
+        mx_p = self.rftarget.xform.mx_p
+        p0 = xform_points(mx_p, gather_co((bme.verts[0] for bme in bmes), len(bmes)))
+        p1 = xform_points(mx_p, gather_co((bme.verts[1] for bme in bmes), len(bmes)))
+        return Accel3D_Segments(p0, p1)
+
     def _generate_accel_data_struct(self, *, selected_only=None, force=False):
         target_version = self.get_target_version(selection=selected_only)
         view_version = self.get_view_version()
@@ -218,6 +219,7 @@ class RetopoFlow_Target:
             accel_data.selection_backface_test     != options['selection backface test'],
             accel_data.ray_ignore_backface_sources != self.ray_ignore_backface_sources(),
             accel_data.mirror_mod                  != (mm.x, mm.y, mm.z),
+            accel_data.accel_backend               != options['accel backend'],
         ])
 
         delay_recompute = ([
@@ -238,6 +240,12 @@ class RetopoFlow_Target:
 
         accel_data.recompute = False
 
+        if not force and self._update_accel_data_struct(accel_data, selected_only):
+            accel_data.target_version = target_version
+            accel_data.dirty_counter  = self.rftarget.get_dirty_counter()
+            accel_data.draw_count     = self._draw_count
+            return accel_data
+
         match selected_only:
             case None:
                 verts, edges, faces = None, None, None
@@ -255,12 +263,13 @@ class RetopoFlow_Target:
             accel_data.edges = self.visible_edges(edges=edges, verts=accel_data.verts)
             accel_data.faces = self.visible_faces(faces=faces, verts=accel_data.verts)
         with time_it('building accel struct', enabled=False):
-            accel_data.accel = Accel2D(
+            accel_data.accel = self._new_accel2D(
                 f'RFTarget visible geometry ({selected_only=})',
                 accel_data.verts,
                 accel_data.edges,
                 accel_data.faces,
-                self.iter_point2D_symmetries
+                self.iter_point2D_symmetries,
+                project2D=self.project_point2D_symmetries,
             )
 
         # remember important things that influence accel structure
@@ -273,9 +282,73 @@ class RetopoFlow_Target:
         accel_data.ray_ignore_backface_sources = self.ray_ignore_backface_sources()
         accel_data.draw_count                  = self._draw_count
         accel_data.mirror_mod                  = (mm.x, mm.y, mm.z)
+        accel_data.accel_backend               = options['accel backend']
+        accel_data.dirty_counter               = self.rftarget.get_dirty_counter()
 
         return accel_data
 
+    def _update_accel_data_struct(self, accel_data, selected_only):
+        '''
+        patches accel_data in place with only the target geometry that was touched since
+        accel_data was last generated.  returns False if accel_data must be fully rebuilt
+        (view or settings changed, untracked changes, or too much geometry changed).
+        '''
+        mm = self.rftarget.mirror_mod
+        if any(v is None for v in [accel_data.accel, accel_data.verts, accel_data.edges, accel_data.faces]): return False
+        if any([
+            accel_data.view_version                != self.get_view_version(),
+            accel_data.visible_bbox_factor         != options['visible bbox factor'],
+            accel_data.visible_dist_offset         != options['visible dist offset'],
+            accel_data.selection_occlusion_test    != options['selection occlusion test'],
+            accel_data.selection_backface_test     != options['selection backface test'],
+            accel_data.ray_ignore_backface_sources != self.ray_ignore_backface_sources(),
+            accel_data.mirror_mod                  != (mm.x, mm.y, mm.z),
+            accel_data.accel_backend               != options['accel backend'],
+        ]): return False
+
+        touched = self.rftarget.get_touched_since(accel_data.dirty_counter, selection=(selected_only is not None))
+        if touched is None: return False
+
+        # moving a vert changes its visibility and the placement of its linked edges and faces
+        touched_verts = { e for e in touched if isinstance(e, BMVert) }
+        touched_edges = { e for e in touched if isinstance(e, BMEdge) }
+        touched_faces = { e for e in touched if isinstance(e, BMFace) }
+        for bmv in touched_verts:
+            if not bmv.is_valid: continue
+            touched_edges.update(bmv.link_edges)
+            touched_faces.update(bmv.link_faces)
+
+        total = len(accel_data.verts) + len(accel_data.edges) + len(accel_data.faces)
+        if len(touched_verts) + len(touched_edges) + len(touched_faces) > options['accel update fraction'] * total:
+            return False
+
+        with time_it('updating accel struct', enabled=False):
+            wrap_verts = { RFVert(bmv) for bmv in touched_verts }
+            wrap_edges = { RFEdge(bme) for bme in touched_edges }
+            wrap_faces = { RFFace(bmf) for bmf in touched_faces }
+            accel_data.accel.remove(verts=wrap_verts, edges=wrap_edges, faces=wrap_faces)
+            accel_data.verts -= wrap_verts
+            accel_data.edges -= wrap_edges
+            accel_data.faces -= wrap_faces
+
+            fn_select = (lambda e: True) if selected_only is None else (lambda e: e.select == selected_only)
+            vis_verts = self.visible_verts(verts=filter(fn_select, filter(RFMesh.fn_is_valid, wrap_verts)))
+            accel_data.verts |= vis_verts
+            # edge is visible if any vert is visible, face is visible if all verts are visible
+            vis_edges = {
+                bme for bme in wrap_edges
+                if bme.is_valid and fn_select(bme) and any(bmv in accel_data.verts for bmv in bme.bmelem.verts)
+            }
+            vis_faces = {
+                bmf for bmf in wrap_faces
+                if bmf.is_valid and fn_select(bmf) and all(bmv in accel_data.verts for bmv in bmf.bmelem.verts)
+            }
+            accel_data.edges |= vis_edges
+            accel_data.faces |= vis_faces
+            accel_data.accel.insert(verts=vis_verts, edges=vis_edges, faces=vis_faces)
+
+        return True
+
     @staticmethod
     def filter_is_valid(bmelems): return filter(RFMesh.fn_is_valid, bmelems)
 
@@ -297,12 +370,13 @@ class RetopoFlow_Target:
         if selection_only is not None:
             fn_select = lambda bmelem: bmelem.select == selection_only
             verts, edges, faces = list(filter(fn_select, verts)), list(filter(fn_select, edges)), list(filter(fn_select, faces))
-        return Accel2D(
+        return self._new_accel2D(
             'RFTarget custom',
             (verts if include_verts else []),
             (edges if include_edges else []),
             (faces if include_faces else []),
             self.iter_point2D_symmetries if symmetry else self.iter_point2D_nosymmetry,
+            project2D=(self.project_point2D_symmetries if symmetry else self.project_point2D_nosymmetry),
         )
 
     def accel_nearest2D_vert(self, point=None, max_dist=None, vis_accel=None, selected_only=None):
@@ -325,7 +399,7 @@ class RetopoFlow_Target:
         if selected_only is not None:
             verts = { bmv for bmv in verts if bmv.select == selected_only }
 
-        return self.rftarget.nearest2D_bmvert_Point2D(xy, self.iter_point2D_symmetries, verts=verts, max_dist=max_dist)
+        return self.rftarget.nearest2D_bmvert_Point2D(xy, self.iter_point2D_symmetries, verts=verts, max_dist=max_dist, project2D=self.project_point2D_symmetries)
 
     def accel_nearest2D_edge(self, point=None, max_dist=None, vis_accel=None, selected_only=None, edges_only=None):
         xy = self.get_point2D(point or self.actions.mouse)
@@ -347,7 +421,7 @@ class RetopoFlow_Target:
         if edges_only is not None:
             edges = { bme for bme in edges if bme in edges_only }
 
-        return self.rftarget.nearest2D_bmedge_Point2D(xy, self.iter_point2D_symmetries, edges=edges, max_dist=max_dist)
+        return self.rftarget.nearest2D_bmedge_Point2D(xy, self.iter_point2D_symmetries, edges=edges, max_dist=max_dist, project2D=self.project_point2D_symmetries)
 
     def accel_nearest2D_face(self, point=None, max_dist=None, vis_accel=None, selected_only=None, faces_only=None):
         xy = self.get_point2D(point or self.actions.mouse)
@@ -369,7 +443,7 @@ class RetopoFlow_Target:
         if faces_only is not None:
             faces = { bmf for bmf in faces if bmf in faces_only }
 
-        return self.rftarget.nearest2D_bmface_Point2D(self.Vec_forward(), xy, self.iter_point2D_symmetries, faces=faces) #, max_dist=max_dist)
+        return self.rftarget.nearest2D_bmface_Point2D(self.Vec_forward(), xy, self.iter_point2D_symmetries, faces=faces, project2D=self.project_point2D_symmetries) #, max_dist=max_dist)
 
     def accel_nearest2D_geom(self, **kwargs):
         if (vert := self.accel_nearest2D_vert(**kwargs)[0]): return vert
@@ -412,43 +486,79 @@ class RetopoFlow_Target:
     def iter_point2D_nosymmetry(self, co, normal, *, fwd=None):
         yield self.Point_to_Point2D(co)
 
+    def _symmetry_signs(self):
+        ''' returns (K,3) array of sign flips, in the same order as _iter_symmetry_points '''
+        mm = self.rftarget.mirror_mod
+        mx,my,mz = mm.x, mm.y, mm.z
+        signs = [( 1,  1,  1)]
+        if mx:               signs.append((-1,  1,  1))
+        if my:               signs.append(( 1, -1,  1))
+        if mz:               signs.append(( 1,  1, -1))
+        if mx and my:        signs.append((-1, -1,  1))
+        if mx and mz:        signs.append((-1,  1, -1))
+        if my and mz:        signs.append(( 1, -1, -1))
+        if mx and my and mz: signs.append((-1, -1, -1))
+        return np.array(signs, dtype=np.float64)
+
+    def project_point2D_symmetries(self, co, normal, *, fwd=None):
+        '''
+        batched version of iter_point2D_symmetries.  co and normal are (N,3) arrays
+        of world-space points and normals.  returns (xy, valid), where xy is (N,K,2)
+        array of screen positions of the K mirror copies and valid is (N,K) mask of
+        the copies that are in front of camera, inside area, and facing the camera
+        '''
+        if not fwd: fwd = self.Vec_forward()
+        signs = self._symmetry_signs()
+        co = np.asarray(co, dtype=np.float64).reshape((-1, 3))
+        normal = np.asarray(normal, dtype=np.float64).reshape((-1, 3))
+        n, k = len(co), len(signs)
+        xy, valid = self.Points_to_Point2Ds((co[:, None, :] * signs).reshape((-1, 3)))
+        xy, valid = xy.reshape((n, k, 2)), valid.reshape((n, k))
+        valid &= self.Point2Ds_in_area(xy)
+        valid &= (normal[:, None, :] * signs) @ np.array(fwd, dtype=np.float64) <= 0
+        return (xy, valid)
+    def project_point2D_nosymmetry(self, co, normal, *, fwd=None):
+        ''' batched version of iter_point2D_nosymmetry.  see project_point2D_symmetries '''
+        xy, valid = self.Points_to_Point2Ds(co)
+        return (xy[:, None, :], valid[:, None])
+
     @profiler.function
     def nearest2D_vert(self, point=None, max_dist=None, verts=None):
         xy = self.get_point2D(point or self.actions.mouse)
         if max_dist: max_dist = self.drawing.scale(max_dist)
-        return self.rftarget.nearest2D_bmvert_Point2D(xy, self.iter_point2D_symmetries, verts=verts, max_dist=max_dist, fwd=self.Vec_forward())
+        return self.rftarget.nearest2D_bmvert_Point2D(xy, self.iter_point2D_symmetries, verts=verts, max_dist=max_dist, fwd=self.Vec_forward(), project2D=self.project_point2D_symmetries)
 
     @profiler.function
     def nearest2D_verts(self, point=None, max_dist:float=10, verts=None):
         xy = self.get_point2D(point or self.actions.mouse)
         max_dist = self.drawing.scale(max_dist)
-        return self.rftarget.nearest2D_bmverts_Point2D(xy, max_dist, self.iter_point2D_symmetries, verts=verts, fwd=self.Vec_forward())
+        return self.rftarget.nearest2D_bmverts_Point2D(xy, max_dist, self.iter_point2D_symmetries, verts=verts, fwd=self.Vec_forward(), project2D=self.project_point2D_symmetries)
 
     @profiler.function
     def nearest2D_edge(self, point=None, max_dist=None, edges=None):
         xy = self.get_point2D(point or self.actions.mouse)
         if max_dist: max_dist = self.drawing.scale(max_dist)
-        return self.rftarget.nearest2D_bmedge_Point2D(xy, self.iter_point2D_symmetries, edges=edges, max_dist=max_dist, fwd=self.Vec_forward())
+        return self.rftarget.nearest2D_bmedge_Point2D(xy, self.iter_point2D_symmetries, edges=edges, max_dist=max_dist, fwd=self.Vec_forward(), project2D=self.project_point2D_symmetries)
 
     @profiler.function
     def nearest2D_edges(self, point=None, max_dist:float=10, edges=None):
         xy = self.get_point2D(point or self.actions.mouse)
         if max_dist: max_dist = self.drawing.scale(max_dist)
-        return self.rftarget.nearest2D_bmedges_Point2D(xy, max_dist, self.iter_point2D_symmetries, edges=edges, fwd=self.Vec_forward())
+        return self.rftarget.nearest2D_bmedges_Point2D(xy, max_dist, self.iter_point2D_symmetries, edges=edges, fwd=self.Vec_forward(), project2D=self.project_point2D_symmetries)
 
     # TODO: implement max_dist
     @profiler.function
     def nearest2D_face(self, point=None, max_dist=None, faces=None):
         xy = self.get_point2D(point or self.actions.mouse)
         if max_dist: max_dist = self.drawing.scale(max_dist)
-        return self.rftarget.nearest2D_bmface_Point2D(self.Vec_forward(), xy, self.iter_point2D_symmetries, faces=faces, fwd=self.Vec_forward())
+        return self.rftarget.nearest2D_bmface_Point2D(self.Vec_forward(), xy, self.iter_point2D_symmetries, faces=faces, fwd=self.Vec_forward(), project2D=self.project_point2D_symmetries)
 
     # TODO: fix this function! Izzza broken
     @profiler.function
     def nearest2D_faces(self, point=None, max_dist:float=10, faces=None):
         xy = self.get_point2D(point or self.actions.mouse)
         if max_dist: max_dist = self.drawing.scale(max_dist)
-        return self.rftarget.nearest2D_bmfaces_Point2D(xy, self.iter_point2D_symmetries, faces=faces, fwd=self.Vec_forward())
+        return self.rftarget.nearest2D_bmfaces_Point2D(xy, self.iter_point2D_symmetries, faces=faces, fwd=self.Vec_forward(), project2D=self.project_point2D_symmetries)
 
 
     ########################################
@@ -486,9 +596,43 @@ class RetopoFlow_Target:
     #######################################
     # get visible geometry
 
-    def visible_verts(self, verts=None):             return self.rftarget.visible_verts(self.gen_is_visible(), verts=verts)
-    def visible_edges(self, verts=None, edges=None): return self.rftarget.visible_edges(self.gen_is_visible(), verts=verts, edges=edges)
-    def visible_faces(self, verts=None, faces=None): return self.rftarget.visible_faces(self.gen_is_visible(), verts=verts, faces=faces)
+    def _get_visible_verts_cached(self):
+        '''
+        all visible verts, computed with one batched visibility pass and cached per
+        target, source, and view version so visible_verts, visible_edges, and visible_faces
+        share the work.  do not modify returned set!
+        '''
+        key = (
+            self.get_target_version(selection=False),
+            self.get_view_version(),
+            self.drawing.space.clip_start,
+            # sources set up again (see update_sources) change versions and sources_bbox
+            tuple(rfs.get_version(selection=False) for rfs in self.rfsources),
+            self.ray_ignore_backface_sources(),
+            tuple(self.get_rfsource_snap(rfs) for rfs in self.rfsources),
+            options['visible bbox factor'],
+            options['visible dist offset'],
+            options['selection occlusion test'],
+            options['selection backface test'],
+            options['normal offset multiplier'],
+            options['visible tile size'],
+        )
+        if getattr(self, '_visible_verts_key', None) != key:
+            with time_it('visibility pass', enabled=False):
+                self._visible_verts = self.rftarget.visible_verts(None, visibility=self.gen_visibility_pass())
+            self._visible_verts_key = key
+        return self._visible_verts
+
+    def visible_verts(self, verts=None):
+        if verts is None: return set(self._get_visible_verts_cached())
+        # explicit verts might have moved without target being dirtied, so test them directly
+        return self.rftarget.visible_verts(None, verts=verts, visibility=self.gen_visibility_pass())
+    def visible_edges(self, verts=None, edges=None):
+        if verts is None: verts = self._get_visible_verts_cached()
+        return self.rftarget.visible_edges(None, verts=verts, edges=edges)
+    def visible_faces(self, verts=None, faces=None):
+        if verts is None: verts = self._get_visible_verts_cached()
+        return self.rftarget.visible_faces(None, verts=verts, faces=faces)
     def visible_geom(self): return (verts := self.visible_verts()), self.visible_edges(verts=verts), self.visible_faces(verts=verts)
 
     def nonvisible_verts(self):             return self.rftarget.visible_verts(self.gen_is_nonvisible())
@@ -611,6 +755,19 @@ class RetopoFlow_Target:
             point, normal = xform.l2w_point(p), xform.l2w_normal(n)
         return (point, normal)
 
+    def mirror_points_normals(self, co, no):
+        ''' batched version of mirror_point_normal for (N,3) arrays of world-space points and normals '''
+        mm = self.rftarget.mirror_mod
+        if not (mm.x or mm.y or mm.z): return (co, no)
+        xform = self.rftarget.xform
+        p, n = xform_points(xform.imx_p, co), xform_normals(xform.imx_n, no)
+        flip = np.zeros(p.shape, dtype=bool)
+        if mm.x: flip[:, 0] = p[:, 0] < 0
+        if mm.y: flip[:, 1] = p[:, 1] > 0
+        if mm.z: flip[:, 2] = p[:, 2] < 0
+        p, n = np.where(flip, -p, p), np.where(flip, -n, n)
+        return (xform_points(xform.mx_p, p), xform_normals(xform.mx_n, n))
+
     def get_point_symmetry(self, point):
         return self.rftarget.get_point_symmetry(point)
 
@@ -620,20 +777,26 @@ class RetopoFlow_Target:
     def clamp_point_to_symmetry(self, point):
         return self.rftarget.symmetry_real(point)
 
+    def _push_then_snap_verts(self, bmvs):
+        bmvs = list(bmvs)
+        d = options['push and snap distance']
+        xform = self.rftarget.xform
+        bmelems = [ bmv.bmelem for bmv in bmvs ]
+        co = xform_points(xform.mx_p, gather_co(bmelems, len(bmelems)))
+        no = xform_normals(xform.mx_n, gather_normal(bmelems, len(bmelems)))
+        self.snap_verts(bmvs, 'nearest', points=co + no * d)
+        self.rftarget.dirty()
+
     def push_then_snap_all_verts(self):
         self.undo_push('push then snap all non-hidden verts')
-        d = options['push and snap distance']
         bmvs = [bmv for bmv in self.rftarget.get_verts() if not bmv.hide]
-        for bmv in bmvs: bmv.co += bmv.normal * d
-        self.rftarget.snap_all_nonhidden_verts(self.nearest_sources_Point)
+        self._push_then_snap_verts(bmvs)
         self.recalculate_face_normals(verts=bmvs)
 
     def push_then_snap_selected_verts(self):
         self.undo_push('push then snap selected verts')
-        d = options['push and snap distance']
         bmvs = self.rftarget.get_selected_verts()
-        for bmv in bmvs: bmv.co += bmv.normal * d
-        self.rftarget.snap_selected_verts(self.nearest_sources_Point)
+        self._push_then_snap_verts(bmvs)
         self.recalculate_face_normals(verts=bmvs)
 
 #    def snap_verts_filter(self, fn_filter):
@@ -688,6 +851,59 @@ class RetopoFlow_Target:
     # note: these do NOT dirty the target!
     # ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
 
+    @profiler.function
+    def snap_verts(self, verts, mode='nearest', *, symmetry=None, points=None, xys=None):
+        '''
+        batched version of snap_vert (mode='nearest') and set2D_vert (mode='raycast').
+        coordinates are gathered once, sources are queried in bulk, and verts are written in one pass.
+        - points: world-space points to snap from (default: current vert positions), for mode='nearest'
+        - xys: screen positions to raycast through (default: current screen positions), for mode='raycast'
+        - symmetry: set of symmetry planes to snap all verts to, or list of sets (or None) per vert
+        verts that are invalid or that miss the sources are not changed.
+        returns list with new world position (or None) of each vert
+        '''
+        verts = list(verts)
+        count = len(verts)
+        if symmetry is None or isinstance(symmetry, (set, frozenset)): symmetry = [symmetry] * count
+        rows = np.array([ k for (k, v) in enumerate(verts) if v and v.is_valid ], dtype=np.int64)
+        results = [None] * count
+        if not len(rows): return results
+
+        if mode == 'nearest':
+            if points is None:
+                points = xform_points(self.rftarget.xform.mx_p, gather_co((verts[k].bmelem for k in rows), len(rows)))
+            else:
+                points = np.asarray(points, dtype=np.float64).reshape((-1, 3))[rows]
+            co, no, _, hit = self.nearest_sources_Points(points)
+        elif mode == 'raycast':
+            if xys is None:
+                co = xform_points(self.rftarget.xform.mx_p, gather_co((verts[k].bmelem for k in rows), len(rows)))
+                xys, valid = self.Points_to_Point2Ds(co)
+            else:
+                xys = np.array([ tuple(xys[k]) if xys[k] is not None else (np.nan, np.nan) for k in rows ], dtype=np.float64).reshape((-1, 2))
+                valid = ~np.isnan(xys).any(axis=1)
+            origins, directions = self.Point2Ds_to_Rays(np.where(valid[:, None], xys, 0.0), min_dist=self.drawing.space.clip_start)
+            co, no, _, hit = self.raycast_sources_Rays(origins, directions)
+            hit &= valid
+        else:
+            assert False, f'Invalid snap mode {mode}'
+
+        # snap to symmetry planes in local space (only verts with planes need the per-point search)
+        sym = [ k for (k, r) in enumerate(rows.tolist()) if hit[k] and symmetry[r] ]
+        if sym:
+            xform, rftarget = self.rftarget.xform, self.rftarget
+            local = xform_points(xform.imx_p, co[sym])
+            for (i, k) in enumerate(sym):
+                local[i] = rftarget.snap_to_symmetry(Point(local[i]), symmetry[rows[k]], from_world=False, to_world=False)
+            co[sym] = xform_points(xform.mx_p, local)
+
+        for (k, p, n) in zip(rows[hit].tolist(), co[hit].tolist(), no[hit].tolist()):
+            vert = verts[k]
+            vert.co = Point(p)
+            vert.normal = Normal(n)
+            results[k] = vert.co
+        return results
+
     def snap_vert(self, vert:RFVert, *, snap_to_symmetry=None):
         if not vert or  not vert.is_valid: return
         xyz,norm,_,_ = self.nearest_sources_Point(vert.co)
@@ -890,6 +1106,9 @@ class RetopoFlow_Target:
     def get_hidden_faces(self): return self.rftarget.get_hidden_faces()
     def get_hidden_geom(self): return self.get_hidden_verts(), self.get_hidden_edges(), self.get_hidden_faces()
 
+    def analyze_topology(self, kind, elems, fn, *, coords=False, params=None):
+        return self.rftarget.analyze_topology(kind, elems, fn, coords=coords, params=params)
+
     def get_revealed_verts(self): return self.rftarget.get_revealed_verts()
     def get_revealed_edges(self): return self.rftarget.get_revealed_edges()
     def get_revealed_faces(self): return self.rftarget.get_revealed_faces()
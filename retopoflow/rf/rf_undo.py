@@ -25,27 +25,37 @@ from collections import namedtuple
 from ...config.options import options
 from ...addon_common.common.blender import tag_redraw_all
 from ...addon_common.common.undostack import UndoStack
+from ..rfmesh.rfmesh_undo import RFTargetDelta, arrays_to_bytes, bytes_to_arrays
 
 
 class RetopoFlow_Undo:
     def init_undo(self):
+        # in delta mode, undo steps hold RFTargetDeltas recorded while the action runs
+        # rather than a copy of the target made before the action (see rfmesh_undo.py)
+        self._undo_deltas = options['undo mode'] == 'delta'
+        self._undo_pushes = 0   # pushes since last checkpoint
+
         def create_state(action):
             nonlocal self
             self.instrument_write(action)
-            return {
+            state = {
                 'action':       action,
                 'tool':         self.rftool,
-                'rftarget':     copy.deepcopy(self.rftarget),
                 'grease_marks': copy.deepcopy(self.grease_marks),
             }
+            if self._undo_deltas: state['delta']    = self._undo_journal_push()
+            else:                 state['rftarget'] = copy.deepcopy(self.rftarget)
+            return state
 
-        def restore_state(state, *, set_tool=True, reset_tool=True, instrument_action=None):
+        def set_rftarget(rftarget):
             nonlocal self
-
-            self.rftarget = state['rftarget']
+            self.rftarget = rftarget
             self.rftarget.rewrap()
             self.rftarget.dirty()
             self.rftarget_draw.replace_rfmesh(self.rftarget)
+
+        def finish_restore(state, *, set_tool=True, reset_tool=True, instrument_action=None):
+            nonlocal self
             self.grease_marks = state['grease_marks']
 
             if   set_tool:   self.select_rftool(state['tool'], reset=reset_tool)
@@ -55,18 +65,122 @@ class RetopoFlow_Undo:
 
             tag_redraw_all('restoring state')
 
+        def swap_state(state, **kwargs):
+            nonlocal self
+            delta = state['delta']
+            self.rftarget.undo_journal_close()
+            # see _undo_prepare
+            assert not delta.untracked, 'RetopoFlow_Undo: cannot revert undo step with untracked change'
+            inverse = {
+                'action':       state['action'],
+                'tool':         self.rftool,
+                'grease_marks': self.grease_marks,
+            }
+            if delta.checkpoint is not None:
+                # live target is no longer needed, so it becomes checkpoint of inverse
+                inverse['delta'] = RFTargetDelta.from_checkpoint(self.rftarget)
+                set_rftarget(delta.checkpoint)
+            else:
+                inverse['delta'] = delta.apply(self.rftarget)
+                self.rftarget.dirty()
+            finish_restore(state, **kwargs)
+            return inverse
+
+        def restore_state(state, **kwargs):
+            nonlocal self
+            if 'delta' in state:
+                swap_state(state, **kwargs)
+                return
+            set_rftarget(state['rftarget'])
+            finish_restore(state, **kwargs)
+
+        def get_delta(state):
+            # in copy mode, the copy is equivalent to a delta with checkpoint
+            return state['delta'] if 'delta' in state else RFTargetDelta.from_checkpoint(state['rftarget'])
+
+        def sizeof_state(state):
+            return get_delta(state).get_size()
+
+        def pack_state(state):
+            nonlocal self
+            arrays = get_delta(state).to_arrays()
+            if arrays is None: return None
+            stub = { k: v for (k, v) in state.items() if k not in {'delta', 'rftarget'} }
+            return (stub, arrays_to_bytes(arrays))
+
+        def unpack_state(stub, data):
+            nonlocal self
+            delta = RFTargetDelta.from_arrays(bytes_to_arrays(data), self.rftarget)
+            state = dict(stub)
+            if self._undo_deltas: state['delta']    = delta
+            else:                 state['rftarget'] = delta.checkpoint
+            return state
+
         self._undostack = UndoStack(
             create_state,
             restore_state,
             max_size=options['undo depth'],
+            fn_swap_state=(swap_state if self._undo_deltas else None),
+            max_bytes=options['undo memory budget'] * 1024 * 1024,
+            fn_sizeof_state=sizeof_state,
+            fn_pack_state=pack_state,
+            fn_unpack_state=unpack_state,
         )
 
+    def _undo_journal_push(self):
+        ''' closes delta of previous undo step, and opens delta for new undo step '''
+        prev = self.rftarget.undo_journal_close()
+        interval = options['undo checkpoint interval']
+        if prev and prev.checkpoint is not None: self._undo_pushes = 0
+        delta = RFTargetDelta()
+        if (prev and prev.untracked) or (interval and self._undo_pushes >= interval):
+            # either previous delta missed a change (see _undo_prepare) or periodic checkpoint
+            delta.checkpoint = copy.deepcopy(self.rftarget)
+            self._undo_pushes = 0
+        self._undo_pushes += 1
+        self.rftarget.undo_journal_open(delta)
+        return delta
+
+    def _undo_prepare(self):
+        '''
+        returns False if top undo step cannot be undone.  the delta of a step that missed a
+        change to topology (untracked) cannot be applied, so the step is squashed with the
+        steps below it down to the nearest checkpoint, which is restored instead
+        '''
+        if not self._undo_deltas: return True
+        self.rftarget.undo_journal_close()
+        state = self._undostack.top_state()
+        if not state or not state['delta'].untracked: return True
+        depth = self._undostack.find(lambda state: state['delta'].checkpoint is not None)
+        if depth is None:
+            self._undo_journal_reopen()
+            self.alert_user(
+                title='Cannot undo',
+                message=(
+                    f'Undo step "{self._undostack.top_key()}" changed the mesh in a way that was not recorded, '
+                    'and no earlier copy of the mesh is left in the undo history.'
+                ),
+                level='error',
+            )
+            return False
+        print(f'RetopoFlow: undo step "{self._undostack.top_key()}" has untracked change, so undoing {depth + 1} steps to last checkpoint')
+        self._undostack.squash(depth + 1)
+        return True
+
+    def _undo_journal_reopen(self):
+        ''' changes made after undo or redo are recorded in delta of top undo step '''
+        if not self._undo_deltas: return
+        self.rftarget.undo_journal_close()
+        state = self._undostack.top_state()
+        if state: self.rftarget.undo_journal_open(state['delta'])
+
     @property
     def change_count(self):
         return self._undostack.changes
 
     def undo_clear(self):
         self._undostack.clear()
+        if hasattr(self, 'rftarget'): self.rftarget.undo_journal_close()
 
     def get_last_action(self):
         return self._undostack.top_key()
@@ -77,17 +191,24 @@ class RetopoFlow_Undo:
     def undo_repush(self, action):
         ### the restore method does not work?
         # self._undostack.restore(reset_tool=False)
+        if not self._undo_prepare(): return
         self._undostack.pop(reset_tool=False)
+        self._undo_journal_reopen()
         self._undostack.push(action)
 
     def undo_pop(self):
+        if not self._undo_prepare(): return
         self._undostack.pop(reset_tool=True, instrument_action='undo')
+        self._undo_journal_reopen()
 
     def undo_cancel(self):
+        if not self._undo_prepare(): return
         self._undostack.cancel(reset_tool=False, instrument_action='cancel (undo)')
+        self._undo_journal_reopen()
 
     def redo_pop(self):
         self._undostack.pop(undo=False, reset_tool=True, instrument_action='redo')
+        self._undo_journal_reopen()
 
     def undo_stack_actions(self):
         return self._undostack.keys() if hasattr(self, '_undostack') else []
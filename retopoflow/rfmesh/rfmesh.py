@@ -21,11 +21,14 @@ Created by Jonathan Denning, Jonathan Williamson
 
 import math
 import copy
+import time
 import heapq
 import numpy as np
 import random
+from collections import deque
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from itertools import takewhile, filterfalse
+from itertools import takewhile, filterfalse, chain
 
 import bpy
 import bmesh
@@ -39,13 +42,13 @@ from bmesh.ops import (
 from mathutils import Vector, Matrix
 from mathutils.bvhtree import BVHTree
 from mathutils.kdtree import KDTree
-from mathutils.geometry import normal as compute_normal, intersect_point_tri, intersect_point_tri_2d
+from mathutils.geometry import normal as compute_normal, intersect_point_tri
 
 from ...addon_common.common.blender import ModifierWrapper_Mirror
 from ...addon_common.common.maths import Point, Normal, Direction
 from ...addon_common.common.maths import Point2D
-from ...addon_common.common.maths import Ray, XForm, BBox, Plane
-from ...addon_common.common.hasher import hash_object, Hasher
+from ...addon_common.common.maths import Ray, XForm, BBox, Plane, zero_threshold
+from ...addon_common.common.hasher import fingerprint_object, fingerprint_invalidate, evaluation_count, Hasher
 from ...addon_common.common.utils import min_index, UniqueCounter, iter_pairs, accumulate_last, deduplicate_list, has_duplicates
 from ...addon_common.common.decorators import stats_wrapper, blender_version_wrapper
 from ...addon_common.common.debug import dprint
@@ -57,6 +60,15 @@ from ...config.options import options
 from .rfmesh_wrapper import (
     BMElemWrapper, RFVert, RFEdge, RFFace, RFEdgeSequence
 )
+from .rfmesh_snapshot import (
+    RFMeshSnapshot,
+    gather_co, gather_normal, xform_points, xform_normals,
+    distances_to_point, closest_on_segments,
+    points_in_triangles2D, csr_gather, fan_triangles,
+)
+from .rfmesh_cache import RFSourceArrays, RFSourceCache
+from .rfmesh_selection import RFMeshSelection
+from .rfmesh_topology import RFTargetTopologyCache
 
 
 class RFMesh():
@@ -88,6 +100,38 @@ class RFMesh():
             bme.from_mesh(obj.data)
         return bme
 
+    @staticmethod
+    def read_mesh_co(me):
+        ''' returns (N,3) array of vertex coordinates of mesh datablock me '''
+        co = np.empty(len(me.vertices) * 3, dtype=np.float32)
+        me.vertices.foreach_get('co', co)
+        return co.reshape((-1, 3))
+
+    @staticmethod
+    def read_mesh_flags(me, attr):
+        ''' returns boolean arrays of attr (ex: 'select', 'hide') for verts, edges, and faces of mesh datablock me '''
+        def read(seq):
+            flags = np.empty(len(seq), dtype=bool)
+            seq.foreach_get(attr, flags)
+            return flags
+        return (read(me.vertices), read(me.edges), read(me.polygons))
+
+    @staticmethod
+    def read_mesh_faceless(me, bme):
+        ''' returns indices of verts of mesh datablock me without faces, or None if me does not match bme '''
+        if (len(me.vertices), len(me.edges), len(me.polygons)) != (len(bme.verts), len(bme.edges), len(bme.faces)): return None
+        loops = np.empty(len(me.loops), dtype=np.int32)
+        me.loops.foreach_get('vertex_index', loops)
+        return np.flatnonzero(np.bincount(loops, minlength=len(me.vertices)) == 0)
+
+    @contextmanager
+    def _setup_stage(self, stage):
+        # times a stage of __setup__ (see self.setup_timings)
+        start = time.perf_counter()
+        with profiler.code(f'setup: {stage}'):
+            yield
+        self.setup_timings[stage] = time.perf_counter() - start
+
     @stats_wrapper
     @profiler.function
     def __setup__(
@@ -95,56 +139,68 @@ class RFMesh():
         deform=False, bme=None, triangulate=False,
         selection=True, keepeme=False
     ):
-        # checking for NaNs
-        # print('RFMesh.__setup__: checking for NaNs')
-        hasnan = any(
-            math.isnan(v)
-            for emv in obj.data.vertices
-            for v in emv.co
-        )
-        if hasnan:
-            # print('RFMesh.__setup__: Mesh data contains NaN in vertex coordinate! Cleaning and validating mesh...')
-            obj.data.validate(verbose=True, clean_customdata=False)
-        else:
-            # cleaning mesh quietly
-            # print('skipping mesh validation')
-            # print('RFMesh.__setup__: validating')
-            obj.data.validate(verbose=False, clean_customdata=False)
+        # seconds spent in each stage of setup
+        self.setup_timings = {}
+
+        with self._setup_stage('checking for NaNs'):
+            hasnan = bool(np.isnan(self.read_mesh_co(obj.data)).any())
+
+        with self._setup_stage('validating'):
+            if hasnan:
+                # print('RFMesh.__setup__: Mesh data contains NaN in vertex coordinate! Cleaning and validating mesh...')
+                obj.data.validate(verbose=True, clean_customdata=False)
+            else:
+                # cleaning mesh quietly
+                obj.data.validate(verbose=False, clean_customdata=False)
 
         # setup init
         self.obj = obj
         self.xform = XForm(self.obj.matrix_world)
-        self.hash = hash_object(self.obj)
+        with self._setup_stage('hashing'):
+            self.hash = fingerprint_object(self.obj)
         self._version = None
         self._version_selection = None
+        self._selection = RFMeshSelection()
+        faceless = None     # indices of verts without faces (see 'updating normals')
 
         if bme is not None:
             self.bme = bme
         else:
-            # print('RFMesh.__setup__: creating bmesh from object')
-            self.bme = self.get_bmesh_from_object(self.obj, deform=deform)
+            with self._setup_stage('creating bmesh'):
+                self.bme = self.get_bmesh_from_object(self.obj, deform=deform)
+
+            with self._setup_stage('finding faceless verts'):
+                # bme was created from (evaluated) mesh, so indices match unless counts differ
+                me = self.obj.evaluated_get(bpy.context.evaluated_depsgraph_get()).data if deform else self.obj.data
+                faceless = self.read_mesh_faceless(me, self.bme)
 
             if selection:
-                # print('RFMesh.__setup__: copying selection')
-                with profiler.code('copying selection'):
+                with self._setup_stage('copying selection'):
                     self.bme.select_mode = {'FACE', 'EDGE', 'VERT'}
-                    # copy selection from editmesh
-                    for bmf, emf in zip(self.bme.faces, self.obj.data.polygons):
-                        bmf.select = emf.select
-                    for bme, eme in zip(self.bme.edges, self.obj.data.edges):
-                        bme.select = eme.select
-                    for bmv, emv in zip(self.bme.verts, self.obj.data.vertices):
-                        bmv.select = emv.select
+                    # BMesh.from_mesh already copies selection (and hidden) flags of obj.data.
+                    # the evaluated mesh (deform) may not match, so transfer only what differs
+                    if deform: self._transfer_selection(obj.data)
             else:
-                self.deselect_all()
+                with self._setup_stage('deselecting'):
+                    self.deselect_all()
 
         if triangulate:
-            # print('RFMesh.__setup__: triangulating')
-            self.triangulate()
-
-        for bmv in self.bme.verts:
-            if not bmv.is_wire:
-                bmv.normal_update()
+            with self._setup_stage('triangulating'):
+                self.triangulate()
+
+        with self._setup_stage('updating normals'):
+            # single bulk recompute of face and vert normals, except that verts without faces
+            # keep their normals (bulk recompute would overwrite them).  triangulating does not
+            # change which verts have faces, so faceless indices are still valid
+            bmvs = self.bme.verts
+            if faceless is None:
+                faceless = [ bmv for bmv in bmvs if not bmv.link_faces ]
+            else:
+                bmvs.ensure_lookup_table()
+                faceless = [ bmvs[i] for i in faceless.tolist() ]
+            normals = [ Vector(bmv.normal) for bmv in faceless ]
+            self.bme.normal_update()
+            for (bmv, normal) in zip(faceless, normals): bmv.normal = normal
 
         # setup finishing
         self.selection_center = Point((0, 0, 0))
@@ -155,9 +211,25 @@ class RFMesh():
                 f'{obj.name}',
                 f'Options: {deform=} {triangulate=} {selection=} {keepeme=}',
                 f'Counts: v={len(self.bme.verts)} e={len(self.bme.edges)} f={len(self.bme.faces)}',
+                *(f'{stage}: {t*1000:0.1f}ms' for (stage, t) in self.setup_timings.items()),
                 title=f'RFMesh.setup',
             )
 
+    def _transfer_selection(self, me):
+        '''
+        copies selection of mesh datablock me to bme, matching elements by index.
+        only elements whose selection differs are touched
+        '''
+        for (bmelems, flags) in zip((self.bme.verts, self.bme.edges, self.bme.faces), self.read_mesh_flags(me, 'select')):
+            count = min(len(bmelems), len(flags))
+            if not count: continue
+            current = np.fromiter((bmelem.select for bmelem in bmelems), dtype=bool, count=len(bmelems))[:count]
+            differ = np.flatnonzero(current != flags[:count])
+            if not len(differ): continue
+            bmelems.ensure_lookup_table()
+            for i in differ.tolist():
+                bmelems[i].select = bool(flags[i])
+
     def __del__(self):
         RFMesh.delete_count += 1
         # print('RFMesh.__del__', self, RFMesh.create_count, RFMesh.delete_count)
@@ -188,6 +260,10 @@ class RFMesh():
     def clean(self):
         pass
 
+    def journal_selection(self, bmelems):
+        # only RFTarget records changes for undo (see RFTarget.journal_selection)
+        pass
+
     def get_version(self, selection=True):
         return Hasher(self._version, (self._version_selection if selection else 0))
 
@@ -207,6 +283,19 @@ class RFMesh():
             self.bbox_version = ver
         return self.bbox
 
+    def get_world_bounds(self):
+        '''
+        returns (min, max) arrays of the world-space bounds of the actual mesh vertices.
+        unlike get_bbox (built from object bound_box), this is always tight
+        '''
+        ver = self.get_version(selection=False)
+        if not hasattr(self, 'world_bounds') or self.world_bounds_version != ver:
+            co = self.get_snapshot().co_world
+            if len(co): self.world_bounds = (co.min(axis=0), co.max(axis=0))
+            else:       self.world_bounds = (np.full(3, np.nan), np.full(3, np.nan))
+            self.world_bounds_version = ver
+        return self.world_bounds
+
     @profiler.function
     def get_local_bbox(self, w2l_point):
         ver = self.get_version(selection=False)
@@ -229,6 +318,14 @@ class RFMesh():
             self.kdt_version = ver
         return self.kdt
 
+    @profiler.function
+    def get_snapshot(self):
+        ver = self.get_version(selection=False)
+        if not hasattr(self, 'snapshot') or self.snapshot_version != ver or not self.snapshot.is_current(self.bme):
+            self.snapshot = RFMeshSnapshot(self.bme, self.xform)
+            self.snapshot_version = ver
+        return self.snapshot
+
     def get_geometry_counts(self):
         ver = self.get_version(selection=False)
         if not hasattr(self, 'geocounts') or self.geocounts_version != ver:
@@ -717,208 +814,268 @@ class RFMesh():
         d = (point - wp).length
         return (wp,wn,i,d)
 
-    def nearest_bmvert_Point(self, point:Point, verts=None):
+    @profiler.function
+    def nearest_batch(self, points, max_dist=float('inf')):
+        '''
+        batched version of nearest.  points is (N,3) array of world-space points.
+        returns (co, no, index, dist) arrays, where index is -1 (and dist is inf) for points
+        without a nearest point within max_dist.
+        NOTE: max_dist is measured in local space, same as nearest
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape((-1, 3))
+        count = len(points)
+        co, no = np.zeros((count, 3)), np.zeros((count, 3))
+        index = np.full(count, -1, dtype=np.int64)
+        find_nearest = self.get_bvh().find_nearest
+        for (k, p) in enumerate(xform_points(self.xform.imx_p, points).tolist()):
+            hp, hn, hi, _ = find_nearest(p, max_dist)
+            if hp is None: continue
+            co[k], no[k], index[k] = hp, hn, hi
+        hit = index >= 0
+        co[hit] = xform_points(self.xform.mx_p, co[hit])
+        no[hit] = xform_normals(self.xform.mx_n, no[hit])
+        dist = np.where(hit, np.linalg.norm(points - co, axis=1), np.inf)
+        return (co, no, index, dist)
+
+    @profiler.function
+    def raycast_batch(self, origins, directions, *, ignore_backface=False, backface_push=0.00001, max_backface_pushes=20):
+        '''
+        batched version of raycast for rays with unbounded length.  origins and directions are
+        (N,3) arrays in world space.  returns (co, no, index, dist) arrays, where index is -1
+        (and dist is inf) for rays that miss
+        '''
+        origins = np.asarray(origins, dtype=np.float64).reshape((-1, 3))
+        count = len(origins)
+        co, no = np.zeros((count, 3)), np.zeros((count, 3))
+        index = np.full(count, -1, dtype=np.int64)
+        o_local = xform_points(self.xform.imx_p, origins)
+        d_local = np.asarray(directions, dtype=np.float64).reshape((-1, 3)) @ np.array(self.xform.imx_d).T
+        d_local /= np.maximum(np.linalg.norm(d_local, axis=1), 1e-30)[:, None]
+        ray_cast = self.get_bvh().ray_cast
+        for (k, (o, d)) in enumerate(zip(o_local.tolist(), d_local.tolist())):
+            o, d = Vector(o), Vector(d)
+            for _ in range(max_backface_pushes):
+                hp, hn, hi, _ = ray_cast(o, d)
+                if not hp: break
+                if not (ignore_backface and hn.dot(d) > 0):
+                    co[k], no[k], index[k] = hp, hn, hi
+                    break
+                o = hp + d * backface_push
+        hit = index >= 0
+        co[hit] = xform_points(self.xform.mx_p, co[hit])
+        no[hit] = xform_normals(self.xform.mx_n, no[hit])
+        dist = np.linalg.norm(origins - co, axis=1)
+        valid = hit & np.isfinite(dist)
+        index[~valid] = -1
+        return (co, no, index, np.where(valid, dist, np.inf))
+
+    def _gather_verts_world(self, verts=None):
+        '''
+        returns (bmverts, rows, co, no) for valid and revealed verts, where co and no
+        are (N,3) arrays of world-space coordinates and normals, and row k corresponds
+        to bmverts[rows[k]].  when verts is None, the cached snapshot is used (see
+        RFTarget.get_snapshot for verts moved without the mesh being dirtied);
+        otherwise, the given verts are gathered directly.
+        '''
         if verts is None:
-            verts = [bmv for bmv in self.bme.verts if bmv.is_valid and not bmv.hide]
-        else:
-            verts = [self._unwrap(bmv) for bmv in verts if bmv.is_valid and not bmv.hide]
-        point_local = self.xform.w2l_point(point)
-        bv,bd = None,None
-        for bmv in verts:
-            d3d = (bmv.co - point_local).length
-            if bv is None or d3d < bd: bv,bd = bmv,d3d
-        bmv_world = self.xform.l2w_point(bv.co)
-        return (self._wrap_bmvert(bv),(point-bmv_world).length)
+            snap = self.get_snapshot()
+            rows = snap.revealed_verts()
+            return (snap.verts, rows, snap.co_world[rows], snap.normal_world[rows])
+        bmvs = [self._unwrap(bmv) for bmv in verts if bmv.is_valid and not bmv.hide]
+        co = xform_points(self.xform.mx_p, gather_co(bmvs))
+        no = xform_normals(self.xform.mx_n, gather_normal(bmvs))
+        return (bmvs, np.arange(len(bmvs)), co, no)
+
+    def _gather_edges_world(self, edges=None):
+        '''
+        returns (bmedges, rows, co0, co1, no0, no1) for valid and revealed edges.
+        see _gather_verts_world
+        '''
+        if edges is None:
+            snap = self.get_snapshot()
+            rows = snap.revealed_edges()
+            i0, i1 = snap.edge_verts[rows, 0], snap.edge_verts[rows, 1]
+            return (
+                snap.edges, rows,
+                snap.co_world[i0], snap.co_world[i1],
+                snap.normal_world[i0], snap.normal_world[i1],
+            )
+        bmes = [self._unwrap(bme) for bme in edges if bme.is_valid and not bme.hide]
+        bmv0s, bmv1s = [bme.verts[0] for bme in bmes], [bme.verts[1] for bme in bmes]
+        mx_p, mx_n = self.xform.mx_p, self.xform.mx_n
+        return (
+            bmes, np.arange(len(bmes)),
+            xform_points(mx_p, gather_co(bmv0s)),      xform_points(mx_p, gather_co(bmv1s)),
+            xform_normals(mx_n, gather_normal(bmv0s)), xform_normals(mx_n, gather_normal(bmv1s)),
+        )
+
+    def _gather_faces_world(self, faces=None):
+        '''
+        returns (bmfaces, rows, offsets, co, no) for valid and revealed faces, where
+        the world-space coordinates and normals of the verts of face k are stored in
+        co[offsets[k]:offsets[k+1]] and no[offsets[k]:offsets[k+1]].
+        see _gather_verts_world
+        '''
+        if faces is None:
+            snap = self.get_snapshot()
+            rows = snap.revealed_faces()
+            offsets, face_verts = csr_gather(snap.face_offsets, snap.face_verts, rows)
+            return (snap.faces, rows, offsets, snap.co_world[face_verts], snap.normal_world[face_verts])
+        bmfs = [self._unwrap(bmf) for bmf in faces if bmf.is_valid and not bmf.hide]
+        offsets = np.zeros(len(bmfs) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter((len(bmf.verts) for bmf in bmfs), dtype=np.int64, count=len(bmfs)), out=offsets[1:])
+        bmvs = [bmv for bmf in bmfs for bmv in bmf.verts]
+        co = xform_points(self.xform.mx_p, gather_co(bmvs))
+        no = xform_normals(self.xform.mx_n, gather_normal(bmvs))
+        return (bmfs, np.arange(len(bmfs)), offsets, co, no)
+
+    @staticmethod
+    def _project2D(co, no, Point_to_Point2Ds, fwd, project2D=None):
+        '''
+        projects world-space points (and their mirror copies) to screen space.
+        returns (xy, valid), where xy is (N,K,2) array of the K copies of each point
+        and valid is (N,K) mask of copies that projected.
+        uses project2D (batched) if given; otherwise calls Point_to_Point2Ds per point.
+        '''
+        if project2D: return project2D(co, no, fwd=fwd)
+        projected = [
+            [p2d for p2d in Point_to_Point2Ds(Point(c), Normal(n), fwd=fwd) if p2d is not None]
+            for (c, n) in zip(co.tolist(), no.tolist())
+        ]
+        k = max(map(len, projected), default=1)
+        xy = np.zeros((len(projected), k, 2), dtype=np.float64)
+        valid = np.zeros((len(projected), k), dtype=bool)
+        for i, p2ds in enumerate(projected):
+            for j, p2d in enumerate(p2ds):
+                xy[i, j] = p2d
+                valid[i, j] = True
+        return (xy, valid)
+
+    @staticmethod
+    def _segments2D(xy0, valid0, xy1, valid1):
+        '''
+        pairs up corresponding 2D copies of edge endpoints (see _project2D).
+        returns (owners, v0, v1), where v0 and v1 are (M,2) arrays and owners[m]
+        is the edge of segment m
+        '''
+        valid = valid0 & valid1
+        owners, copies = np.nonzero(valid)
+        return (owners, xy0[owners, copies], xy1[owners, copies])
+
+    def _faces_under_Point2D(self, xy:Point2D, faces, Point_to_Point2Ds, fwd, project2D):
+        '''
+        finds all faces where any of their projected copies contain xy.
+        returns (bmfaces, rows, hits, centers), where hits are indices into rows
+        and centers is (N,3) array of world-space face centers
+        '''
+        bmfs, rows, offsets, co, no = self._gather_faces_world(faces)
+        if not len(rows): return (bmfs, rows, np.zeros(0, dtype=np.int64), np.zeros((0, 3)))
+        xy2, valid = self._project2D(co, no, Point_to_Point2Ds, fwd, project2D)
+        # a copy of a face is considered only if all of its verts projected
+        face_valid = np.logical_and.reduceat(valid, offsets[:-1], axis=0)
+        tri_face, tri_corners = fan_triangles(offsets)
+        a, b, c = xy2[tri_corners[:, 0]], xy2[tri_corners[:, 1]], xy2[tri_corners[:, 2]]
+        inside = points_in_triangles2D(xy, a, b, c) & face_valid[tri_face]
+        hits = np.unique(tri_face[inside.any(axis=1)])
+        centers = np.add.reduceat(co, offsets[:-1], axis=0) / np.diff(offsets)[:, None]
+        return (bmfs, rows, hits, centers)
+
+    def nearest_bmvert_Point(self, point:Point, verts=None):
+        bmvs, rows, co, _ = self._gather_verts_world(verts)
+        if not len(rows): return (None, None)
+        dists = distances_to_point(co, point)
+        k = int(np.argmin(dists))
+        return (self._wrap_bmvert(bmvs[rows[k]]), float(dists[k]))
 
     def nearest_bmverts_Point(self, point:Point, dist3d:float, bmverts=None):
-        nearest = []
-        unwrap = bmverts is not None
-        for bmv in (bmverts or self.bme.verts):
-            if bmv.hide: continue
-            if not bmv.is_valid: continue
-            if unwrap: bmv = self._unwrap(bmv)
-            bmv_world = self.xform.l2w_point(bmv.co)
-            d3d = (bmv_world - point).length
-            if d3d > dist3d: continue
-            nearest.append((self._wrap_bmvert(bmv), d3d))
-        return nearest
+        bmvs, rows, co, _ = self._gather_verts_world(bmverts or None)
+        dists = distances_to_point(co, point)
+        return [
+            (self._wrap_bmvert(bmvs[rows[k]]), float(dists[k]))
+            for k in np.flatnonzero(dists <= dist3d)
+        ]
 
     def nearest_bmedge_Point(self, point:Point, edges=None):
-        if edges is None:
-            edges = [bme for bme in self.bme.edges if bme.is_valid and not bme.hide]
-        else:
-            edges = [self._unwrap(bme) for bme in edges if bme.is_valid and not bme.hide]
-        l2w_point = self.xform.l2w_point
-        be,bd,bpp = None,None,None
-        for bme in self.bme.edges:
-            bmv0,bmv1 = l2w_point(bme.verts[0].co), l2w_point(bme.verts[1].co)
-            diff = bmv1 - bmv0
-            l = diff.length
-            d = diff / l
-            pp = bmv0 + d * max(0, min(l, (point - bmv0).dot(d)))
-            dist = (point - pp).length
-            if be is None or dist < bd: be,bd,bpp = bme,dist,pp
-        if be is None: return (None,None)
-        return (self._wrap_bmedge(be), (point-self.xform.l2w_point(bpp)).length)
+        bmes, rows, co0, co1, _, _ = self._gather_edges_world(edges)
+        if not len(rows): return (None, None)
+        _, dists = closest_on_segments(co0, co1, point)
+        k = int(np.argmin(dists))
+        return (self._wrap_bmedge(bmes[rows[k]]), float(dists[k]))
 
     def nearest_bmedges_Point(self, point:Point, dist3d:float):
-        l2w_point = self.xform.l2w_point
-        nearest = []
-        for bme in self.bme.edges:
-            if not bme.is_valid: continue
-            if bme.hide: continue
-            bmv0,bmv1 = l2w_point(bme.verts[0].co), l2w_point(bme.verts[1].co)
-            diff = bmv1 - bmv0
-            l = diff.length
-            d = diff / l
-            pp = bmv0 + d * max(0, min(l, (point - bmv0).dot(d)))
-            dist = (point - pp).length
-            if dist > dist3d: continue
-            nearest.append((self._wrap_bmedge(bme), dist))
-        return nearest
-
-    def nearest2D_bmverts_Point2D(self, xy:Point2D, dist2D:float, Point_to_Point2Ds, *, verts=None, fwd=None):
+        bmes, rows, co0, co1, _, _ = self._gather_edges_world()
+        _, dists = closest_on_segments(co0, co1, point)
+        return [
+            (self._wrap_bmedge(bmes[rows[k]]), float(dists[k]))
+            for k in np.flatnonzero(dists <= dist3d)
+        ]
+
+    def nearest2D_bmverts_Point2D(self, xy:Point2D, dist2D:float, Point_to_Point2Ds, *, verts=None, fwd=None, project2D=None):
         # TODO: compute distance from camera to point
         # TODO: sort points based on 3d distance
-        if verts is None:
-            verts = [bmv for bmv in self.bme.verts if bmv.is_valid and not bmv.hide]
-        else:
-            verts = [self._unwrap(bmv) for bmv in verts if bmv.is_valid and not bmv.hide]
-        l2w_point, l2w_normal = self.xform.l2w_point, self.xform.l2w_normal
-        nearest = []
-        for bmv in verts:
-            co, no = l2w_point(bmv.co), l2w_normal(bmv.normal)
-            for p2d in Point_to_Point2Ds(co, no, fwd=fwd):
-                if p2d is None: continue
-                if (p2d - xy).length > dist2D: continue
-                d3d = 0
-                nearest.append((self._wrap_bmvert(bmv), d3d))
-        return nearest
-
-    def nearest2D_bmvert_Point2D(self, xy:Point2D, Point_to_Point2Ds, *, verts=None, max_dist=None, fwd=None):
+        bmvs, rows, co, no = self._gather_verts_world(verts)
+        xy2, valid = self._project2D(co, no, Point_to_Point2Ds, fwd, project2D)
+        owners, copies = np.nonzero(valid)
+        dists = distances_to_point(xy2[owners, copies], xy)
+        return [
+            (self._wrap_bmvert(bmvs[rows[owners[m]]]), 0)
+            for m in np.flatnonzero(dists <= dist2D)
+        ]
+
+    def nearest2D_bmvert_Point2D(self, xy:Point2D, Point_to_Point2Ds, *, verts=None, max_dist=None, fwd=None, project2D=None):
         if not max_dist or max_dist < 0: max_dist = float('inf')
         # TODO: compute distance from camera to point
         # TODO: sort points based on 3d distance
-        if verts is None:
-            verts = [bmv for bmv in self.bme.verts if bmv.is_valid and not bmv.hide]
-        else:
-            verts = [self._unwrap(bmv) for bmv in verts if bmv.is_valid and not bmv.hide]
-        l2w_point, l2w_normal = self.xform.l2w_point, self.xform.l2w_normal
-        bv,bd = None,None
-        for bmv in verts:
-            co, no = l2w_point(bmv.co), l2w_normal(bmv.normal)
-            for p2d in Point_to_Point2Ds(co, no, fwd=fwd):
-                if p2d is None: continue
-                d2d = (xy - p2d).length
-                if d2d > max_dist: continue
-                if bv is None or d2d < bd: bv,bd = bmv,d2d
-        if bv is None: return (None,None)
-        return (self._wrap_bmvert(bv),bd)
-
-    def nearest2D_bmedges_Point2D(self, xy:Point2D, dist2D:float, Point_to_Point2Ds, *, edges=None, shorten=0.01, fwd=None):
+        bmvs, rows, co, no = self._gather_verts_world(verts)
+        xy2, valid = self._project2D(co, no, Point_to_Point2Ds, fwd, project2D)
+        owners, copies = np.nonzero(valid)
+        if not len(owners): return (None, None)
+        dists = distances_to_point(xy2[owners, copies], xy)
+        m = int(np.argmin(dists))
+        if dists[m] > max_dist: return (None, None)
+        return (self._wrap_bmvert(bmvs[rows[owners[m]]]), float(dists[m]))
+
+    def nearest2D_bmedges_Point2D(self, xy:Point2D, dist2D:float, Point_to_Point2Ds, *, edges=None, shorten=0.01, fwd=None, project2D=None):
         # TODO: compute distance from camera to point
         # TODO: sort points based on 3d distance
-        if edges is None:
-            edges = [bme for bme in self.bme.edges if bme.is_valid and not bme.hide]
-        else:
-            edges = [self._unwrap(bme) for bme in edges if bme.is_valid and not bme.hide]
-        l2w_point, l2w_normal = self.xform.l2w_point, self.xform.l2w_normal
-        nearest = []
-        dist2D2 = dist2D**2
-        s0,s1 = shorten/2,1-shorten/2
-        for bme in edges:
-            bmv0, bmv1 = bme.verts
-            co0, no0 = l2w_point(bmv0.co), l2w_normal(bmv0.normal)
-            co1, no1 = l2w_point(bmv1.co), l2w_normal(bmv1.normal)
-            for v0, v1 in zip(Point_to_Point2Ds(co0, no0, fwd=fwd), Point_to_Point2Ds(co1, no1, fwd=fwd)):
-                if not v0 or not v1: continue
-                l = v0.distance_to(v1)
-                if l == 0:
-                    pp = v0
-                else:
-                    d = (v1 - v0) / l
-                    pp = v0 + d * max(l*s0, min(l*s1, d.dot(xy-v0)))
-                dist2 = pp.distance_squared_to(xy)
-                if dist2 > dist2D2: continue
-                nearest.append((self._wrap_bmedge(bme), math.sqrt(dist2)))
-        return nearest
-
-    def nearest2D_bmedge_Point2D(self, xy:Point2D, Point_to_Point2Ds, *, edges=None, shorten=0.01, max_dist=None, fwd=None):
+        bmes, rows, co0, co1, no0, no1 = self._gather_edges_world(edges)
+        owners, v0, v1 = self._segments2D(
+            *self._project2D(co0, no0, Point_to_Point2Ds, fwd, project2D),
+            *self._project2D(co1, no1, Point_to_Point2Ds, fwd, project2D),
+        )
+        _, dists = closest_on_segments(v0, v1, xy, t_min=shorten/2, t_max=1-shorten/2)
+        return [
+            (self._wrap_bmedge(bmes[rows[owners[m]]]), float(dists[m]))
+            for m in np.flatnonzero(dists <= dist2D)
+        ]
+
+    def nearest2D_bmedge_Point2D(self, xy:Point2D, Point_to_Point2Ds, *, edges=None, shorten=0.01, max_dist=None, fwd=None, project2D=None):
         if not max_dist or max_dist < 0: max_dist = float('inf')
-        if edges is None:
-            edges = [bme for bme in self.bme.edges if bme.is_valid and not bme.hide]
-        else:
-            edges = [self._unwrap(bme) for bme in edges if bme.is_valid and not bme.hide]
-        l2w_point, l2w_normal = self.xform.l2w_point, self.xform.l2w_normal
-        be,bd,bpp = None,None,None
-        for bme in edges:
-            bmv0, bmv1 = bme.verts
-            co0, no0 = l2w_point(bmv0.co), l2w_normal(bmv0.normal)
-            co1, no1 = l2w_point(bmv1.co), l2w_normal(bmv1.normal)
-            for v0, v1 in zip(Point_to_Point2Ds(co0, no0, fwd=fwd), Point_to_Point2Ds(co1, no1, fwd=fwd)):
-                if v0 is None or v1 is None: continue
-                diff = v1 - v0
-                l = diff.length
-                if l == 0:
-                    dist = (xy - v0).length
-                    pp = v0
-                else:
-                    d = diff / l
-                    margin = l * shorten / 2
-                    pp = v0 + d * max(margin, min(l-margin, (xy - v0).dot(d)))
-                    dist = (xy - pp).length
-                if dist > max_dist: continue
-                if be is None or dist < bd: be,bd,bpp = bme,dist,pp
-        if be is None: return (None,None)
-        return (self._wrap_bmedge(be), (xy-bpp).length)
-
-    def nearest2D_bmfaces_Point2D(self, xy:Point2D, Point_to_Point2Ds, *, faces=None, fwd=None):
+        bmes, rows, co0, co1, no0, no1 = self._gather_edges_world(edges)
+        owners, v0, v1 = self._segments2D(
+            *self._project2D(co0, no0, Point_to_Point2Ds, fwd, project2D),
+            *self._project2D(co1, no1, Point_to_Point2Ds, fwd, project2D),
+        )
+        if not len(owners): return (None, None)
+        _, dists = closest_on_segments(v0, v1, xy, t_min=shorten/2, t_max=1-shorten/2)
+        m = int(np.argmin(dists))
+        if dists[m] > max_dist: return (None, None)
+        return (self._wrap_bmedge(bmes[rows[owners[m]]]), float(dists[m]))
+
+    def nearest2D_bmfaces_Point2D(self, xy:Point2D, Point_to_Point2Ds, *, faces=None, fwd=None, project2D=None):
         # TODO: compute distance from camera to point
         # TODO: sort points based on 3d distance
-        if faces is None:
-            faces = [bmf for bmf in self.bme.faces if bmf.is_valid and not bmf.hide]
-        else:
-            faces = [self._unwrap(bmf) for bmf in faces if bmf.is_valid and not bmf.hide]
-        l2w_point, l2w_normal = self.xform.l2w_point, self.xform.l2w_normal
-        nearest = []
-        for bmf in faces:
-            ptsets = [Point_to_Point2Ds(l2w_point(bmv.co), l2w_normal(bmv.normal), fwd=fwd) for bmv in bmf.verts]
-            ptsets = list(zip(*ptsets))
-            for pts in ptsets:
-                pts = [pt for pt in pts if pt]
-                if len(pts) < 3: continue
-                pt0 = pts[0]
-                # TODO: Get dist?
-                for pt1,pt2 in zip(pts[1:-1],pts[2:]):
-                    if intersect_point_tri_2d(xy, pt0, pt1, pt2):
-                        nearest.append((self._wrap_bmface(bmf), dist))
-        return nearest
-
-    def nearest2D_bmface_Point2D(self, forward:Direction, xy:Point2D, Point_to_Point2Ds, *, faces=None, fwd=None):
+        bmfs, rows, hits, _ = self._faces_under_Point2D(xy, faces, Point_to_Point2Ds, fwd, project2D)
+        return [ (self._wrap_bmface(bmfs[rows[h]]), 0) for h in hits ]
+
+    def nearest2D_bmface_Point2D(self, forward:Direction, xy:Point2D, Point_to_Point2Ds, *, faces=None, fwd=None, project2D=None):
         # TODO: compute distance from camera to point
         # TODO: sort points based on 3d distance
-        if faces is None:
-            faces = [bmf for bmf in self.bme.faces if bmf.is_valid and not bmf.hide]
-        else:
-            faces = [self._unwrap(bmf) for bmf in faces if bmf.is_valid and not bmf.hide]
-        l2w_point, l2w_normal = self.xform.l2w_point, self.xform.l2w_normal
-        bv,bd = None,None
-        best_d = float('inf')
-        best_f = None
-        for bmf in faces:
-            ptsets = [Point_to_Point2Ds(l2w_point(bmv.co), l2w_normal(bmv.normal), fwd=fwd) for bmv in bmf.verts]
-            ptsets = list(zip(*ptsets))
-            for pts in ptsets:
-                pts = [pt for pt in pts if pt]
-                if len(pts) < 3: continue
-                pt0 = pts[0]
-                for pt1,pt2 in zip(pts[1:-1],pts[2:]):
-                    if intersect_point_tri_2d(xy, pt0, pt1, pt2):
-                        f = self._wrap_bmface(bmf)
-                        d = forward.dot(f.center())
-                        if d < best_d: best_d, best_f = d, f
-        if not best_f: return (None, None)
-        return (best_f, 0)
+        bmfs, rows, hits, centers = self._faces_under_Point2D(xy, faces, Point_to_Point2Ds, fwd, project2D)
+        if not len(hits): return (None, None)
+        depths = centers[hits] @ np.array(forward, dtype=np.float64)
+        h = hits[int(np.argmin(depths))]
+        return (self._wrap_bmface(bmfs[rows[h]]), 0)
 
 
     ##########################################################
@@ -957,18 +1114,33 @@ class RFMesh():
             return is_visible(p, n) or is_visible(p + m * n, n)
         return is_vis
 
-    def visible_verts(self, is_visible, verts=None):
+    def visible_vert_mask(self, visibility, verts=None):
+        '''
+        batched version of _gen_is_vis, where visibility is a VisibilityPass.
+        returns (bmverts, rows, mask), where mask[k] is True if bmverts[rows[k]] is visible
+        '''
+        bmvs, rows, co, no = self._gather_verts_world(verts)
+        m = 0.002 * options['normal offset multiplier']
+        return (bmvs, rows, visibility.mask_offset(co, no, m))
+
+    def visible_verts(self, is_visible, verts=None, *, visibility=None):
+        if visibility:
+            bmvs, rows, mask = self.visible_vert_mask(visibility, verts=verts)
+            return { self._wrap_bmvert(bmvs[i]) for i in rows[mask].tolist() }
         is_vis = self._gen_is_vis(is_visible)
         verts = self.bme.verts if verts is None else map(self._unwrap, verts)
         return { self._wrap_bmvert(bmv) for bmv in filter(is_vis, verts) }
 
-    def visible_edges(self, is_visible, verts=None, edges=None):
+    def visible_edges(self, is_visible, verts=None, edges=None, *, visibility=None):
         edges = self.bme.edges if edges is None else map(self._unwrap, edges)
 
         is_valid = RFMesh.fn_is_valid
 
+        if verts is None and visibility:
+            verts = self.visible_verts(is_visible, visibility=visibility)
+
         # Edge is visible if ANY of its vertices are visible
-        if verts:
+        if verts is not None:
             verts = set(map(self._unwrap, verts))
             is_edge_vis = lambda bme: is_valid(bme) and any(bmv in verts for bmv in bme.verts)
         else:
@@ -981,11 +1153,14 @@ class RFMesh():
 
         return { self._wrap_bmedge(bme) for bme in filter(is_edge_vis, edges) }
 
-    def visible_faces(self, is_visible, verts=None, faces=None):
+    def visible_faces(self, is_visible, verts=None, faces=None, *, visibility=None):
         is_valid = RFMesh.fn_is_valid
 
+        if verts is None and visibility:
+            verts = self.visible_verts(is_visible, visibility=visibility)
+
         # Get visible vertices first
-        if verts:
+        if verts is not None:
             verts = set(map(self._unwrap, verts))
         else:
             is_vert_vis = self._gen_is_vis(is_visible)
@@ -1021,9 +1196,12 @@ class RFMesh():
     def get_face_count(self): return len(self.bme.faces)
 
     # NOTE: self.bme.select_history does _NOT_ work
-    def get_selected_verts(self):   return set(map(self._wrap_bmvert, filter(RFMesh.fn_is_selected_revealed,   self.bme.verts)))
-    def get_selected_edges(self):   return set(map(self._wrap_bmedge, filter(RFMesh.fn_is_selected_revealed,   self.bme.edges)))
-    def get_selected_faces(self):   return set(map(self._wrap_bmface, filter(RFMesh.fn_is_selected_revealed,   self.bme.faces)))
+    # NOTE: selected elements come from selection index (see rfmesh_selection.py)
+    def get_selected_verts(self):   return set(map(self._wrap_bmvert, self._selection.get_verts(self.bme)))
+    def get_selected_edges(self):   return set(map(self._wrap_bmedge, self._selection.get_edges(self.bme)))
+    def get_selected_faces(self):   return set(map(self._wrap_bmface, self._selection.get_faces(self.bme)))
+    def get_selected_counts(self):
+        return (len(self._selection.get_verts(self.bme)), len(self._selection.get_edges(self.bme)), len(self._selection.get_faces(self.bme)))
     def get_unselected_verts(self): return set(map(self._wrap_bmvert, filter(RFMesh.fn_is_unselected_revealed, self.bme.verts)))
     def get_unselected_edges(self): return set(map(self._wrap_bmedge, filter(RFMesh.fn_is_unselected_revealed, self.bme.edges)))
     def get_unselected_faces(self): return set(map(self._wrap_bmface, filter(RFMesh.fn_is_unselected_revealed, self.bme.faces)))
@@ -1035,29 +1213,44 @@ class RFMesh():
     def get_revealed_edges(self): return set(map(self._wrap_bmedge, filter(RFMesh.fn_is_valid_revealed, self.bme.edges)))
     def get_revealed_faces(self): return set(map(self._wrap_bmface, filter(RFMesh.fn_is_valid_revealed, self.bme.faces)))
 
-    def any_verts_selected(self): return any(bmv.select for bmv in self.bme.verts if bmv.is_valid and not bmv.hide)
-    def any_edges_selected(self): return any(bme.select for bme in self.bme.edges if bme.is_valid and not bme.hide)
-    def any_faces_selected(self): return any(bmf.select for bmf in self.bme.faces if bmf.is_valid and not bmf.hide)
+    def any_verts_selected(self): return bool(self._selection.get_verts(self.bme))
+    def any_edges_selected(self): return bool(self._selection.get_edges(self.bme))
+    def any_faces_selected(self): return bool(self._selection.get_faces(self.bme))
     def any_selected(self):       return self.any_verts_selected() or self.any_edges_selected() or self.any_faces_selected()
 
     def get_selection_center(self):
         v,c = Vector(),0
-        for bmv in self.bme.verts:
-            if not bmv.select or not bmv.is_valid: continue
+        for bmv in self._selection.get_verts(self.bme, hidden=True):
             v += bmv.co
             c += 1
         if c: self.selection_center = v / c
         return self.xform.l2w_point(self.selection_center)
     def get_selection_bbox(self):
         l2w_point = self.xform.l2w_point
-        coords = [l2w_point(bmv.co) for bmv in self.bme.verts if bmv.is_valid and bmv.select]
+        coords = [l2w_point(bmv.co) for bmv in self._selection.get_verts(self.bme, hidden=True)]
         #if not coords: return self.get_bbox()
         return BBox(from_coords=coords)
 
+    def selection_added(self, elems):
+        ''' records that elems (and their edges and verts) might have become selected (see rfmesh_selection.py) '''
+        self._selection.add_all(map(self._unwrap, elems))
+
+    def selection_invalidate(self):
+        ''' records that unknown elements might have become selected, ex: after bmesh.ops '''
+        self._selection.invalidate()
+
     def deselect_all(self):
-        for bmv in self.bme.verts: bmv.select = False
-        for bme in self.bme.edges: bme.select = False
-        for bmf in self.bme.faces: bmf.select = False
+        if self._selection.is_valid:
+            # only elements in selection index might be selected
+            bmelems = [ bmelem for bmelem in self._selection.iter_all(self.bme) if bmelem.is_valid ]
+            self.journal_selection(bmelems)
+            for bmelem in bmelems: bmelem.select = False
+        else:
+            self.journal_selection(bmelem for bmelem in chain(self.bme.verts, self.bme.edges, self.bme.faces) if bmelem.select)
+            for bmv in self.bme.verts: bmv.select = False
+            for bme in self.bme.edges: bme.select = False
+            for bmf in self.bme.faces: bmf.select = False
+        self._selection.clear()
         self.dirty(selectionOnly=True)
 
     def deselect(self, elems, supparts=True, subparts=True):
@@ -1086,8 +1279,10 @@ class RFMesh():
                 selems.update(e for e in elem.edges if not (set(e.verts)&elems))
         selems = selems - elems
         selems = { e for e in selems if e.select }
+        self.journal_selection(nelems | selems)
         for elem in nelems: elem.select = False
         for elem in selems: elem.select = True
+        self.selection_added(selems)
         if subparts:
             nelems = set()
             for elem in elems:
@@ -1108,6 +1303,7 @@ class RFMesh():
                         if any(e.select for e in bmv.link_edges): continue
                         if any(f.select for f in bmv.link_faces): continue
                         nelems.add(bmv)
+            self.journal_selection(nelems)
             for elem in nelems:
                 elem.select = False
         self.dirty(selectionOnly=True)
@@ -1129,17 +1325,23 @@ class RFMesh():
                     nelems.update(e for e in elem.verts)
                     nelems.update(e for e in elem.edges)
             elems = nelems
+        self.journal_selection(elems)
         for elem in elems: elem.select = True
+        self.selection_added(elems)
         if supparts:
             for elem in elems:
                 t = type(elem)
                 if t is not BMVert and t is not RFVert: continue
                 for bme in elem.link_edges:
                     if all(bmv.select for bmv in bme.verts):
+                        self.journal_selection([bme])
                         bme.select = True
+                        self.selection_added([bme])
                 for bmf in elem.link_faces:
                     if all(bmv.select for bmv in bmf.verts):
+                        self.journal_selection([bmf])
                         bmf.select = True
+                        self.selection_added([bmf])
         self.dirty(selectionOnly=True)
 
     def get_quadwalk_edgesequence(self, edge):
@@ -1350,9 +1552,11 @@ class RFMesh():
         return (edges, False)
 
     def select_all(self):
+        self.journal_selection(bmelem for bmelem in chain(self.bme.verts, self.bme.edges, self.bme.faces) if not bmelem.select)
         for bmv in self.bme.verts: bmv.select = True
         for bme in self.bme.edges: bme.select = True
         for bmf in self.bme.faces: bmf.select = True
+        self._selection.fill(self.bme)
         self.dirty(selectionOnly=True)
 
     def select_toggle(self):
@@ -1361,6 +1565,7 @@ class RFMesh():
         else:   self.select_all()
 
     def select_invert(self):
+        self.journal_selection(chain(self.bme.verts, self.bme.edges, self.bme.faces))
         if True:
             sel_verts = [bmv for bmv in self.bme.verts if not bmv.select]
             for bmf in self.bme.faces: bmf.select = all(bmv in sel_verts for bmv in bmf.verts)
@@ -1370,6 +1575,7 @@ class RFMesh():
             for bmv in self.bme.verts: bmv.select = not bmv.select
             for bme in self.bme.edges: bme.select = not bme.select
             for bmf in self.bme.faces: bmf.select = not bmf.select
+        self._selection.invalidate()
         self.dirty()
 
     def select_linked(self, *, select=True, connected_to=None):
@@ -1397,12 +1603,14 @@ class RFMesh():
                 if bmvo in linked_verts: continue
                 working.add(bmvo)
                 linked_verts.add(bmvo)
+        self.journal_selection(chain(linked_verts, *(bmv.link_edges for bmv in linked_verts), *(bmv.link_faces for bmv in linked_verts)))
         for bmv in linked_verts:
             bmv.select = select
             for bme in bmv.link_edges:
                 bme.select = select
             for bmf in bmv.link_faces:
                 bmf.select = select
+            if select: self.selection_added([bmv, *bmv.link_edges, *bmv.link_faces])
         self.dirty()
 
 
@@ -1430,7 +1638,7 @@ class RFSource(RFMesh):
             if obj.data.name in RFSource.__cache:
                 # does cache match current state?
                 rfsource = RFSource.__cache[obj.data.name]
-                hashed = hash_object(obj)
+                hashed = fingerprint_object(obj)
                 if rfsource.hash != hashed:
                     rfsource = None
             if not rfsource:
@@ -1456,10 +1664,266 @@ class RFSource(RFMesh):
         # print('RFSource.__init__', RFMesh.create_count, RFMesh.delete_count)
 
     def __setup__(self, obj:bpy.types.Object):
+        self._bme = None
+        self.packed = None
+        self.evaluation = evaluation_count(obj)     # see check_changed
+
+        if options['source packed']:
+            self.setup_timings = {}
+            with self._setup_stage('hashing'):
+                hashed = fingerprint_object(obj)
+            with self._setup_stage('gathering packed arrays'):
+                packed = RFSourceCache.get_arrays(obj)
+            self._setup_packed(obj, hashed, packed)
+            return
+
         super().__setup__(obj, deform=True, triangulate=True, selection=False, keepeme=True)
         self.mirror_mod = None
         self.ensure_lookup_tables()
 
+    @profiler.function
+    def _setup_packed(self, obj:bpy.types.Object, hashed, packed:RFSourceArrays):
+        '''
+        sets up RFSource from packed arrays, skipping validation, BMesh
+        creation, triangulation, and normal updates.  sources are read-only, so
+        the BMesh is only created if an operation needs it (see bme property).
+        NOTE: face indices (ex: raycast) are indices into packed.tris
+        '''
+        self.obj = obj
+        self.xform = XForm(self.obj.matrix_world)
+        self.hash = hashed
+        self._version = None
+        self._version_selection = None
+        self._selection = RFMeshSelection()
+        self.packed = packed
+        self.mirror_mod = None
+        self.selection_center = Point((0, 0, 0))
+        self.store_state()
+        self.dirty()
+
+    def __del__(self):
+        RFMesh.delete_count += 1
+        bme = getattr(self, '_bme', None)
+        if bme is not None: bme.free()
+
+    @property
+    def bme(self):
+        if self._bme is None:
+            # built from packed arrays (rather than from object) so that indices match
+            with profiler.code('creating BMesh of packed source'):
+                bme = self.packed.to_bmesh()
+                bme.normal_update()
+                bme.verts.ensure_lookup_table()
+                bme.edges.ensure_lookup_table()
+                bme.faces.ensure_lookup_table()
+            self._bme = bme
+        return self._bme
+
+    @bme.setter
+    def bme(self, bme):
+        self._bme = bme
+
+    @profiler.function
+    def get_bvh(self):
+        if self.packed is None: return super().get_bvh()
+        ver = self.get_version(selection=False)
+        if not hasattr(self, 'bvh') or self.bvh_version != ver:
+            self.bvh = BVHTree.FromPolygons(self.packed.co.tolist(), self.packed.tris.tolist(), all_triangles=True)
+            self.bvh_version = ver
+        return self.bvh
+
+    @profiler.function
+    def get_kdtree(self):
+        if self.packed is None: return super().get_kdtree()
+        ver = self.get_version(selection=False)
+        if not hasattr(self, 'kdt') or self.kdt_version != ver:
+            co = self.packed.co
+            self.kdt = KDTree(len(co))
+            for i, p in enumerate(co.tolist()):
+                self.kdt.insert(p, i)
+            self.kdt.balance()
+            self.kdt_version = ver
+        return self.kdt
+
+    def check_changed(self):
+        '''
+        sets up source again if depsgraph re-evaluated geometry or transform of its object
+        since setup (ex: modifier targets, armature pose, shape keys, or drivers changed).
+        setting up bumps version, so all version-keyed caches (BVH, snapshot, drawing) rebuild.
+        only called once per frame (see RetopoFlow_Sources.update_sources), never from queries.
+        returns True if source was set up again
+        '''
+        if evaluation_count(self.obj) == self.evaluation: return False
+        # old BMesh is not freed here, because renderers might still hold it
+        self.__setup__(self.obj)
+        return True
+
+    @profiler.function
+    def get_snapshot(self):
+        if self.packed is None: return super().get_snapshot()
+        ver = self.get_version(selection=False)
+        if not hasattr(self, 'snapshot') or self.snapshot_version != ver:
+            p = self.packed
+            self.snapshot = RFMeshSnapshot.from_triangles(p.co, p.normal, p.edge_verts, p.tris, self.xform)
+            self.snapshot_version = ver
+        return self.snapshot
+
+    def get_geometry_counts(self):
+        if self.packed is None: return super().get_geometry_counts()
+        return self.packed.counts
+
+    ##########################################################
+    # plane intersections and crawling over packed arrays
+    # faces are indices into packed.tris, and edges are indices into packed.edge_verts
+
+    @profiler.function
+    def plane_intersection(self, plane: Plane):
+        if self.packed is None:
+            yield from super().plane_intersection(plane)
+            return
+        l2w_point = self.xform.l2w_point
+        plane_local = self.xform.w2l_plane(plane)
+        co, tris = self.packed.co, self.packed.tris
+
+        # split faces: faces with verts on different sides of plane (see Plane.side)
+        d = (co.astype(np.float64) - np.array(plane_local.o)) @ np.array(plane_local.n)
+        side = np.where(np.abs(d) < zero_threshold, 0, np.sign(d)).astype(np.int8)
+        tri_side = side[tris]
+        split = np.flatnonzero((tri_side != tri_side[:, [1, 2, 0]]).any(axis=1))
+
+        # intersections
+        triangle_intersection = plane_local.triangle_intersection
+        yield from (
+            (l2w_point(p0), l2w_point(p1))
+            for tri in co[tris[split]].tolist()
+            for (p0, p1) in triangle_intersection([Vector(p) for p in tri])
+        )
+
+    def _plane_signed_distance_fn(self, plane):
+        ''' returns memoized fn(vert index) => signed distance of vert to (local) plane '''
+        co = self.packed.co
+        nx, ny, nz = plane.n
+        od = plane.n.dot(plane.o)
+        dists = {}
+        def signed_distance(v):
+            d = dists.get(v)
+            if d is None:
+                x, y, z = co[v].tolist()
+                d = dists[v] = nx*x + ny*y + nz*z - od
+            return d
+        return signed_distance
+
+    @profiler.function
+    def _crawl_packed(self, tri_start, plane, signed_distance):
+        '''
+        same as RFMesh._crawl, but walks across packed triangle adjacency.
+        vert sides are computed with threshold=0 (as in RFMesh._crawl), so every
+        triangle that the plane crosses is crossed at exactly two of its edges
+        '''
+        tris, tri_edges, tri_neighbors = self.packed.tris, self.packed.tri_edges, self.packed.tri_neighbors
+
+        def crossings(t):
+            vs = tris[t].tolist()
+            sides = [signed_distance(v) < 0 for v in vs]
+            return [(k, vs[k], vs[(k+1)%3]) for k in range(3) if sides[k] != sides[(k+1)%3]]
+        def intersect(v0, v1):
+            d0, d1 = signed_distance(v0), signed_distance(v1)
+            p0, p1 = self.packed.co[v0].tolist(), self.packed.co[v1].tolist()
+            f = d0 / (d0 - d1)
+            return Point(tuple(a + (b - a) * f for (a, b) in zip(p0, p1)))
+
+        start = crossings(tri_start)
+        if len(start) != 2: return []
+
+        ret = []
+        def crawl(crossing):
+            nonlocal ret
+            t_current = tri_start
+            while True:
+                k, v0, v1 = crossing
+                e = tri_edges[t_current, k]
+                t_next = int(tri_neighbors[t_current, k])
+                t_next = None if t_next < 0 else t_next
+                ret.append((t_current, intersect(v0, v1), t_next))
+                if t_next is None: return False
+                if t_next == tri_start: return True
+                crossing = next((c for c in crossings(t_next) if tri_edges[t_next, c[0]] != e), None)
+                if crossing is None: return False
+                t_current = t_next
+        wrapped = crawl(start[0])
+        if not wrapped:
+            # did not wrap, so switch directions
+            ret = [(f1,c,f0) for (f0,c,f1) in reversed(ret)]
+            crawl(start[1])
+        return ret
+
+    def _walk_to_plane_packed(self, tri, signed_distance):
+        '''
+        same as walk_to_plane_heap in RFMesh.plane_intersection_crawl, but on packed arrays.
+        uses a heap to greedily follow the triangles linked to verts toward the plane
+        '''
+        tris, get_vert_tris = self.packed.tris, self.packed.get_vert_tris
+        def touches(t):
+            dots = [signed_distance(v) for v in tris[t].tolist()]
+            return max(dots) >= 0 and min(dots) <= 0
+
+        vs = tris[tri].tolist()
+        dots = [signed_distance(v) for v in vs]
+        if max(dots) >= 0 and min(dots) <= 0: return tri                # tri crosses/touches plane already!
+        sign = -1 if dots[0] < 0 else 1                                 # indicates direction that we need to walk
+        heap = [(abs(dot), v) for (v, dot) in zip(vs, dots)]
+        heapq.heapify(heap)
+        touched_tris, touched_verts = { tri }, set(vs)
+        while True:
+            if not heap: return None
+            dot, v = heapq.heappop(heap)                                # get next vert to process
+            if dot <= 0: break                                          # found a vert at or across the plane!
+            for t in get_vert_tris(v):
+                if t in touched_tris: continue
+                touched_tris.add(t)
+                for v2 in tris[t].tolist():
+                    if v2 in touched_verts: continue
+                    touched_verts.add(v2)
+                    heapq.heappush(heap, (signed_distance(v2) * sign, v2))
+        # find a tri adjacent to v that crosses the plane
+        return next((t for t in get_vert_tris(v) if touches(t)), None)
+
+    @profiler.function
+    def plane_intersection_crawl(self, ray:Ray, plane:Plane, walk_to_plane:bool=False):
+        if self.packed is None: return super().plane_intersection_crawl(ray, plane, walk_to_plane=walk_to_plane)
+        ray,plane = self.xform.w2l_ray(ray),self.xform.w2l_plane(plane)
+        _,_,i,_ = self.get_bvh().ray_cast(ray.o, ray.d, ray.max)
+        if i is None: return None
+        signed_distance = self._plane_signed_distance_fn(plane)
+        if walk_to_plane:
+            i = self._walk_to_plane_packed(i, signed_distance)
+            if i is None: return None
+        l2w_point = self.xform.l2w_point
+        return [(f0,l2w_point(c),f1) for (f0,c,f1) in self._crawl_packed(i, plane, signed_distance)]
+
+    @profiler.function
+    def plane_intersections_crawl(self, plane:Plane):
+        if self.packed is None: return super().plane_intersections_crawl(plane)
+        plane = self.xform.w2l_plane(plane)
+        l2w_point = self.xform.l2w_point
+        signed_distance = self._plane_signed_distance_fn(plane)
+
+        # finding faces crossing plane
+        d = (self.packed.co.astype(np.float64) - np.array(plane.o)) @ np.array(plane.n)
+        below = (d < 0)[self.packed.tris]
+        faces = np.flatnonzero((below != below[:, [1, 2, 0]]).any(axis=1)).tolist()
+
+        # crawling faces along plane
+        rets = []
+        touched = set()
+        for tri in faces:
+            if tri in touched: continue
+            ret = self._crawl_packed(tri, plane, signed_distance)
+            touched |= set(f0 for f0,_,_ in ret if f0 is not None)
+            touched |= set(f1 for _,_,f1 in ret if f1 is not None)
+            rets.append([(f0,l2w_point(c),f1) for (f0,c,f1) in ret])
+        return rets
+
     def __str__(self):
         return '<RFSource %s>' % self.obj.name
 
@@ -1496,12 +1960,27 @@ class RFTarget(RFMesh):
     def __str__(self):
         return '<RFTarget %s>' % self.obj.name
 
-    def __setup__(self, obj:bpy.types.Object, unit_scaling_factor:float, rftarget_copy=None):
-        bme = rftarget_copy.bme.copy() if rftarget_copy else None
+    def __setup__(self, obj:bpy.types.Object, unit_scaling_factor:float, rftarget_copy=None, bme=None):
+        if bme is None and rftarget_copy: bme = rftarget_copy.bme.copy()
         xy_symmetry_accel = rftarget_copy.xy_symmetry_accel if rftarget_copy else None
         xz_symmetry_accel = rftarget_copy.xz_symmetry_accel if rftarget_copy else None
         yz_symmetry_accel = rftarget_copy.yz_symmetry_accel if rftarget_copy else None
 
+        # must be set up before super().__setup__, which calls self.dirty()
+        self._touched = set()           # bmelems changed since last call to dirty()
+        self._selected = set()          # bmelems whose selection changed since last call to dirty()
+        self._touched_delta = (0, 0, 0) # net change to geometry counts made by tracked changes
+        self._touched_counts = None     # geometry counts at last call to dirty()
+        self._dirty_journal = deque(maxlen=64)
+        self._undo_delta = None         # open RFTargetDelta recording changes for undo
+        self._topology_version = 0      # incremented before every tracked topology change
+        self._attributes_version = 0    # incremented on every change to pin, seam, smooth, or material
+        self._mesh_sync_key = None      # topology and attributes versions of bme when last written to obj.data
+        self._mesh_sync_counter = None  # dirty counter when obj.data was last written
+        self._mesh_sync_co = None       # packed vert coordinates last written to obj.data
+        self._mesh_sync_selection = None
+        self.topology_cache = RFTargetTopologyCache()
+
         super().__setup__(obj, bme=bme, deform=False)
         # if Mirror modifier is attached, set up symmetry to match
         self.setup_mirror()
@@ -1564,9 +2043,13 @@ class RFTarget(RFMesh):
     def select_bad_symmetry(self):
         threshold = self.mirror_mod.symmetry_threshold * self.unit_scaling_factor / 2.0
         for bmv in self.bme.verts:
-            if self.mirror_mod.x and bmv.co.x < -threshold: bmv.select = True
-            if self.mirror_mod.y and bmv.co.y >  threshold: bmv.select = True
-            if self.mirror_mod.z and bmv.co.z < -threshold: bmv.select = True
+            bad  = self.mirror_mod.x and bmv.co.x < -threshold
+            bad |= self.mirror_mod.y and bmv.co.y >  threshold
+            bad |= self.mirror_mod.z and bmv.co.z < -threshold
+            if bad:
+                self.journal_selection([bmv])
+                bmv.select = True
+            if bmv.select: self._selection.add(bmv)
 
     def snap_to_symmetry(self, point, symmetry, from_world=True, to_world=True):
         if not symmetry and from_world == to_world: return point
@@ -1613,15 +2096,221 @@ class RFTarget(RFMesh):
         '''
         custom deepcopy method, because BMesh and BVHTree are not copyable
         '''
+        return self._copy(self.bme.copy(), memo)
+
+    def copy_with_bmesh(self, bme):
+        '''
+        creates copy of self with geometry of bme (ex: unpacked undo checkpoint).
+        copy takes ownership of bme
+        '''
+        return self._copy(bme, {})
+
+    # caches derived from bme that are built lazily (see RFMesh.get_*).  these hold data
+    # that cannot be copied (BMesh elements, BVHTree, KDTree), and the copy rebuilds them
+    _copy_skip = {
+        'bvh', 'bvh_version', 'kdt', 'kdt_version',
+        'snapshot', 'snapshot_version', 'world_bounds', 'world_bounds_version',
+    }
+
+    def _copy(self, bme, memo):
         rftarget = RFTarget.__new__(RFTarget)
         memo[id(self)] = rftarget
-        rftarget.__setup__(self.obj, self.unit_scaling_factor, rftarget_copy=self)
+        rftarget.__setup__(self.obj, self.unit_scaling_factor, rftarget_copy=self, bme=bme)
         # deepcopy all remaining settings
         for k,v in self.__dict__.items():
+            if k in self._copy_skip: continue
             if k not in {'prev_state'} and k in rftarget.__dict__: continue
             setattr(rftarget, k, copy.deepcopy(v, memo))
         return rftarget
 
+    ##########################################################
+    # dirty-element tracking
+    #
+    # RFVert/RFEdge/RFFace setters and RFTarget's own mutation methods record the bmelems
+    # that they touch.  every call to dirty() closes a journal entry with the touched
+    # bmelems, so that structures derived from the target (ex: visible Accel2D) can be
+    # patched in place rather than rebuilt.  selection changes are recorded separately (see
+    # journal_selection), so that dependents that only draw selection (ex: RFMeshRender)
+    # can patch only the affected elements.  if geometry counts changed in ways not
+    # accounted for by tracked changes (ex: bmesh.ops or wrapper topology ops), the entry
+    # is marked as untracked (None), and dependents must fully rebuild.
+
+    def _get_counts(self):
+        return (len(self.bme.verts), len(self.bme.edges), len(self.bme.faces))
+
+    def touch(self, bmelems):
+        self._touched.update(map(self._unwrap, bmelems))
+
+    def touch_bmelem(self, bmelem):
+        self._touched.add(bmelem)
+
+    @contextmanager
+    def _tracked_topology(self):
+        '''
+        accounts for geometry counts changed by tracked mutation.  caller must touch elements,
+        and must call journal_removed (journal_created) before (after) removing (creating) them
+        '''
+        # tracked mutations never select new elements, so selection index stays valid
+        self._journal_topology()
+        before = self._get_counts()
+        yield
+        after = self._get_counts()
+        self._touched_delta = tuple(d + a - b for (d, a, b) in zip(self._touched_delta, after, before))
+
+    def dirty(self, selectionOnly=False):
+        super().dirty(selectionOnly=selectionOnly)
+        if selectionOnly:
+            # selection changes do not affect geometry, so keep touched bmelems for next entry
+            self._dirty_journal.append((self._version_selection, set(), self._selected))
+            self._selected = set()
+            return
+        counts = self._get_counts()
+        expected = self._touched_counts and tuple(c + d for (c, d) in zip(self._touched_counts, self._touched_delta))
+        touched = self._touched if (self._touched and counts == expected) else None
+        if counts != expected: self._selection.invalidate()
+        self._dirty_journal.append((self._version_selection, touched, self._selected))
+        self._touched = set()
+        self._selected = set()
+        self._touched_delta = (0, 0, 0)
+        self._touched_counts = counts
+
+    def get_topology_version(self):
+        ''' changes before every tracked change to topology (see journal_checkpoint) '''
+        return self._topology_version
+
+    def touch_topology(self):
+        ''' records that topology (including face winding) is about to change '''
+        self._topology_version += 1
+
+    def touch_attributes(self):
+        ''' records that pin, seam, smooth, or material of some element changed '''
+        self._attributes_version += 1
+
+    def touch_untracked(self):
+        ''' records change that dependents cannot patch (ex: reordered elements), so they rebuild on next dirty() '''
+        self._touched.clear()
+        self._touched_counts = None
+
+    def analyze_topology(self, kind, elems, fn, *, coords=False, params=None):
+        ''' returns fn(component) for each connected component of elems (see rfmesh_topology.py) '''
+        return self.topology_cache.analyze(self, kind, elems, fn, coords=coords, params=params)
+
+    @profiler.function
+    def get_snapshot(self):
+        '''
+        wrapper setters (ex: RFVert.co) touch bmelems without changing version until next
+        dirty(), so touched rows are patched into snapshot before it is served
+        '''
+        snap = super().get_snapshot()
+        if self._touched and not snap.patch(self._touched, self.xform):
+            snap = self.snapshot = RFMeshSnapshot(self.bme, self.xform)
+        return snap
+
+    def get_touched_pending(self):
+        ''' returns set of bmelems touched since last call to dirty() '''
+        return set(self._touched)
+
+    def get_dirty_counter(self):
+        ''' monotonic counter that changes on every call to dirty() '''
+        return self._version_selection
+
+    def get_touched_since(self, counter, *, selection=False):
+        '''
+        returns set of all bmelems touched after dirty counter, or None if unknown
+        (counter is too old, or an untracked change happened).
+        if selection is True, bmelems whose selection changed are included
+        '''
+        entries = list(self._dirty_journal)
+        idx = next((i for (i, (c, _, _)) in enumerate(entries) if c == counter), None)
+        if idx is None: return None
+        touched = set()
+        for (_, elems, selected) in entries[idx+1:]:
+            if elems is None: return None
+            touched |= elems
+            if selection: touched |= selected
+        return touched
+
+    ##########################################################
+    # undo journal
+    #
+    # while an RFTargetDelta is open, mutation entry points record the previous values of
+    # the bmelems they are about to change, so an undo step only holds what the action
+    # changed (see rfmesh_undo.py).  tracked changes to topology record the created and removed
+    # elements (see _tracked_topology).  changes that cannot be reverted element-wise (hiding,
+    # bmesh.ops) must call journal_checkpoint() first.
+
+    def undo_journal_open(self, delta):
+        self._undo_delta = delta
+        delta.open(self)
+
+    def undo_journal_close(self):
+        delta, self._undo_delta = self._undo_delta, None
+        if delta: delta.close(self)
+        return delta
+
+    def journal_bmelem(self, bmelem):
+        delta = self._undo_delta
+        if delta is None or not delta.recording: return
+        t = type(bmelem)
+        if   t is BMVert: delta.record_vert(bmelem, self.bme)
+        elif t is BMEdge: delta.record_edge(bmelem)
+        elif t is BMFace: delta.record_face(bmelem)
+
+    def journal_bmelems(self, bmelems):
+        delta = self._undo_delta
+        if delta is None or not delta.recording: return
+        for bmelem in map(self._unwrap, bmelems): self.journal_bmelem(bmelem)
+
+    def journal_flip(self, bmf):
+        self.touch_topology()
+        delta = self._undo_delta
+        if delta is None or not delta.recording: return
+        delta.record_flip(self._unwrap(bmf))
+
+    def journal_selection(self, bmelems):
+        '''
+        call before changing selection of bmelems.  selecting (deselecting) a face also
+        changes its edges and verts, and an edge its verts, so these are recorded, too
+        '''
+        bmelems = list(map(self._unwrap, bmelems))
+        selected = self._selected
+        for bmelem in bmelems:
+            selected.add(bmelem)
+            t = type(bmelem)
+            if t is BMVert: continue
+            selected.update(bmelem.verts)
+            if t is BMFace: selected.update(bmelem.edges)
+        delta = self._undo_delta
+        if delta is None or not delta.recording: return
+        for bmelem in bmelems: delta.record_select(bmelem)
+
+    def journal_created(self, bmelems):
+        delta = self._undo_delta
+        if delta is None or not delta.recording: return
+        delta.record_created(map(self._unwrap, bmelems))
+
+    def journal_removed(self, bmelems):
+        ''' call before removing bmelems.  linked elements that are removed with them are recorded, too '''
+        delta = self._undo_delta
+        if delta is None or not delta.recording: return
+        delta.record_removed(list(map(self._unwrap, bmelems)), self.bme)
+
+    def journal_checkpoint(self):
+        # untracked changes (ex: bmesh.ops) might select elements
+        self._selection.invalidate()
+        self.touch_topology()
+        delta = self._undo_delta
+        if delta is None or not delta.recording: return
+        delta.take_checkpoint(self)
+
+    def _journal_topology(self):
+        self.touch_topology()
+        delta = self._undo_delta
+        if delta is None or not delta.recording: return
+        if not delta.can_record_topology(self.bme): delta.take_checkpoint(self)
+
+    ##########################################################
+
     def to_json(self):
         data = {
             'verts': None,
@@ -1661,22 +2350,76 @@ class RFTarget(RFMesh):
             print(f'Caught Exception while trying to clean RFTarget: {e}')
             self.handle_exception(e)
 
+    @profiler.function
     def _clean_mesh(self):
-        prev_mesh = self.obj.data
-        prev_mesh_name = prev_mesh.name
-        new_mesh = self.obj.data.copy()
-        self.bme.to_mesh(new_mesh)
-        self.obj.data = new_mesh
-        bpy.data.meshes.remove(prev_mesh)
-        new_mesh.name = prev_mesh_name
+        '''
+        writes bme to obj.data.  if topology and attributes have not changed since the last
+        write, only the coordinates of touched verts are pushed into obj.data (see
+        _write_mesh_coords); otherwise, the whole bme is written (see _write_mesh_full)
+        '''
+        key = (self._topology_version, self._attributes_version, self._get_counts())
+        incremental = options['target incremental write'] and self._mesh_sync_key == key
+        if not (incremental and self._write_mesh_coords()):
+            self._write_mesh_full()
+        self._mesh_sync_key = key
+        self._mesh_sync_counter = self.get_dirty_counter()
+        # obj.data changed before depsgraph could report it (see hasher.py)
+        fingerprint_invalidate(self.obj.data)
 
+    @profiler.function
+    def _write_mesh_full(self):
+        me = self.obj.data
+        if me.users == 1:
+            self.bme.to_mesh(me)
+            me.update()
+        else:
+            # mesh is shared, so write into a copy and swap it in
+            prev_mesh_name = me.name
+            new_mesh = me.copy()
+            self.bme.to_mesh(new_mesh)
+            self.obj.data = new_mesh
+            bpy.data.meshes.remove(me)
+            new_mesh.name = prev_mesh_name
+            me = new_mesh
+        # keep packed coordinates for the following incremental writes
+        self._mesh_sync_co = np.empty(len(me.vertices) * 3, dtype=np.float32)
+        me.vertices.foreach_get('co', self._mesh_sync_co)
+        # to_mesh writes selection, too
+        self._mesh_sync_selection = self._version_selection
+
+    @profiler.function
+    def _write_mesh_coords(self):
+        '''
+        pushes coordinates of verts touched since last write with foreach_set.
+        returns False if obj.data does not match bme, and a full write is needed
+        '''
+        me, bmvs = self.obj.data, self.bme.verts
+        co = self._mesh_sync_co
+        if co is None or len(me.vertices) != len(bmvs) or len(co) != len(bmvs) * 3: return False
+        touched = self.get_touched_since(self._mesh_sync_counter)
+        if touched is None:
+            # unknown which verts moved, so gather all
+            co = gather_co(bmvs, len(bmvs)).astype(np.float32).reshape(-1)
+        else:
+            moved = [ bmv for bmv in (touched | self.get_touched_pending()) if type(bmv) is BMVert and bmv.is_valid ]
+            if not moved: return True
+            bmvs.index_update()
+            rows = np.fromiter((bmv.index for bmv in moved), dtype=np.int64, count=len(moved))
+            co.reshape((-1, 3))[rows] = gather_co(moved, len(moved))
+        me.vertices.foreach_set('co', co)
+        me.update()
+        self._mesh_sync_co = co
+        return True
+
+    @profiler.function
     def _clean_selection(self):
-        for bmv,emv in zip(self.bme.verts, self.obj.data.vertices):
-            emv.select = bmv.select
-        for bme,eme in zip(self.bme.edges, self.obj.data.edges):
-            eme.select = bme.select
-        for bmf,emf in zip(self.bme.faces, self.obj.data.polygons):
-            emf.select = bmf.select
+        ''' pushes selection of all elements with foreach_set, if changed since last write '''
+        if self._mesh_sync_selection == self._version_selection: return
+        me = self.obj.data
+        for (bmelems, melems) in ((self.bme.verts, me.vertices), (self.bme.edges, me.edges), (self.bme.faces, me.polygons)):
+            if len(bmelems) != len(melems): continue
+            melems.foreach_set('select', np.fromiter((e.select for e in bmelems), dtype=bool, count=len(bmelems)))
+        self._mesh_sync_selection = self._version_selection
 
     def _clean_mirror(self):
         self.mirror_mod.write()
@@ -1690,6 +2433,7 @@ class RFTarget(RFMesh):
     def has_symmetry(self, axis): return self.mirror_mod.is_enabled_axis(axis)
 
     def apply_mirror_symmetry(self, nearest):
+        self.journal_checkpoint()
         out = []
         def apply_mirror_and_return_geom(axis):
             return mirror(
@@ -1714,20 +2458,28 @@ class RFTarget(RFMesh):
 
     def flip_symmetry_verts_to_correct_side(self):
         for bmv in self.bme.verts:
+            if (self.mirror_mod.x and bmv.co.x < 0) or (self.mirror_mod.y and bmv.co.y > 0) or (self.mirror_mod.z and bmv.co.z < 0):
+                self.journal_bmelem(bmv)
             if self.mirror_mod.x and bmv.co.x < 0:
                 bmv.co.x = -bmv.co.x
                 bmv.normal.x = -bmv.normal.x
+                self.touch_bmelem(bmv)
             if self.mirror_mod.y and bmv.co.y > 0:
                 bmv.co.y = -bmv.co.y
                 bmv.normal.y = -bmv.normal.y
+                self.touch_bmelem(bmv)
             if self.mirror_mod.z and bmv.co.z < 0:
                 bmv.co.z = -bmv.co.z
                 bmv.normal.z = -bmv.normal.z
+                self.touch_bmelem(bmv)
 
     def new_vert(self, co, norm):
         # assuming co and norm are in world space!
         # so, do not set co directly; need to xform to local first.
-        bmv = self.bme.verts.new((0,0,0))
+        with self._tracked_topology():
+            bmv = self.bme.verts.new((0,0,0))
+            self.journal_created([bmv])
+        self.touch_bmelem(bmv)
         rfv = self._wrap_bmvert(bmv)
         rfv.co = co
         rfv.normal = norm
@@ -1737,7 +2489,10 @@ class RFTarget(RFMesh):
         if not all(verts):
             return None
         verts = [self._unwrap(v) for v in verts]
-        bme = self.bme.edges.new(verts)
+        with self._tracked_topology():
+            bme = self.bme.edges.new(verts)
+            self.journal_created([bme])
+        self.touch_bmelem(bme)
         return self._wrap_bmedge(bme)
 
     def new_face(self, verts):
@@ -1755,7 +2510,13 @@ class RFTarget(RFMesh):
         # however, this _could_ reduce vert count < 3
         nverts = deduplicate_list(verts)
         if len(nverts) < 3: return None
-        bmf = self.bme.faces.new(nverts)
+        existing = { bme for bmv in nverts for bme in bmv.link_edges }
+        with self._tracked_topology():
+            # note: creating face also creates any missing edges
+            bmf = self.bme.faces.new(nverts)
+            self.journal_created([bmf, *(bme for bme in bmf.edges if bme not in existing)])
+        self.touch_bmelem(bmf)
+        self.touch(bmf.edges)
         self.update_face_normal(bmf)
         return self._wrap_bmface(bmf)
 
@@ -1784,22 +2545,32 @@ class RFTarget(RFMesh):
             pos = bmv2.co
             norm = bmv2.normal
 
-        # Use bmesh ops to merge the verts
-        pointmerge(
-            self.bme,
-            verts=[bmv1, bmv2],
-            merge_co=pos
-        )
+        # Use bmesh ops to merge the verts.  merging relinks (or rebuilds) the edges and faces
+        # of both verts, so these are journaled as removed, and whatever is linked to the
+        # merged vert afterwards as created
+        self.touch([bmv1, bmv2, *bmv1.link_edges, *bmv2.link_edges, *bmv1.link_faces, *bmv2.link_faces])
+        with self._tracked_topology():
+            self.journal_removed([bmv1, bmv2])
+            pointmerge(
+                self.bme,
+                verts=[bmv1, bmv2],
+                merge_co=pos
+            )
+            self.journal_created([bmv1, *bmv1.link_edges, *bmv1.link_faces])
+        self.touch([bmv1, *bmv1.link_edges, *bmv1.link_faces])
+        # merged elements keep their flags, so they might be selected
+        self.selection_invalidate()
 
-        # Update the normal
+        # Update the normal.  only faces of the merged vert changed
         bmv1.normal = norm
-        self.bme.normal_update()
-        
+        for bmf in bmv1.link_faces: bmf.normal_update()
+
         # Return wrapped vert
         return self._wrap_bmvert(bmv1)
 
     def holes_fill(self, edges, sides):
         edges = list(map(self._unwrap, edges))
+        self.journal_checkpoint()
         ret = holes_fill(self.bme, edges=edges, sides=sides)
         print('RetopoFlow holes_fill', ret)
 
@@ -1809,6 +2580,7 @@ class RFTarget(RFMesh):
         co, norm, _, _ = nearest(Point.average(v.co for v in rfvs))
         if not co or not norm: return None
         bmvs = [self._unwrap(v) for v in rfvs]
+        self.journal_checkpoint()
         pointmerge(self.bme, verts=bmvs)
         rfv = self._wrap_bmvert(bmvs[0])
         rfv.co = co
@@ -1863,39 +2635,63 @@ class RFTarget(RFMesh):
 
 
     def delete_verts(self, verts):
-        for bmv in map(self._unwrap, verts):
-            if bmv.is_valid and not bmv.hide: self.bme.verts.remove(bmv)
+        verts = [ bmv for bmv in map(self._unwrap, verts) if bmv.is_valid and not bmv.hide ]
+        for bmv in verts:
+            # removing vert also removes its linked edges and faces
+            self.touch_bmelem(bmv)
+            self.touch(bmv.link_edges)
+            self.touch(bmv.link_faces)
+        with self._tracked_topology():
+            self.journal_removed(verts)
+            for bmv in verts:
+                if bmv.is_valid: self.bme.verts.remove(bmv)
 
     def delete_edges(self, edges, del_empty_verts=True):
         edges = { self._unwrap(e) for e in edges if e.is_valid and not e.hide }
         verts = { v for e in edges for v in e.verts }
-        for bme in edges: self.bme.edges.remove(bme)
-        if del_empty_verts:
-            for bmv in verts:
-                if len(bmv.link_edges) == 0: self.bme.verts.remove(bmv)
+        self.touch(edges)
+        self.touch(f for e in edges for f in e.link_faces)
+        self.touch(verts)
+        with self._tracked_topology():
+            self.journal_removed(edges)
+            for bme in edges: self.bme.edges.remove(bme)
+            if del_empty_verts:
+                verts = [ bmv for bmv in verts if len(bmv.link_edges) == 0 ]
+                self.journal_removed(verts)
+                for bmv in verts: self.bme.verts.remove(bmv)
 
     def delete_faces(self, faces, del_empty_edges=True, del_empty_verts=True):
         faces = { self._unwrap(f) for f in faces if f.is_valid and not f.hide }
         edges = { e for f in faces for e in f.edges }
         verts = { v for f in faces for v in f.verts }
-        for bmf in faces: self.bme.faces.remove(bmf)
-        if del_empty_edges:
-            for bme in edges:
-                if len(bme.link_faces) == 0: self.bme.edges.remove(bme)
-        if del_empty_verts:
-            for bmv in verts:
-                if len(bmv.link_faces) == 0: self.bme.verts.remove(bmv)
+        self.touch(faces)
+        self.touch(edges)
+        self.touch(verts)
+        with self._tracked_topology():
+            self.journal_removed(faces)
+            for bmf in faces: self.bme.faces.remove(bmf)
+            if del_empty_edges:
+                edges = [ bme for bme in edges if len(bme.link_faces) == 0 ]
+                self.journal_removed(edges)
+                for bme in edges: self.bme.edges.remove(bme)
+            if del_empty_verts:
+                verts = [ bmv for bmv in verts if bmv.is_valid and len(bmv.link_faces) == 0 ]
+                self.journal_removed(verts)
+                for bmv in verts: self.bme.verts.remove(bmv)
 
     def dissolve_verts(self, verts, use_face_split=False, use_boundary_tear=False):
         verts = [ self._unwrap(v) for v in verts if v.is_valid and not v.hide ]
+        self.journal_checkpoint()
         dissolve_verts(self.bme, verts=verts, use_face_split=use_face_split, use_boundary_tear=use_boundary_tear)
 
     def dissolve_edges(self, edges, use_verts=True, use_face_split=False):
         edges = [ self._unwrap(e) for e in edges if e.is_valid and not e.hide ]
+        self.journal_checkpoint()
         dissolve_edges(self.bme, edges=edges, use_verts=use_verts, use_face_split=use_face_split)
 
     def dissolve_faces(self, faces, use_verts=True):
         faces = [ self._unwrap(f) for f in faces if f.is_valid and not f.hide ]
+        self.journal_checkpoint()
         dissolve_faces(self.bme, faces=faces, use_verts=use_verts)
 
     def update_verts_faces(self, verts):
@@ -1904,6 +2700,7 @@ class RFTarget(RFMesh):
             n = compute_normal(v.co for v in bmf.verts)
             vnorm = sum((v.normal for v in bmf.verts), Vector())
             if n.dot(vnorm) < 0:
+                self.journal_flip(bmf)
                 bmf.normal_flip()
             bmf.normal_update()
 
@@ -1912,6 +2709,7 @@ class RFTarget(RFMesh):
         n = compute_normal(v.co for v in bmf.verts)
         vnorm = sum((v.normal for v in bmf.verts), Vector())
         if n.dot(vnorm) < 0:
+            self.journal_flip(bmf)
             bmf.normal_flip()
         bmf.normal_update()
 
@@ -1927,11 +2725,13 @@ class RFTarget(RFMesh):
                 if bme0.other_vert(bmv) == bme1.other_vert(bmv):
                     lbme_dup.append((bme0,bme1))
         mapping = {}
+        if lbme_dup: self.journal_checkpoint()
         for bme0,bme1 in lbme_dup:
             if not bme0.is_valid or not bme1.is_valid: continue
             l0,l1 = len(bme0.link_faces), len(bme1.link_faces)
             bme0.select |= bme1.select
             bme1.select |= bme0.select
+            if bme0.select: self.selection_added([bme0, bme1])
             handled = False
             if l0 == 0:
                 self.bme.edges.remove(bme0)
@@ -1976,25 +2776,22 @@ class RFTarget(RFMesh):
                 if check: break
         return mapping
 
-    def snap_verts_filter(self, nearest, fn_filter):
+    def snap_verts_filter(self, snap_verts, fn_filter):
         '''
-        snap verts when fn_filter returns True
+        snap verts when fn_filter returns True.
+        snap_verts is a batched snapping function (see RetopoFlow_Target.snap_verts)
         '''
-        for rfv in self.iter_verts():
-            if not fn_filter(rfv): continue
-            xyz,norm,_,_ = nearest(rfv.co)
-            rfv.co = xyz
-            rfv.normal = norm
+        snap_verts([rfv for rfv in self.iter_verts() if fn_filter(rfv)])
         self.dirty()
 
-#    def snap_all_verts(self, nearest):
-#        self.snap_verts_filter(nearest, lambda _: True)
+#    def snap_all_verts(self, snap_verts):
+#        self.snap_verts_filter(snap_verts, lambda _: True)
 
-    def snap_all_nonhidden_verts(self, nearest):
-        self.snap_verts_filter(nearest, lambda v: not v.hide)
+    def snap_all_nonhidden_verts(self, snap_verts):
+        self.snap_verts_filter(snap_verts, lambda v: not v.hide)
 
-    def snap_selected_verts(self, nearest):
-        self.snap_verts_filter(nearest, lambda v: v.select)
+    def snap_selected_verts(self, snap_verts):
+        self.snap_verts_filter(snap_verts, lambda v: v.select)
 
 #     def snap_unselected_verts(self, nearest):
 #         self.snap_verts_filter(nearest, lambda v: v.unselect)
@@ -2018,31 +2815,39 @@ class RFTarget(RFMesh):
 
     def remove_all_doubles(self, dist):
         bmv = [v for v in self.bme.verts if not v.hide]
+        self.journal_checkpoint()
         remove_doubles(self.bme, verts=bmv, dist=dist)
         self.dirty()
 
     def remove_selected_doubles(self, dist):
+        self.journal_checkpoint()
         remove_doubles(self.bme, verts=[bmv for bmv in self.bme.verts if bmv.select], dist=dist)
         self.dirty()
 
     def remove_by_distance(self, verts, dist):
+        self.journal_checkpoint()
         remove_doubles(self.bme, verts=[self._unwrap(v) for v in verts], dist=dist)
         self.dirty()
 
     def flip_face_normals(self):
         verts = set()
         for bmf in self.get_selected_faces():
+            self.journal_flip(bmf)
             bmf.normal_flip()
             for bmv in bmf.verts: verts.add(bmv)
+        self.journal_bmelems(verts)
         for bmv in verts:
             if not bmv.is_wire:
                 bmv.normal_update()
+        self.touch(verts)
         self.dirty()
 
     def recalculate_face_normals(self, *, verts=None, faces=None):
         if faces is None: faces = { bmf for bmf in self.bme.faces if bmf.select }
         else:             faces = { self._unwrap(bmf) for bmf in faces }
         if verts:         faces |= { self._unwrap(bmf) for bmv in verts for bmf in bmv.link_faces}
+        self.journal_checkpoint()
         recalc_face_normals(self.bme, faces=list(faces))
         for bmv in (bmv for bmf in faces for bmv in bmf.verts): bmv.normal_update()
+        self.touch(bmv for bmf in faces for bmv in bmf.verts)
         self.dirty()
@@ -0,0 +1,316 @@
+'''
+Copyright (C) 2023 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import os
+import json
+import shutil
+import tempfile
+
+import bpy
+import bmesh
+import numpy as np
+
+from ...addon_common.common.debug import dprint
+from ...addon_common.common.hasher import hash_object_geometry, fingerprint_object, evaluation_count
+from ...addon_common.common.profiler import profiler
+from ...config.options import options
+
+'''
+Packed, read-only geometry of RFSources, and a persistent, content-addressed
+cache of it.
+
+Sources are never edited, so rather than copying the evaluated mesh into a
+BMesh (and triangulating and recomputing every vertex normal), RFSource
+gathers the vertex and loop-triangle arrays of the evaluated mesh with
+foreach_get into RFSourceArrays.  Along with the triangles, RFSourceArrays
+holds the triangle edge adjacency and vertex-to-triangle links, which is all
+that is needed to crawl over the surface.
+
+The packed arrays are stored in a folder next to the .blend file, one
+sub-folder per digest of the evaluated source geometry (see
+hash_object_geometry).  Arrays are stored as .npy files and loaded as
+read-only memory maps.
+
+NOTE: mathutils.BVHTree cannot be serialized.  Instead, the cache stores the
+      triangle arrays in the exact layout BVHTree.FromPolygons expects
+      along with the adjacency arrays (the acceleration structure for
+      crawling), so the BVH is rebuilt entirely in C.
+'''
+
+
+def triangle_adjacency(tris, nverts):
+    '''
+    computes edges of triangle mesh.  edge k of triangle t is (tris[t,k], tris[t,(k+1)%3]).
+    returns (edge_verts, tri_edges, tri_neighbors), where
+    - edge_verts is (E,2) array of vert indices of each unique edge
+    - tri_edges is (T,3) array of edge index of each edge of each triangle
+    - tri_neighbors is (T,3) array of triangle across each edge (-1 if boundary or non-manifold)
+    '''
+    tris = np.asarray(tris, dtype=np.int64).reshape((-1, 3))
+    ntris = len(tris)
+    half = np.stack((tris, np.roll(tris, -1, axis=1)), axis=2).reshape((-1, 2))
+    half.sort(axis=1)
+    keys = half[:, 0] * max(nverts, 1) + half[:, 1]
+    ukeys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    edge_verts = np.stack((ukeys // max(nverts, 1), ukeys % max(nverts, 1)), axis=1)
+    tri_edges = inverse.reshape((ntris, 3))
+
+    # pair up the two halves of each manifold edge
+    neighbors = np.full(ntris * 3, -1, dtype=np.int64)
+    order = np.argsort(inverse, kind='stable')
+    starts = np.zeros(len(ukeys) + 1, dtype=np.int64)
+    np.cumsum(counts, out=starts[1:])
+    manifold = np.flatnonzero(counts == 2)
+    h0, h1 = order[starts[manifold]], order[starts[manifold] + 1]
+    neighbors[h0] = h1 // 3
+    neighbors[h1] = h0 // 3
+    return (edge_verts, tri_edges, neighbors.reshape((ntris, 3)))
+
+def vertex_triangles(tris, nverts):
+    '''
+    returns (offsets, vert_tris), compressed sparse-row layout of triangles linked
+    to each vertex, so triangles of vert v are vert_tris[offsets[v]:offsets[v+1]]
+    '''
+    flat = np.asarray(tris, dtype=np.int64).reshape(-1)
+    order = np.argsort(flat, kind='stable')
+    offsets = np.zeros(nverts + 1, dtype=np.int64)
+    np.cumsum(np.bincount(flat, minlength=nverts), out=offsets[1:])
+    return (offsets, order // 3)
+
+def triangle_normals(co, tris):
+    ''' returns (T,3) array of unit normals of triangles '''
+    a, b, c = co[tris[:, 0]], co[tris[:, 1]], co[tris[:, 2]]
+    n = np.cross(b - a, c - a)
+    l = np.linalg.norm(n, axis=1)
+    n /= np.where(l > 0, l, 1.0)[:, None]
+    return n
+
+
+class RFSourceArrays:
+    '''
+    packed, read-only geometry of a triangulated source mesh.
+    row i of tris is loop triangle i of the evaluated mesh.
+    '''
+
+    names = (
+        'co', 'normal', 'tris', 'tri_normal',
+        'edge_verts', 'tri_edges', 'tri_neighbors',
+        'vert_tri_offsets', 'vert_tris',
+    )
+
+    def __init__(self, *, co, normal, tris, tri_normal, edge_verts, tri_edges, tri_neighbors, vert_tri_offsets, vert_tris):
+        self.co               = co
+        self.normal           = normal
+        self.tris             = tris
+        self.tri_normal       = tri_normal
+        self.edge_verts       = edge_verts
+        self.tri_edges        = tri_edges
+        self.tri_neighbors    = tri_neighbors
+        self.vert_tri_offsets = vert_tri_offsets
+        self.vert_tris        = vert_tris
+
+    @staticmethod
+    @profiler.function
+    def from_triangles(co, normal, tris):
+        co     = np.ascontiguousarray(co, dtype=np.float32).reshape((-1, 3))
+        normal = np.ascontiguousarray(normal, dtype=np.float32).reshape((-1, 3))
+        tris   = np.ascontiguousarray(tris, dtype=np.int32).reshape((-1, 3))
+        edge_verts, tri_edges, tri_neighbors = triangle_adjacency(tris, len(co))
+        vert_tri_offsets, vert_tris = vertex_triangles(tris, len(co))
+        return RFSourceArrays(
+            co=co,
+            normal=normal,
+            tris=tris,
+            tri_normal=triangle_normals(co.astype(np.float64), tris).astype(np.float32),
+            edge_verts=edge_verts.astype(np.int32),
+            tri_edges=tri_edges.astype(np.int32),
+            tri_neighbors=tri_neighbors.astype(np.int32),
+            vert_tri_offsets=vert_tri_offsets,
+            vert_tris=vert_tris.astype(np.int32),
+        )
+
+    @staticmethod
+    @profiler.function
+    def from_mesh(me):
+        ''' gathers packed arrays from (evaluated) mesh using foreach_get '''
+        me.calc_loop_triangles()
+        nv, nt = len(me.vertices), len(me.loop_triangles)
+        co = np.empty(nv * 3, dtype=np.float32)
+        me.vertices.foreach_get('co', co)
+        normal = np.empty(nv * 3, dtype=np.float32)
+        if hasattr(me, 'vertex_normals'):
+            me.vertex_normals.foreach_get('vector', normal)
+        else:
+            me.vertices.foreach_get('normal', normal)
+        tris = np.empty(nt * 3, dtype=np.int32)
+        me.loop_triangles.foreach_get('vertices', tris)
+        return RFSourceArrays.from_triangles(co, normal, tris)
+
+    @profiler.function
+    def to_bmesh(self):
+        ''' creates BMesh with same vert and face order as packed arrays '''
+        me = bpy.data.meshes.new('RetopoFlow packed source')
+        try:
+            me.from_pydata(self.co.tolist(), [], self.tris.tolist())
+            me.update()
+            bme = bmesh.new()
+            bme.from_mesh(me)
+        finally:
+            bpy.data.meshes.remove(me)
+        return bme
+
+    @property
+    def counts(self):
+        return (len(self.co), len(self.edge_verts), len(self.tris))
+
+    def get_vert_tris(self, vert_index):
+        i0, i1 = self.vert_tri_offsets[vert_index:vert_index+2].tolist()
+        return self.vert_tris[i0:i1].tolist()
+
+    def arrays(self):
+        return { name: getattr(self, name) for name in self.names }
+
+
+class RFSourceCache:
+    '''
+    on-disk cache of RFSourceArrays, keyed by geometry digest of source object.
+    cache folder is stored next to the .blend file, so caching is disabled for
+    unsaved files.  every load refreshes the modified time of the entry, and
+    saving deletes least recently used entries beyond 'source cache max size'.
+    '''
+
+    version = 2
+    _keys = {}      # (session_uid, evaluation_count, fingerprint_object(obj, xform=False)) -> key (see get_arrays)
+
+    @staticmethod
+    def get_folder():
+        if not options['source cache']: return None
+        if not bpy.data.filepath: return None
+        return os.path.join(os.path.dirname(bpy.path.abspath(bpy.data.filepath)), options['source cache folder'])
+
+    @staticmethod
+    @profiler.function
+    def get_key(obj, *, mesh=None):
+        '''
+        mesh is the evaluated mesh of obj (if available).  the id of obj and the world
+        transform of obj change across sessions and do not affect the local-space
+        arrays, so they are left out of the key
+        '''
+        return hash_object_geometry(obj, mesh=mesh, extra=(RFSourceCache.version,))
+
+    @staticmethod
+    @profiler.function
+    def load(key):
+        folder = RFSourceCache.get_folder()
+        if not folder or not key: return None
+        path = os.path.join(folder, key)
+        try:
+            with open(os.path.join(path, 'meta.json'), 'rt') as f:
+                meta = json.load(f)
+            if meta.get('version') != RFSourceCache.version: return None
+            os.utime(os.path.join(path, 'meta.json'))   # mark as recently used (see evict)
+            data = {
+                name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                for name in RFSourceArrays.names
+            }
+        except (OSError, ValueError):
+            return None
+        arrays = RFSourceArrays(**data)
+        if list(arrays.counts) != meta.get('counts'): return None
+        return arrays
+
+    @staticmethod
+    @profiler.function
+    def save(key, arrays):
+        folder = RFSourceCache.get_folder()
+        if not folder or not key: return
+        path = os.path.join(folder, key)
+        if os.path.exists(path): return
+        temp = None
+        try:
+            os.makedirs(folder, exist_ok=True)
+            # write to temp folder, then move into place so readers never see a partial entry
+            temp = tempfile.mkdtemp(prefix='.tmp_', dir=folder)
+            for name, data in arrays.arrays().items():
+                np.save(os.path.join(temp, f'{name}.npy'), np.ascontiguousarray(data))
+            with open(os.path.join(temp, 'meta.json'), 'wt') as f:
+                json.dump({'version': RFSourceCache.version, 'counts': list(arrays.counts)}, f)
+            os.replace(temp, path)
+        except OSError as e:
+            dprint(f'RFSourceCache: could not write {path}: {e}')
+            if temp: shutil.rmtree(temp, ignore_errors=True)
+            return
+        RFSourceCache.evict(keep=key)
+
+    @staticmethod
+    @profiler.function
+    def evict(*, keep=None):
+        ''' deletes least recently used entries (except keep) until cache fits in 'source cache max size' '''
+        folder = RFSourceCache.get_folder()
+        if not folder: return
+        entries = []
+        try:
+            for entry in os.scandir(folder):
+                # skips temp folders of saves in progress
+                if not entry.is_dir() or entry.name.startswith('.'): continue
+                files = list(os.scandir(entry.path))
+                size = sum(f.stat().st_size for f in files if f.is_file())
+                used = max((f.stat().st_mtime for f in files if f.name == 'meta.json'), default=0)
+                entries.append((used, size, entry.name))
+        except OSError as e:
+            dprint(f'RFSourceCache: could not read {folder}: {e}')
+            return
+        total, limit = sum(size for (_, size, _) in entries), options['source cache max size'] * 1024 * 1024
+        for (_, size, name) in sorted(entries):
+            if total <= limit: break
+            if name == keep: continue
+            # entries that are memory mapped by a running session might not be deletable (ex: Windows)
+            shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+            total -= size
+
+    @staticmethod
+    @profiler.function
+    def get_arrays(obj):
+        '''
+        returns RFSourceArrays of evaluated obj, loading from (or storing into) cache if possible.
+        evaluated geometry depends on more than obj (ex: modifier targets, armature pose, shape
+        keys, drivers), so key is hashed from evaluated mesh.  keys are remembered for this
+        session by fingerprint and evaluation count of obj, which changes whenever depsgraph
+        re-evaluates obj, so an unchanged source is loaded without evaluating or hashing it
+        '''
+        folder = RFSourceCache.get_folder()
+        memo = (obj.session_uid, evaluation_count(obj), fingerprint_object(obj, xform=False)) if folder else None
+        arrays = RFSourceCache.load(RFSourceCache._keys.get(memo))
+        if arrays is not None: return arrays
+
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        obj_eval = obj.evaluated_get(depsgraph)
+        me = obj_eval.to_mesh()
+        try:
+            key = RFSourceCache.get_key(obj, mesh=me) if folder else None
+            arrays = RFSourceCache.load(key)
+            if arrays is None:
+                arrays = RFSourceArrays.from_mesh(me)
+                RFSourceCache.save(key, arrays)
+        finally:
+            obj_eval.to_mesh_clear()
+        if memo: RFSourceCache._keys[memo] = key
+        return arrays
@@ -23,8 +23,8 @@ import sys
 import math
 import copy
 import json
-import time
 import random
+import numpy as np
 
 from itertools import chain
 from queue import Queue
@@ -42,7 +42,7 @@ from mathutils.geometry import normal as compute_normal, intersect_point_tri
 from ...addon_common.common import gpustate
 from ...addon_common.common import bmesh_render as bmegl
 from ...addon_common.common.blender import tag_redraw_all
-from ...addon_common.common.bmesh_render import triangulateFace, BufferedRender_Batch
+from ...addon_common.common.bmesh_render import BufferedRender_Batch
 from ...addon_common.common.debug import dprint, Debugger
 from ...addon_common.common.decorators import stats_wrapper
 from ...addon_common.common.globals import Globals
@@ -58,11 +58,25 @@ from ...addon_common.common.utils import min_index
 from ...config.options import options
 
 from .rfmesh_wrapper import (
-    BMElemWrapper, RFVert, RFEdge, RFFace, RFEdgeSequence,
+    RFVert, RFEdge, RFFace, RFEdgeSequence,
 )
+from .rfmesh_snapshot import fan_triangles
 
 
 
+class RFMeshRenderChunk:
+    '''
+    a chunk of elements of the same type (verts, edges, or faces) that are buffered
+    and drawn together.  a chunk is only regathered when it is marked dirty.
+    '''
+
+    def __init__(self, draw_type):
+        self.draw_type = draw_type
+        self.elems = []
+        self.buffered_render = None
+        self.dirty = True
+
+
 class RFMeshRender():
     '''
     RFMeshRender handles rendering RFMeshes.
@@ -123,9 +137,8 @@ class RFMeshRender():
         self.buf_matrix_inverse = rfmesh.xform.to_gpubuffer_Inverse()
         self.buf_matrix_normal  = rfmesh.xform.to_gpubuffer_Normal()
         self.buffered_renders_static  = []
-        self.buffered_renders_dynamic = []
-        self.split   = None
         self.drawing = Globals.drawing
+        self._reset_chunks()
 
         self.opts = {}
         self.replace_rfmesh(rfmesh)
@@ -134,12 +147,13 @@ class RFMeshRender():
     def __del__(self):
         RFMeshRender.delete_count += 1
         # print('RFMeshRender.__del__', self.rfmesh, RFMeshRender.create_count, RFMeshRender.delete_count)
-        self.bmesh.free()
+        if self.bmesh: self.bmesh.free()
         if hasattr(self, 'buf_matrix_model'):         del self.buf_matrix_model
         if hasattr(self, 'buf_matrix_inverse'):       del self.buf_matrix_inverse
         if hasattr(self, 'buf_matrix_normal'):        del self.buf_matrix_normal
         if hasattr(self, 'buffered_renders_static'):  del self.buffered_renders_static
-        if hasattr(self, 'buffered_renders_dynamic'): del self.buffered_renders_dynamic
+        if hasattr(self, 'chunks'):                   del self.chunks
+        if hasattr(self, 'elem_chunk'):               del self.elem_chunk
         if hasattr(self, 'bmesh'):                    del self.bmesh
         if hasattr(self, 'rfmesh'):                   del self.rfmesh
 
@@ -154,219 +168,301 @@ class RFMeshRender():
     @profiler.function
     def replace_rfmesh(self, rfmesh):
         self.rfmesh = rfmesh
-        self.bmesh  = rfmesh.bme
+        # packed (cached) sources are drawn straight from their arrays, without a BMesh
+        self.packed = getattr(rfmesh, 'packed', None)
+        self.bmesh  = rfmesh.bme if self.packed is None else None
         self.rfmesh_version = None
+        self._reset_chunks()
 
     def dirty(self):
         self.rfmesh_version = None
+        self.chunks_counter = None      # force regathering all chunks
 
     @profiler.function
     def add_buffered_render(self, draw_type, data, static):
         batch = BufferedRender_Batch(draw_type)
         batch.buffer(data['vco'], data['vno'], data['sel'], data['warn'], data['pin'], data['seam'])
         if static: self.buffered_renders_static.append(batch)
-        else:      self.buffered_renders_dynamic.append(batch)
 
-    def split_visualization(self, verts=None, edges=None, faces=None):
-        if not verts and not edges and not faces:
-            self.split = None
-        else:
-            unwrap = BMElemWrapper._unwrap
-            verts = { unwrap(v) for v in verts } if verts else set()
-            edges = { unwrap(e) for e in edges } if edges else set()
-            faces = { unwrap(f) for f in faces } if faces else set()
-            edges.update(e for v in verts for e in v.link_edges)
-            faces.update(f for e in edges for f in e.link_faces)
-            verts.update(v for e in edges for v in e.verts)
-            verts.update(v for f in faces for v in f.verts)
-            edges.update(e for f in faces for e in f.edges)
-            self.split = {
-                'gathered static': False,
-                'static verts': { v for v in self.bmesh.verts if v not in verts },
-                'static edges': { e for e in self.bmesh.edges if e not in edges },
-                'static faces': { f for f in self.bmesh.faces if f not in faces },
-                'gathered dynamic': False,
-                'dynamic verts': verts,
-                'dynamic edges': edges,
-                'dynamic faces': faces,
+    def iter_buffered_renders(self):
+        yield from self.buffered_renders_static
+        for chunks in self.chunks.values():
+            for chunk in chunks:
+                if chunk.buffered_render: yield chunk.buffered_render
+
+
+    ##########################################################
+    # chunks
+
+    def _reset_chunks(self):
+        self.chunks = {
+            BufferedRender_Batch.TRIANGLES: [],
+            BufferedRender_Batch.LINES:     [],
+            BufferedRender_Batch.POINTS:    [],
+        }
+        self.elem_chunk = {}            # bmelem => chunk containing bmelem
+        self.chunks_counter = None      # dirty counter of rfmesh when chunks were last gathered
+
+    def _add_to_chunks(self, draw_type, elems):
+        size = max(1, options['render chunk size'])
+        chunks = self.chunks[draw_type]
+        elem_chunk = self.elem_chunk
+        for elem in elems:
+            if not chunks or len(chunks[-1].elems) >= size:
+                chunks.append(RFMeshRenderChunk(draw_type))
+            chunk = chunks[-1]
+            chunk.elems.append(elem)
+            chunk.dirty = True
+            elem_chunk[elem] = chunk
+
+    def _rebuild_chunks(self):
+        self._reset_chunks()
+        if self.load_faces: self._add_to_chunks(BufferedRender_Batch.TRIANGLES, self.bmesh.faces)
+        if self.load_edges: self._add_to_chunks(BufferedRender_Batch.LINES,     self.bmesh.edges)
+        if self.load_verts: self._add_to_chunks(BufferedRender_Batch.POINTS,    self.bmesh.verts)
+
+    @profiler.function
+    def _dirty_chunks(self, touched):
+        '''
+        marks chunks that contain touched bmelems (or bmelems whose drawn data depends on
+        touched bmelems) as dirty, and adds new bmelems to chunks.
+        returns verts whose normals need updating
+        '''
+        elem_chunk = self.elem_chunk
+        verts, edges, faces = set(), set(), set()
+        for bmelem in touched:
+            if not bmelem.is_valid:
+                # deleted; chunk drops it when regathered
+                chunk = elem_chunk.get(bmelem)
+                if chunk: chunk.dirty = True
+                continue
+            match bmelem:
+                case BMVert(): verts.add(bmelem)
+                case BMEdge(): edges.add(bmelem)
+                case BMFace(): faces.add(bmelem)
+        # drawn data (position, normal, warning, pinned, seam) of edges and faces
+        # depends on their verts, and that of verts depends on their linked edges and faces
+        verts.update(bmv for bme in edges for bmv in bme.verts)
+        verts.update(bmv for bmf in faces for bmv in bmf.verts)
+        edges.update(bme for bmv in verts for bme in bmv.link_edges)
+        faces.update(bmf for bmv in verts for bmf in bmv.link_faces)
+
+        for draw_type, elems, load in [
+            (BufferedRender_Batch.TRIANGLES, faces, self.load_faces),
+            (BufferedRender_Batch.LINES,     edges, self.load_edges),
+            (BufferedRender_Batch.POINTS,    verts, self.load_verts),
+        ]:
+            if not load: continue
+            new_elems = []
+            for elem in elems:
+                chunk = elem_chunk.get(elem)
+                if chunk: chunk.dirty = True
+                else:     new_elems.append(elem)
+            self._add_to_chunks(draw_type, new_elems)
+
+        return { bmv for bmf in faces for bmv in bmf.verts }
+
+    def _get_touched(self):
+        '''
+        returns (touched, selected) since chunks were last gathered, where selected also
+        includes bmelems whose selection changed.  touched is None if all chunks must be rebuilt
+        '''
+        if self.chunks_counter is None or self.always_dirty: return (None, None)
+        if not hasattr(self.rfmesh, 'get_touched_since'): return (None, None)
+        touched = self.rfmesh.get_touched_since(self.chunks_counter)
+        if touched is None: return (None, None)
+        selected = self.rfmesh.get_touched_since(self.chunks_counter, selection=True)
+        return (touched, selected)
+
+    def _set_chunk_data(self, chunk, data):
+        if not data or not len(data['vco']):
+            chunk.buffered_render = None
+            return
+        batch = BufferedRender_Batch(chunk.draw_type)
+        batch.buffer(data['vco'], data['vno'], data['sel'], data['warn'], data['pin'], data['seam'])
+        chunk.buffered_render = batch
+
+
+    ##########################################################
+    # gathering
+
+    @profiler.function
+    def _gather_packed_data(self):
+        ''' packed sources are triangles only, with no selection, warning, pinned, or seam state '''
+        self.buffered_renders_static = []
+        if not self.load_faces: return
+        face_count = 10_000
+        co, no, tris = self.packed.co, self.packed.normal, self.packed.tris
+        for i0 in range(0, len(tris), face_count):
+            idx = np.asarray(tris[i0:i0+face_count]).reshape(-1)
+            zeros = np.zeros(len(idx), dtype=np.float32)
+            face_data = {
+                'vco':  np.ascontiguousarray(co[idx], dtype=np.float32),
+                'vno':  np.ascontiguousarray(no[idx], dtype=np.float32),
+                'sel':  zeros,
+                'warn': zeros,
+                'pin':  zeros,
+                'seam': zeros,
+                'idx':  None,
             }
-        self.dirty()
+            self.add_buffered_render(BufferedRender_Batch.TRIANGLES, face_data, True)
+        self._is_loading = False
+        self._is_loaded = True
+
+    def _gather_chunk(self, chunk):
+        '''
+        returns data of chunk, dropping deleted bmelems from chunk
+        IMPORTANT NOTE: DO NOT USE PROFILER INSIDE THIS FUNCTION IF LOADING ASYNCHRONOUSLY!
+        '''
+        elems = [elem for elem in chunk.elems if elem.is_valid]
+        if len(elems) != len(chunk.elems):
+            alive = set(elems)
+            for elem in chunk.elems:
+                if elem not in alive: self.elem_chunk.pop(elem, None)
+            chunk.elems = elems
+        elems = [elem for elem in elems if not elem.hide]
+        match chunk.draw_type:
+            case BufferedRender_Batch.TRIANGLES: return self._gather_faces(elems)
+            case BufferedRender_Batch.LINES:     return self._gather_edges(elems)
+            case BufferedRender_Batch.POINTS:    return self._gather_verts(elems)
+
+    def _gather_settings(self):
+        mirror_axes = self.rfmesh.mirror_mod.xyz if self.rfmesh.mirror_mod else []
+        self._mirror_x = 'x' in mirror_axes
+        self._mirror_y = 'y' in mirror_axes
+        self._mirror_z = 'z' in mirror_axes
+        self._layer_pin = self.rfmesh.layer_pin
+
+    @staticmethod
+    def _fromiter_co(bmvs):
+        return np.fromiter(chain.from_iterable(bmv.co for bmv in bmvs), dtype=np.float32, count=len(bmvs)*3).reshape((-1, 3))
+
+    @staticmethod
+    def _fromiter_normal(bmvs):
+        return np.fromiter(chain.from_iterable(bmv.normal for bmv in bmvs), dtype=np.float32, count=len(bmvs)*3).reshape((-1, 3))
+
+    @staticmethod
+    def _fromiter_bool(it, count):
+        return np.fromiter(it, dtype=bool, count=count)
+
+    def _pinned(self, bmvs):
+        layer_pin = self._layer_pin
+        if not layer_pin: return np.zeros(len(bmvs), dtype=bool)
+        return self._fromiter_bool((bool(bmv[layer_pin]) for bmv in bmvs), len(bmvs))
+
+    def _mirrored(self, co, per=1):
+        # True where all `per` consecutive points lie on the mirrored side of (or on) the same mirror plane
+        m = np.zeros(len(co) // per, dtype=bool)
+        if self._mirror_x: m |= (co[:, 0] <=  0.0001).reshape((-1, per)).all(axis=1)
+        if self._mirror_y: m |= (co[:, 1] >= -0.0001).reshape((-1, per)).all(axis=1)
+        if self._mirror_z: m |= (co[:, 2] <=  0.0001).reshape((-1, per)).all(axis=1)
+        return m
+
+    # NOTE: duplicating data rather than using indexing, otherwise
+    # selection will bleed
+
+    def _gather_faces(self, faces):
+        corners = [bmv for bmf in faces for bmv in bmf.verts]
+        face_lens = np.fromiter((len(bmf.verts) for bmf in faces), dtype=np.int64, count=len(faces))
+        offsets = np.zeros(len(faces) + 1, dtype=np.int64)
+        np.cumsum(face_lens, out=offsets[1:])
+        tri_face, tri_corners = fan_triangles(offsets)
+        tri_corners = tri_corners.reshape(-1)
+        tri_face3 = np.repeat(tri_face, 3)
+        face_sel = self._fromiter_bool((bmf.select for bmf in faces), len(faces))
+        corner_pin = self._pinned(corners)
+        # face is pinned if all of its verts are pinned
+        face_pin = np.add.reduceat(corner_pin.astype(np.int64), offsets[:-1]) == face_lens if len(faces) else np.zeros(0, dtype=bool)
+        return {
+            'vco':  self._fromiter_co(corners)[tri_corners],
+            'vno':  self._fromiter_normal(corners)[tri_corners],
+            'sel':  face_sel[tri_face3].astype(np.float32),
+            'warn': np.ones(len(tri_corners), dtype=np.float32),
+            'pin':  face_pin[tri_face3].astype(np.float32),
+            'seam': np.zeros(len(tri_corners), dtype=np.float32),
+            'idx':  None,
+        }
+
+    def _gather_edges(self, edges):
+        ne = len(edges)
+        ends = [bmv for bme in edges for bmv in bme.verts]
+        co = self._fromiter_co(ends)
+        edge_mirrored = self._mirrored(co, per=2)
+        edge_manifold = self._fromiter_bool((bme.is_manifold for bme in edges), ne)
+        edge_pin = self._pinned(ends).reshape((-1, 2)).all(axis=1)
+        edge_sel = self._fromiter_bool((bme.select for bme in edges), ne)
+        edge_seam = self._fromiter_bool((bme.seam for bme in edges), ne)
+        return {
+            'vco':  co,
+            'vno':  self._fromiter_normal(ends),
+            'sel':  np.repeat(edge_sel, 2).astype(np.float32),
+            'warn': np.repeat(~edge_mirrored & ~edge_manifold, 2).astype(np.float32),
+            'pin':  np.repeat(edge_pin, 2).astype(np.float32),
+            'seam': np.repeat(edge_seam, 2).astype(np.float32),
+            'idx':  None,
+        }
+
+    def _gather_verts(self, verts):
+        nv = len(verts)
+        co = self._fromiter_co(verts)
+        vert_interior = self._fromiter_bool((bmv.is_manifold and not bmv.is_boundary for bmv in verts), nv)
+        return {
+            'vco':  co,
+            'vno':  self._fromiter_normal(verts),
+            'sel':  self._fromiter_bool((bmv.select for bmv in verts), nv).astype(np.float32),
+            'warn': (~self._mirrored(co) & ~vert_interior).astype(np.float32),
+            'pin':  self._pinned(verts).astype(np.float32),
+            'seam': self._fromiter_bool((any(bme.seam for bme in bmv.link_edges) for bmv in verts), nv).astype(np.float32),
+            'idx':  None,
+        }
 
     @profiler.function
     def _gather_data(self):
-        if not self.split:
-            self.buffered_renders_static = []
-            self.buffered_renders_dynamic = []
-        else:
-            if not self.split['gathered dynamic']:
-                self.buffered_renders_static = []
-                self.split['gathered dynamic'] = True
-            self.buffered_renders_dynamic = []
+        if self.packed is not None:
+            self._gather_packed_data()
+            return
 
-        mirror_axes = self.rfmesh.mirror_mod.xyz if self.rfmesh.mirror_mod else []
-        mirror_x = 'x' in mirror_axes
-        mirror_y = 'y' in mirror_axes
-        mirror_z = 'z' in mirror_axes
-
-        layer_pin = self.rfmesh.layer_pin
-
-        def gather(verts, edges, faces, static):
-            vert_count = 100_000
-            edge_count = 50_000
-            face_count = 10_000
-
-            '''
-            IMPORTANT NOTE: DO NOT USE PROFILER INSIDE THIS FUNCTION IF LOADING ASYNCHRONOUSLY!
-            '''
-            def sel(g):
-                return 1.0 if g.select else 0.0
-            def warn_vert(g):
-                if mirror_x and g.co.x <=  0.0001: return 0.0
-                if mirror_y and g.co.y >= -0.0001: return 0.0
-                if mirror_z and g.co.z <=  0.0001: return 0.0
-                return 0.0 if g.is_manifold and not g.is_boundary else 1.0
-            def warn_edge(g):
-                v0,v1 = g.verts
-                if mirror_x and v0.co.x <=  0.0001 and v1.co.x <=  0.0001: return 0.0
-                if mirror_y and v0.co.y >= -0.0001 and v1.co.y >= -0.0001: return 0.0
-                if mirror_z and v0.co.z <=  0.0001 and v1.co.z <=  0.0001: return 0.0
-                return 0.0 if g.is_manifold else 1.0
-            def warn_face(g):
-                return 1.0
-
-            def pin_vert(g):
-                if not layer_pin: return 0.0
-                return 1.0 if g[layer_pin] else 0.0
-            def pin_edge(g):
-                return 1.0 if all(pin_vert(v) for v in g.verts) else 0.0
-            def pin_face(g):
-                return 1.0 if all(pin_vert(v) for v in g.verts) else 0.0
-
-            def seam_vert(g):
-                return 1.0 if any(e.seam for e in g.link_edges) else 0.0
-            def seam_edge(g):
-                return 1.0 if g.seam else 0.0
-            def seam_face(g):
-                return 0.0
-
-            try:
-                time_start = time.time()
-
-                # NOTE: duplicating data rather than using indexing, otherwise
-                # selection will bleed
-                with profiler.code('gathering', enabled=not self.async_load):
-                    if self.load_faces:
-                        tri_faces = [(bmf, list(bmvs))
-                                     for bmf in faces
-                                     if bmf.is_valid and not bmf.hide
-                                     for bmvs in triangulateFace(bmf.verts)
-                                     ]
-                        l = len(tri_faces)
-                        for i0 in range(0, l, face_count):
-                            i1 = min(l, i0 + face_count)
-                            face_data = {
-                                'vco':  [ tuple(bmv.co)     for bmf, verts in tri_faces[i0:i1] for bmv in verts ],
-                                'vno':  [ tuple(bmv.normal) for bmf, verts in tri_faces[i0:i1] for bmv in verts ],
-                                'sel':  [ sel(bmf)          for bmf, verts in tri_faces[i0:i1] for _   in verts ],
-                                'warn': [ warn_face(bmf)    for bmf, verts in tri_faces[i0:i1] for _   in verts ],
-                                'pin':  [ pin_face(bmf)     for bmf, verts in tri_faces[i0:i1] for _   in verts ],
-                                'seam': [ seam_face(bmf)    for bmf, verts in tri_faces[i0:i1] for _   in verts ],
-                                'idx': None,  # list(range(len(tri_faces)*3)),
-                            }
-                            if self.async_load:
-                                self.buf_data_queue.put((BufferedRender_Batch.TRIANGLES, face_data, static))
-                                tag_redraw_all('buffer update')
-                            else:
-                                self.add_buffered_render(BufferedRender_Batch.TRIANGLES, face_data, static)
-
-                    if self.load_edges:
-                        edges = [bme for bme in edges if bme.is_valid and not bme.hide]
-                        l = len(edges)
-                        for i0 in range(0, l, edge_count):
-                            i1 = min(l, i0 + edge_count)
-                            edge_data = {
-                                'vco':  [ tuple(bmv.co)     for bme in edges[i0:i1] for bmv in bme.verts ],
-                                'vno':  [ tuple(bmv.normal) for bme in edges[i0:i1] for bmv in bme.verts ],
-                                'sel':  [ sel(bme)          for bme in edges[i0:i1] for _   in bme.verts ],
-                                'warn': [ warn_edge(bme)    for bme in edges[i0:i1] for _   in bme.verts ],
-                                'pin':  [ pin_edge(bme)     for bme in edges[i0:i1] for _   in bme.verts ],
-                                'seam': [ seam_edge(bme)    for bme in edges[i0:i1] for _   in bme.verts ],
-                                'idx': None,  # list(range(len(self.bmesh.edges)*2)),
-                            }
-                            if self.async_load:
-                                self.buf_data_queue.put((BufferedRender_Batch.LINES, edge_data, static))
-                                tag_redraw_all('buffer update')
-                            else:
-                                self.add_buffered_render(BufferedRender_Batch.LINES, edge_data, static)
-
-                    if self.load_verts:
-                        verts = [bmv for bmv in verts if bmv.is_valid and not bmv.hide]
-                        l = len(verts)
-                        for i0 in range(0, l, vert_count):
-                            i1 = min(l, i0 + vert_count)
-                            vert_data = {
-                                'vco':  [ tuple(bmv.co)     for bmv in verts[i0:i1] ],
-                                'vno':  [ tuple(bmv.normal) for bmv in verts[i0:i1] ],
-                                'sel':  [ sel(bmv)          for bmv in verts[i0:i1] ],
-                                'warn': [ warn_vert(bmv)    for bmv in verts[i0:i1] ],
-                                'pin':  [ pin_vert(bmv)     for bmv in verts[i0:i1] ],
-                                'seam': [ seam_vert(bmv)    for bmv in verts[i0:i1] ],
-                                'idx':  None,  # list(range(len(self.bmesh.verts))),
-                            }
-                            if self.async_load:
-                                self.buf_data_queue.put((BufferedRender_Batch.POINTS, vert_data, static))
-                                tag_redraw_all('buffer update')
-                            else:
-                                self.add_buffered_render(BufferedRender_Batch.POINTS, vert_data, static)
-
-                    if self.async_load:
-                        self.buf_data_queue.put('done')
-
-                time_end = time.time()
-                # print('RFMeshRender: Gather time: %0.2f' % (time_end - time_start))
-
-            except Exception as e:
-                print('EXCEPTION WHILE GATHERING: ' + str(e))
-                raise e
-
-        # self.bmesh.verts.ensure_lookup_table()
-        for bmv in self.bmesh.verts:
-            if bmv.link_faces:
+        self._gather_settings()
+
+        touched, selected = self._get_touched()
+        if touched is None:
+            self._rebuild_chunks()
+            normal_verts = self.bmesh.verts
+        else:
+            normal_verts = self._dirty_chunks(touched)
+            # drawn selection of bmelem depends only on bmelem itself
+            elem_chunk = self.elem_chunk
+            for bmelem in selected:
+                chunk = elem_chunk.get(bmelem)
+                if chunk: chunk.dirty = True
+        if hasattr(self.rfmesh, 'get_dirty_counter'):
+            self.chunks_counter = self.rfmesh.get_dirty_counter()
+
+        for bmv in normal_verts:
+            if bmv.is_valid and bmv.link_faces:
                 bmv.normal_update()
-        # for bmelem in chain(self.bmesh.faces, self.bmesh.edges):
-        #     bmelem.normal_update()
+
+        dirty_chunks = [chunk for chunks in self.chunks.values() for chunk in chunks if chunk.dirty]
+        for chunk in dirty_chunks: chunk.dirty = False
 
         self._is_loading = True
         self._is_loaded = False
 
-        # with profiler.code('Gathering data for RFMesh (%ssync)' % ('a' if self.async_load else '')):
         if not self.async_load:
-            #print(f'RFMeshRender._gather: synchronous')
-            #profiler.function(gather)()
-            if not self.split:
-                #print(f'  v={len(self.bmesh.verts)} e={len(self.bmesh.edges)} f={len(self.bmesh.faces)}')
-                gather(self.bmesh.verts, self.bmesh.edges, self.bmesh.faces, True)
-            else:
-                if not self.split['gathered static']:
-                    #print(f'  sv={len(self.split["static verts"])} se={len(self.split["static edges"])} sf={len(self.split["static faces"])}')
-                    gather(self.split['static verts'],  self.split['static edges'],  self.split['static faces'],  True)
-                    self.split['gathered static'] = True
-                #print(f'  dv={len(self.split["dynamic verts"])} de={len(self.split["dynamic edges"])} df={len(self.split["dynamic faces"])}')
-                gather(self.split['dynamic verts'], self.split['dynamic edges'], self.split['dynamic faces'], False)
+            with profiler.code('gathering'):
+                for chunk in dirty_chunks:
+                    self._set_chunk_data(chunk, self._gather_chunk(chunk))
         else:
-            #print(f'RFMeshRender._gather: asynchronous')
-            #self._gather_submit = ThreadPoolExecutor.submit(gather)
-            e = ThreadPoolExecutor()
-            if not self.split:
-                #print(f'  v={len(self.bmesh.verts)} e={len(self.bmesh.edges)} f={len(self.bmesh.faces)}')
-                e.submit(lambda : gather(self.bmesh.verts, self.bmesh.edges, self.bmesh.faces, True))
-            else:
-                if not self.split['gathered static']:
-                    #print(f'  sv={len(self.split["static verts"])} se={len(self.split["static edges"])} sf={len(self.split["static faces"])}')
-                    e.submit(lambda : gather(self.split['static verts'],  self.split['static edges'],  self.split['static faces'],  True))
-                    self.split['gathered static'] = True
-                #print(f'  dv={len(self.split["dynamic verts"])} de={len(self.split["dynamic edges"])} df={len(self.split["dynamic faces"])}')
-                e.submit(lambda : gather(self.split['dynamic verts'], self.split['dynamic edges'], self.split['dynamic faces'], False))
+            def gather():
+                try:
+                    for chunk in dirty_chunks:
+                        self.buf_data_queue.put((chunk, self._gather_chunk(chunk)))
+                        tag_redraw_all('buffer update')
+                    self.buf_data_queue.put('done')
+                except Exception as e:
+                    print('EXCEPTION WHILE GATHERING: ' + str(e))
+                    raise e
+            ThreadPoolExecutor().submit(gather)
 
     @profiler.function
     def clean(self):
@@ -379,7 +475,7 @@ class RFMeshRender():
                 self._is_loaded = True
                 self.async_load = False
             else:
-                self.add_buffered_render(*data)
+                self._set_chunk_data(*data)
 
         try:
             # return if rfmesh hasn't changed
@@ -417,7 +513,8 @@ class RFMeshRender():
         symmetry_effect=0.0, symmetry_frame: Frame=None
     ):
         self.clean()
-        if not self.buffered_renders_static and not self.buffered_renders_dynamic: return
+        buffered_renders = list(self.iter_buffered_renders())
+        if not buffered_renders: return
 
         try:
             gpustate.depth_test('LESS_EQUAL')
@@ -464,7 +561,7 @@ class RFMeshRender():
                 opts['line mirror hidden']  = 1 - alpha_below
                 opts['point hidden']        = 1 - alpha_below
                 opts['point mirror hidden'] = 1 - alpha_below
-                for buffered_render in chain(self.buffered_renders_static, self.buffered_renders_dynamic):
+                for buffered_render in buffered_renders:
                     buffered_render.draw(opts)
 
             # geometry above
@@ -476,7 +573,7 @@ class RFMeshRender():
             opts['line mirror hidden']  = 1 - alpha_above
             opts['point hidden']        = 1 - alpha_above
             opts['point mirror hidden'] = 1 - alpha_above
-            for buffered_render in chain(self.buffered_renders_static, self.buffered_renders_dynamic):
+            for buffered_render in buffered_renders:
                 buffered_render.draw(opts)
 
             gpustate.depth_test('LESS_EQUAL')
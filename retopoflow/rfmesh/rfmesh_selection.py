@@ -0,0 +1,105 @@
+'''
+Copyright (C) 2023 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from bmesh.types import BMVert, BMEdge, BMFace
+
+
+'''
+RFMeshSelection indexes the selected BMesh elements of an RFMesh, so that
+selection queries (selected set, count, bbox) take time proportional to the
+size of the selection rather than to the size of the mesh.
+
+The index is a superset: every selected element is in the index, but an
+element in the index might have since been deselected or removed.  These
+stale elements are pruned whenever the index is queried.  So, deselecting
+never needs to update the index, but anything that might select an element
+must either add() it, or invalidate() the index when it cannot know which
+elements became selected (ex: bmesh.ops).  An invalidated index is rebuilt
+with a full scan on next query.
+
+NOTE: selecting a BMFace (BMEdge) also selects its BMEdges and BMVerts
+      (BMVerts), so add() also adds these.
+'''
+
+
+class RFMeshSelection:
+    '''
+    bme is passed to each query (rather than stored) so that the index does
+    not keep the BMesh alive
+    '''
+
+    def __init__(self):
+        self._sets = None
+
+    @property
+    def is_valid(self):
+        return self._sets is not None
+
+    def invalidate(self):
+        self._sets = None
+
+    def clear(self):
+        ''' call after deselecting all elements '''
+        self._sets = (set(), set(), set())
+
+    def fill(self, bme):
+        ''' call after selecting all elements '''
+        self._sets = (set(bme.verts), set(bme.edges), set(bme.faces))
+
+    def add(self, bmelem):
+        if self._sets is None: return
+        verts, edges, faces = self._sets
+        t = type(bmelem)
+        if t is BMVert:
+            verts.add(bmelem)
+        elif t is BMEdge:
+            edges.add(bmelem)
+            verts.update(bmelem.verts)
+        elif t is BMFace:
+            faces.add(bmelem)
+            edges.update(bmelem.edges)
+            verts.update(bmelem.verts)
+
+    def add_all(self, bmelems):
+        if self._sets is None: return
+        for bmelem in bmelems: self.add(bmelem)
+
+    def _get_sets(self, bme):
+        if self._sets is None:
+            self._sets = tuple(
+                { bmelem for bmelem in seq if bmelem.select }
+                for seq in (bme.verts, bme.edges, bme.faces)
+            )
+        return self._sets
+
+    def _get(self, bme, i, hidden):
+        s = self._get_sets(bme)[i]
+        stale = [ bmelem for bmelem in s if not bmelem.is_valid or not bmelem.select ]
+        s.difference_update(stale)
+        return set(s) if hidden else { bmelem for bmelem in s if not bmelem.hide }
+
+    def get_verts(self, bme, *, hidden=False): return self._get(bme, 0, hidden)
+    def get_edges(self, bme, *, hidden=False): return self._get(bme, 1, hidden)
+    def get_faces(self, bme, *, hidden=False): return self._get(bme, 2, hidden)
+
+    def iter_all(self, bme):
+        ''' yields all indexed elements (including stale), ex: to deselect all '''
+        for s in self._get_sets(bme): yield from s
@@ -0,0 +1,266 @@
+'''
+Copyright (C) 2023 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from itertools import chain
+
+import numpy as np
+from bmesh.types import BMVert, BMEdge, BMFace
+
+from ...addon_common.common.profiler import profiler
+
+
+'''
+RFMeshSnapshot packs the geometry of a BMesh into NumPy arrays so that
+hot-path queries (nearest vert/edge, etc.) can run as batched array
+operations rather than looping over BMesh elements in Python.
+
+The snapshot is only a copy!  It does not track changes to the BMesh,
+so RFMesh.get_snapshot() rebuilds it whenever the mesh version changes,
+and RFTarget.get_snapshot() patches rows of elements touched since then.
+
+NOTE: building a snapshot updates the index of every BMVert, BMEdge,
+      and BMFace (row i of each array corresponds to element index i)
+'''
+
+
+def gather_co(bmverts, count=None):
+    ''' returns (N,3) array of local coordinates of bmverts '''
+    if count is None:
+        bmverts = list(bmverts)
+        count = len(bmverts)
+    return np.fromiter(
+        chain.from_iterable(bmv.co for bmv in bmverts),
+        dtype=np.float64, count=count*3,
+    ).reshape((count, 3))
+
+def gather_normal(bmverts, count=None):
+    ''' returns (N,3) array of local normals of bmverts '''
+    if count is None:
+        bmverts = list(bmverts)
+        count = len(bmverts)
+    return np.fromiter(
+        chain.from_iterable(bmv.normal for bmv in bmverts),
+        dtype=np.float64, count=count*3,
+    ).reshape((count, 3))
+
+def xform_points(mx, co):
+    ''' transforms (N,3) array of points by 4x4 matrix mx (homogeneous divide included) '''
+    mx = np.asarray(mx, dtype=np.float64)
+    co = np.asarray(co, dtype=np.float64).reshape((-1, 3))
+    p = co @ mx[:3, :3].T + mx[:3, 3]
+    w = co @ mx[3, :3] + mx[3, 3]
+    if not np.all(w == 1.0): p /= w[:, None]
+    return p
+
+def xform_normals(mx3, no):
+    ''' transforms (N,3) array of normals by 3x3 normal matrix mx3, then normalizes '''
+    mx3 = np.asarray(mx3, dtype=np.float64)[:3, :3]
+    n = np.asarray(no, dtype=np.float64).reshape((-1, 3)) @ mx3.T
+    l = np.linalg.norm(n, axis=1)
+    n /= np.where(l > 0, l, 1.0)[:, None]
+    return n
+
+def distances_to_point(co, point):
+    ''' returns distance from each row of co to point '''
+    return np.linalg.norm(co - np.asarray(point, dtype=np.float64), axis=1)
+
+def closest_on_segments(p0, p1, point, *, t_min=0.0, t_max=1.0):
+    '''
+    for each segment (p0[i], p1[i]), find the point closest to point with
+    parameter t clamped to [t_min, t_max].  degenerate segments return p0.
+    works for 2D or 3D arrays.
+    returns (closest points, distances)
+    '''
+    point = np.asarray(point, dtype=np.float64)
+    d = p1 - p0
+    l2 = np.einsum('ij,ij->i', d, d)
+    nonzero = l2 > 0
+    t = np.einsum('ij,ij->i', point - p0, d) / np.where(nonzero, l2, 1.0)
+    t = np.where(nonzero, np.clip(t, t_min, t_max), 0.0)
+    pp = p0 + d * t[:, None]
+    return pp, np.linalg.norm(point - pp, axis=1)
+
+def points_in_triangles2D(point, a, b, c):
+    '''
+    tests if point lies inside (or on boundary of) each 2D triangle (a[i], b[i], c[i]).
+    a, b, c can have any leading shape.  degenerate triangles never contain point.
+    '''
+    point = np.asarray(point, dtype=np.float64)
+    def cross(u, v): return u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]
+    d0 = cross(b - a, point - a)
+    d1 = cross(c - b, point - b)
+    d2 = cross(a - c, point - c)
+    has_neg = (d0 < 0) | (d1 < 0) | (d2 < 0)
+    has_pos = (d0 > 0) | (d1 > 0) | (d2 > 0)
+    return ~(has_neg & has_pos) & (cross(b - a, c - a) != 0)
+
+def csr_gather(offsets, values, rows):
+    '''
+    gathers the given rows from compressed sparse-row data (offsets, values).
+    returns (new_offsets, new_values)
+    '''
+    starts = offsets[rows]
+    lens = offsets[rows + 1] - starts
+    new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lens, out=new_offsets[1:])
+    idx = np.repeat(starts - new_offsets[:-1], lens) + np.arange(new_offsets[-1])
+    return (new_offsets, values[idx])
+
+def fan_triangles(offsets):
+    '''
+    fan-triangulates polygons stored in compressed sparse-row layout.
+    returns (tri_poly, tri_corners), where tri_corners is (T,3) array of
+    indices into the values array and tri_poly[t] is the polygon of triangle t
+    '''
+    lens = np.diff(offsets)
+    ntris = np.maximum(lens - 2, 0)
+    tri_poly = np.repeat(np.arange(len(lens)), ntris)
+    tri_offsets = np.zeros(len(lens) + 1, dtype=np.int64)
+    np.cumsum(ntris, out=tri_offsets[1:])
+    local = np.arange(tri_offsets[-1]) - tri_offsets[tri_poly]
+    c0 = offsets[tri_poly]
+    c1 = c0 + local + 1
+    return (tri_poly, np.stack((c0, c1, c1 + 1), axis=1))
+
+
+class RFMeshSnapshot:
+    '''
+    packed arrays of vertex coordinates and normals (local and world space),
+    edge vertex index pairs, faces in compressed sparse-row layout
+    (face_offsets, face_verts), and hide flags for each element type
+    '''
+
+    @profiler.function
+    def __init__(self, bme, xform):
+        bmvs, bmes, bmfs = bme.verts, bme.edges, bme.faces
+        bmvs.index_update()
+        bmes.index_update()
+        bmfs.index_update()
+
+        self.verts = list(bmvs)
+        self.edges = list(bmes)
+        self.faces = list(bmfs)
+        nv, ne, nf = len(self.verts), len(self.edges), len(self.faces)
+        self.counts = (nv, ne, nf)
+
+        with profiler.code('gathering verts'):
+            self.co     = gather_co(self.verts, nv)
+            self.normal = gather_normal(self.verts, nv)
+            self.vert_hide = np.fromiter((bmv.hide for bmv in self.verts), dtype=bool, count=nv)
+
+        with profiler.code('gathering edges'):
+            self.edge_verts = np.fromiter(
+                (bmv.index for bme in self.edges for bmv in bme.verts),
+                dtype=np.int64, count=ne*2,
+            ).reshape((ne, 2))
+            self.edge_hide = np.fromiter((bme.hide for bme in self.edges), dtype=bool, count=ne)
+
+        with profiler.code('gathering faces'):
+            face_lens = np.fromiter((len(bmf.verts) for bmf in self.faces), dtype=np.int64, count=nf)
+            self.face_offsets = np.zeros(nf + 1, dtype=np.int64)
+            np.cumsum(face_lens, out=self.face_offsets[1:])
+            self.face_verts = np.fromiter(
+                (bmv.index for bmf in self.faces for bmv in bmf.verts),
+                dtype=np.int64, count=int(self.face_offsets[-1]),
+            )
+            self.face_hide = np.fromiter((bmf.hide for bmf in self.faces), dtype=bool, count=nf)
+
+        with profiler.code('transforming to world'):
+            self.co_world     = xform_points(xform.mx_p, self.co)
+            self.normal_world = xform_normals(xform.mx_n, self.normal)
+
+    @staticmethod
+    @profiler.function
+    def from_triangles(co, normal, edge_verts, tris, xform):
+        '''
+        builds snapshot from packed arrays of a triangle mesh without a BMesh
+        (ex: RFSourceArrays).  verts, edges, and faces lists are None
+        '''
+        snap = RFMeshSnapshot.__new__(RFMeshSnapshot)
+        snap.verts = snap.edges = snap.faces = None
+        nv, ne, nf = len(co), len(edge_verts), len(tris)
+        snap.counts = (nv, ne, nf)
+        snap.co           = np.asarray(co, dtype=np.float64).reshape((nv, 3))
+        snap.normal       = np.asarray(normal, dtype=np.float64).reshape((nv, 3))
+        snap.vert_hide    = np.zeros(nv, dtype=bool)
+        snap.edge_verts   = np.asarray(edge_verts, dtype=np.int64).reshape((ne, 2))
+        snap.edge_hide    = np.zeros(ne, dtype=bool)
+        snap.face_offsets = np.arange(0, nf * 3 + 1, 3, dtype=np.int64)
+        snap.face_verts   = np.asarray(tris, dtype=np.int64).reshape(-1)
+        snap.face_hide    = np.zeros(nf, dtype=bool)
+        snap.co_world     = xform_points(xform.mx_p, snap.co)
+        snap.normal_world = xform_normals(xform.mx_n, snap.normal)
+        return snap
+
+    def is_current(self, bme):
+        ''' quick sanity check that BMesh has not changed topology behind our back '''
+        return self.counts == (len(bme.verts), len(bme.edges), len(bme.faces))
+
+    @profiler.function
+    def patch(self, bmelems, xform):
+        '''
+        updates rows of given bmelems in place (coordinates, normals, hide flags), so that
+        elements changed since snapshot was built are current without rebuilding.
+        returns False if some bmelem has no row or its verts changed (caller must rebuild)
+        '''
+        def row(rows, bmelem):
+            i = bmelem.index
+            return i if 0 <= i < len(rows) and rows[i] == bmelem else None
+        bmvs, vrows, erows, frows = [], [], [], []
+        for bmelem in bmelems:
+            if not bmelem.is_valid: continue
+            if type(bmelem) is BMVert:
+                i = row(self.verts, bmelem)
+                if i is None: return False
+                bmvs.append(bmelem)
+                vrows.append(i)
+            elif type(bmelem) is BMEdge:
+                i = row(self.edges, bmelem)
+                if i is None: return False
+                if [row(self.verts, bmv) for bmv in bmelem.verts] != self.edge_verts[i].tolist(): return False
+                erows.append((i, bmelem.hide))
+            elif type(bmelem) is BMFace:
+                i = row(self.faces, bmelem)
+                if i is None: return False
+                if [row(self.verts, bmv) for bmv in bmelem.verts] != self.face_vert_indices(i).tolist(): return False
+                frows.append((i, bmelem.hide))
+        if bmvs:
+            vrows = np.array(vrows, dtype=np.int64)
+            self.co[vrows]     = gather_co(bmvs)
+            self.normal[vrows] = gather_normal(bmvs)
+            self.vert_hide[vrows] = [bmv.hide for bmv in bmvs]
+            self.co_world[vrows]     = xform_points(xform.mx_p, self.co[vrows])
+            self.normal_world[vrows] = xform_normals(xform.mx_n, self.normal[vrows])
+        for (i, hide) in erows: self.edge_hide[i] = hide
+        for (i, hide) in frows: self.face_hide[i] = hide
+        return True
+
+    def revealed_verts(self):
+        return np.flatnonzero(~self.vert_hide)
+
+    def revealed_edges(self):
+        return np.flatnonzero(~self.edge_hide)
+
+    def revealed_faces(self):
+        return np.flatnonzero(~self.face_hide)
+
+    def face_vert_indices(self, face_index):
+        return self.face_verts[self.face_offsets[face_index]:self.face_offsets[face_index+1]]
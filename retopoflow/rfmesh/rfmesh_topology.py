@@ -0,0 +1,137 @@
+'''
+Copyright (C) 2023 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+from bmesh.types import BMVert
+
+from ...addon_common.common.profiler import profiler
+
+
+'''
+RFTargetTopologyCache caches results of topology analysis (ex: finding edge
+loops, strings, and strips in the selection) per connected component, so that
+tools only rerun the analysis on the components that changed.
+
+Elements are split into components that are connected through shared verts.
+A component is keyed by its set of elements, and the cached result of a
+component is reused if the component has exactly the same elements and none
+of its verts were touched since the result was computed.  The touched verts
+come from RFTarget's dirty-element tracking (see RFTarget.get_touched_since).
+
+By default, only changes to topology invalidate results.  Analyses that also
+depend on vertex positions (ex: angles, fitted curves) pass coords=True,
+so that moving a vert also invalidates its component.
+
+NOTE: results are shared across calls, so callers must not modify them.
+'''
+
+
+class RFTargetTopologyCache:
+    def __init__(self):
+        self._kinds = {}    # kind -> _Analysis
+
+    def clear(self):
+        self._kinds.clear()
+
+    @staticmethod
+    def _unwrap(elem):
+        return elem if not hasattr(elem, 'bmelem') else elem.bmelem
+
+    @staticmethod
+    def _verts_of(bmelem):
+        return (bmelem,) if type(bmelem) is BMVert else bmelem.verts
+
+    @staticmethod
+    def connected_components(elems):
+        ''' splits elems (edges or faces) into lists of elems that are connected through shared verts '''
+        unwrap = RFTargetTopologyCache._unwrap
+        elems = { unwrap(elem): elem for elem in elems }
+        vert_elems = {}
+        for bmelem in elems:
+            for bmv in bmelem.verts:
+                vert_elems.setdefault(bmv, []).append(bmelem)
+        remaining = set(elems)
+        components = []
+        while remaining:
+            bmelem = remaining.pop()
+            component, working = [bmelem], [bmelem]
+            while working:
+                for bmv in working.pop().verts:
+                    for bmelem_ in vert_elems[bmv]:
+                        if bmelem_ not in remaining: continue
+                        remaining.remove(bmelem_)
+                        component.append(bmelem_)
+                        working.append(bmelem_)
+            components.append([ elems[bmelem] for bmelem in component ])
+        return components
+
+    @profiler.function
+    def analyze(self, rftarget, kind, elems, fn, *, coords=False, params=None):
+        '''
+        returns list with fn(component) for each connected component of elems, reusing
+        results cached under kind for components that did not change.  params holds any
+        settings that fn depends on; changing params drops all cached results of kind
+        '''
+        analysis = self._kinds.get(kind)
+        if analysis is None or analysis.params != params:
+            analysis = self._kinds[kind] = _Analysis(rftarget, params)
+        else:
+            analysis.invalidate(rftarget, coords)
+
+        unwrap = RFTargetTopologyCache._unwrap
+        cached, results = {}, []
+        for component in self.connected_components(elems):
+            key = frozenset(map(unwrap, component))
+            entry = analysis.components.get(key)
+            if entry is None:
+                verts = frozenset(bmv for bmelem in key for bmv in bmelem.verts)
+                entry = (fn(component), verts)
+            cached[key] = entry
+            results.append(entry[0])
+        # only keep components of current query, so cache does not grow with edit history
+        analysis.components = cached
+        return results
+
+
+class _Analysis:
+    def __init__(self, rftarget, params):
+        self.params = params
+        self.components = {}    # frozenset of bmelems -> (result, frozenset of bmverts)
+        self.counter = rftarget.get_dirty_counter()
+        self.topology = rftarget.get_topology_version()
+
+    def invalidate(self, rftarget, coords):
+        ''' drops cached components with verts touched since last query '''
+        counter, topology = rftarget.get_dirty_counter(), rftarget.get_topology_version()
+        pending = rftarget.get_touched_pending()
+        changed = (counter != self.counter or pending) and (coords or topology != self.topology)
+        if changed and self.components:
+            touched = rftarget.get_touched_since(self.counter) if counter != self.counter else set()
+            if touched is None or any(not bmelem.is_valid for bmelem in pending) or any(not bmelem.is_valid for bmelem in touched):
+                # unknown changes (or removed elements, whose verts are unknown)
+                self.components = {}
+            else:
+                touched_verts = { bmv for bmelem in (touched | pending) for bmv in RFTargetTopologyCache._verts_of(bmelem) }
+                self.components = {
+                    key: entry
+                    for (key, entry) in self.components.items()
+                    if entry[1].isdisjoint(touched_verts)
+                }
+        self.counter, self.topology = counter, topology
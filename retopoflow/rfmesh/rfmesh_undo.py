@@ -0,0 +1,814 @@
+'''
+Copyright (C) 2023 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import io
+import copy
+import json
+from itertools import chain
+
+import bpy
+import bmesh
+from bmesh.types import BMVert, BMEdge, BMFace, BMLayerCollection
+import numpy as np
+
+from ...addon_common.common.profiler import profiler
+
+
+'''
+Reversible changes to an RFTarget, used by the undo stack in place of
+full copies of the target.
+
+While a delta is open, RFTarget's mutation entry points record the
+previous value of each element the first time it is changed (see
+RFTarget.journal_bmelem, journal_selection, journal_flip).  Only the
+changed elements are stored, so pushing an undo step costs nothing and
+the step holds only what the action changed.
+
+Elements created and removed by RFTarget's own topology entry points
+(new_vert, new_face, delete_faces, merge_vertices, ...) are recorded, too:
+created elements by reference, removed elements with all their values and
+their index when the delta was opened (see RFTarget.journal_created and
+journal_removed).  Other changes to topology (bmesh.ops, wrapper ops) and
+hiding (which cascades to linked elements and selection) cannot be reverted
+element-wise, so before the first such change the delta takes a checkpoint:
+a full copy of the target, rewound to the state when the delta was opened
+(see RFTarget.journal_checkpoint).  The undo stack also pushes a checkpoint
+every few steps (see option 'undo checkpoint interval').
+
+When closed, recorded bmelems are converted to element indices, so a
+closed delta applies to any copy of the target with the same element
+order.  This holds across undo steps, because BMesh never moves surviving
+elements, and reverting removes created elements and then sorts recreated
+elements back to their previous indices (see RFTargetDelta._apply_topology).
+
+Older undo steps can be packed into flat arrays (see RFTargetDelta.to_arrays
+and pack_bmesh), which the undo stack compresses and may spill to disk.
+BMesh round-trips through a temporary Mesh (to_mesh / from_mesh), which
+keeps vert, edge, and face order, so packed deltas stay valid.
+'''
+
+
+##########################################################
+# packing BMesh into arrays
+
+# mesh attributes that are packed by pack_bmesh as flags (or are internal)
+_flag_attributes = {'position', 'material_index', 'sharp_face', 'sharp_edge'}
+
+# data_type: (foreach property, components, dtype)
+_attribute_types = {
+    'FLOAT':        ('value',  1, np.float32),
+    'INT':          ('value',  1, np.int32),
+    'INT8':         ('value',  1, np.int8),
+    'BOOLEAN':      ('value',  1, bool),
+    'FLOAT2':       ('vector', 2, np.float32),
+    'INT32_2D':     ('value',  2, np.int32),
+    'FLOAT_VECTOR': ('vector', 3, np.float32),
+    'FLOAT_COLOR':  ('color',  4, np.float32),
+    'BYTE_COLOR':   ('color',  4, np.float32),
+    'QUATERNION':   ('value',  4, np.float32),
+}
+
+# BMesh layers that do not survive as mesh attributes
+_unpackable_layers = {
+    'verts': ('deform', 'shape', 'skin', 'paint_mask', 'bevel_weight', 'crease'),
+    'edges': ('bevel_weight', 'crease', 'freestyle'),
+    'faces': ('freestyle', 'face_map'),
+}
+
+def _foreach_get(seq, prop, count, dtype, per=1):
+    data = np.empty(count * per, dtype=dtype)
+    seq.foreach_get(prop, data)
+    return data
+
+def _pack_flags(*flags):
+    ''' packs bool arrays into uint8 bitfield (first array is bit 0) '''
+    packed = np.zeros(len(flags[0]), dtype=np.uint8)
+    for (bit, flag) in enumerate(flags):
+        packed |= flag.astype(np.uint8) << bit
+    return packed
+
+def _unpack_flag(packed, bit):
+    return ((packed >> bit) & 1).astype(bool)
+
+def can_pack_bmesh(bm):
+    return not any(
+        len(getattr(getattr(bm, seq).layers, name, ()))
+        for (seq, names) in _unpackable_layers.items()
+        for name in names
+    )
+
+@profiler.function
+def pack_bmesh(bm):
+    '''
+    packs geometry, flags, and attributes of bm into dict of arrays.
+    returns None if bm holds data that cannot be packed (ex: vertex groups)
+    '''
+    if not can_pack_bmesh(bm): return None
+    me = bpy.data.meshes.new('RetopoFlow undo')
+    try:
+        bm.to_mesh(me)
+        if me.has_custom_normals: return None
+        nv, ne, nl, nf = len(me.vertices), len(me.edges), len(me.loops), len(me.polygons)
+        counts = { 'POINT': nv, 'EDGE': ne, 'CORNER': nl, 'FACE': nf }
+        arrays = {
+            'co':             _foreach_get(me.vertices, 'co', nv, np.float32, 3),
+            'edge_verts':     _foreach_get(me.edges, 'vertices', ne, np.int32, 2),
+            'loop_verts':     _foreach_get(me.loops, 'vertex_index', nl, np.int32),
+            'loop_edges':     _foreach_get(me.loops, 'edge_index', nl, np.int32),
+            'loop_start':     _foreach_get(me.polygons, 'loop_start', nf, np.int32),
+            'material_index': _foreach_get(me.polygons, 'material_index', nf, np.int16),
+            'vert_flags': _pack_flags(
+                _foreach_get(me.vertices, 'select', nv, bool),
+                _foreach_get(me.vertices, 'hide', nv, bool),
+            ),
+            'edge_flags': _pack_flags(
+                _foreach_get(me.edges, 'select', ne, bool),
+                _foreach_get(me.edges, 'hide', ne, bool),
+                _foreach_get(me.edges, 'use_seam', ne, bool),
+                _foreach_get(me.edges, 'use_edge_sharp', ne, bool),
+            ),
+            'face_flags': _pack_flags(
+                _foreach_get(me.polygons, 'select', nf, bool),
+                _foreach_get(me.polygons, 'hide', nf, bool),
+                _foreach_get(me.polygons, 'use_smooth', nf, bool),
+            ),
+        }
+        attributes = []
+        for attr in me.attributes:
+            if attr.name.startswith('.') or attr.name in _flag_attributes: continue
+            if attr.data_type not in _attribute_types: return None
+            prop, per, dtype = _attribute_types[attr.data_type]
+            arrays[f'attribute{len(attributes)}'] = _foreach_get(attr.data, prop, counts[attr.domain], dtype, per)
+            attributes.append((attr.name, attr.data_type, attr.domain))
+    finally:
+        bpy.data.meshes.remove(me)
+
+    # RFMesh.__setup__ recomputes normals of all verts except verts without faces
+    faceless = np.flatnonzero(np.bincount(arrays['loop_verts'], minlength=len(bm.verts)) == 0).astype(np.int32)
+    bm.verts.ensure_lookup_table()
+    arrays['faceless_index']  = faceless
+    arrays['faceless_normal'] = np.array([tuple(bm.verts[i].normal) for i in faceless.tolist()], dtype=np.float32).reshape((-1, 3))
+    arrays['meta'] = _json_to_array({
+        'attributes':  attributes,
+        'select_mode': sorted(bm.select_mode),
+    })
+    return arrays
+
+@profiler.function
+def unpack_bmesh(arrays):
+    ''' creates BMesh from arrays created by pack_bmesh, with same element order '''
+    meta = _array_to_json(arrays['meta'])
+    nv, ne = len(arrays['co']) // 3, len(arrays['edge_verts']) // 2
+    nl, nf = len(arrays['loop_verts']), len(arrays['loop_start'])
+    me = bpy.data.meshes.new('RetopoFlow undo')
+    try:
+        me.vertices.add(nv)
+        me.vertices.foreach_set('co', arrays['co'])
+        me.edges.add(ne)
+        me.edges.foreach_set('vertices', arrays['edge_verts'])
+        me.loops.add(nl)
+        me.loops.foreach_set('vertex_index', arrays['loop_verts'])
+        # setting loop edges explicitly, because calc_edges does not keep edge order
+        me.loops.foreach_set('edge_index', arrays['loop_edges'])
+        me.polygons.add(nf)
+        me.polygons.foreach_set('loop_start', arrays['loop_start'])
+        if bpy.app.version < (4, 0, 0):
+            loop_total = np.diff(np.append(arrays['loop_start'], nl)).astype(np.int32)
+            me.polygons.foreach_set('loop_total', loop_total)
+        me.polygons.foreach_set('material_index', arrays['material_index'].astype(np.int32))
+        vf, ef, ff = arrays['vert_flags'], arrays['edge_flags'], arrays['face_flags']
+        me.vertices.foreach_set('select',      _unpack_flag(vf, 0))
+        me.vertices.foreach_set('hide',        _unpack_flag(vf, 1))
+        me.edges.foreach_set('select',         _unpack_flag(ef, 0))
+        me.edges.foreach_set('hide',           _unpack_flag(ef, 1))
+        me.edges.foreach_set('use_seam',       _unpack_flag(ef, 2))
+        me.edges.foreach_set('use_edge_sharp', _unpack_flag(ef, 3))
+        me.polygons.foreach_set('select',      _unpack_flag(ff, 0))
+        me.polygons.foreach_set('hide',        _unpack_flag(ff, 1))
+        me.polygons.foreach_set('use_smooth',  _unpack_flag(ff, 2))
+        for (i, (name, data_type, domain)) in enumerate(meta['attributes']):
+            prop, _, _ = _attribute_types[data_type]
+            attr = me.attributes.get(name) or me.attributes.new(name, data_type, domain)
+            attr.data.foreach_set(prop, arrays[f'attribute{i}'])
+        me.update()
+        bm = bmesh.new()
+        bm.from_mesh(me)
+    finally:
+        bpy.data.meshes.remove(me)
+
+    bm.select_mode = set(meta['select_mode'])
+    if len(arrays['faceless_index']):
+        bm.verts.ensure_lookup_table()
+        for (i, n) in zip(arrays['faceless_index'].tolist(), arrays['faceless_normal'].tolist()):
+            bm.verts[i].normal = n
+    return bm
+
+def estimate_bmesh_size(bm):
+    ''' rough estimate of memory used by bm (bytes), assuming mostly quads '''
+    nv, ne, nf = len(bm.verts), len(bm.edges), len(bm.faces)
+    return 96 * nv + 96 * ne + (96 + 4 * 80) * nf
+
+def _json_to_array(data):
+    return np.frombuffer(json.dumps(data).encode('utf-8'), dtype=np.uint8)
+
+def _array_to_json(array):
+    return json.loads(bytes(array).decode('utf-8'))
+
+def arrays_to_bytes(arrays):
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+    return buf.getvalue()
+
+def bytes_to_arrays(data):
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        return { name: npz[name] for name in npz.files }
+
+
+##########################################################
+# journaling created and removed elements
+
+# index into (verts, edges, faces) of RFTargetDelta.select, created, and removed
+_seq_index = { BMVert: 0, BMEdge: 1, BMFace: 2 }
+
+# custom data layers whose values RFTargetDelta records for removed elements
+_journaled_layers = { ('verts', 'int', 'pin') }
+
+def _iter_layers(bm):
+    ''' yields (seq, kind, name) of every custom data layer of bm '''
+    for seq in ('verts', 'edges', 'faces', 'loops'):
+        layers = getattr(bm, seq).layers
+        for kind in dir(layers):
+            if kind.startswith('_'): continue
+            collection = getattr(layers, kind, None)
+            if not isinstance(collection, BMLayerCollection): continue
+            for name in collection.keys(): yield (seq, kind, name)
+
+def can_journal_topology(bm):
+    '''
+    True if removed elements of bm can be recreated from values recorded by
+    RFTargetDelta, which holds only if bm has no other custom data (ex: UVs)
+    '''
+    return all(layer in _journaled_layers for layer in _iter_layers(bm))
+
+def _kth_unused(used, ranks):
+    ''' returns ranks[i]-th non-negative integer that is not in used (sorted) '''
+    used = np.asarray(used, dtype=np.int64)
+    shifted = used - np.arange(len(used))
+    ranks = np.asarray(ranks, dtype=np.int64)
+    return ranks + np.searchsorted(shifted, ranks, side='right')
+
+def _remap_survivors(indices, created, removed):
+    '''
+    maps indices of elements that survive a change from after the change to before it.
+    created (removed) are sorted indices of elements created (removed) by the change,
+    after (before) it.  BMesh never moves elements in memory, so survivors keep their order
+    '''
+    indices = np.asarray(indices, dtype=np.int64)
+    ranks = indices - np.searchsorted(np.asarray(created, dtype=np.int64), indices)
+    return _kth_unused(removed, ranks)
+
+
+class RFTargetDelta:
+    def __init__(self):
+        self.checkpoint = None      # copy of RFTarget as it was when delta was opened
+        self.counts = None          # geometry counts when delta was (re)opened
+        self.untracked = False      # True if geometry counts changed without being recorded (cannot apply)
+
+        # open form: previous values keyed by bmelem
+        self._verts = {}            # bmv -> (co, normal, pin)
+        self._edges = {}            # bme -> (seam, smooth)
+        self._faces = {}            # bmf -> (smooth, material_index, normal)
+        self._flipped = set()       # bmfs flipped an odd number of times
+        self._select = {}           # bmelem -> select
+        self._topology = False      # True if created and removed elements are being recorded
+        self._created = set()       # bmelems created since delta was opened
+        self._removed = ({}, {}, {})# same as removed
+
+        # closed form: previous values keyed by element index
+        self.verts = {}
+        self.edges = {}
+        self.faces = {}
+        self.flipped = set()
+        self.select = ({}, {}, {})  # (verts, edges, faces), each index -> select
+        self.created = ([], [], []) # (verts, edges, faces), each sorted indices of created elements
+        self.removed = ({}, {}, {}) # (verts, edges, faces), each index (before delta was opened) -> values
+        # values of removed elements, which refer to verts by index before delta was opened:
+        #     verts: (co, normal, pin, select, hide)
+        #     edges: (verts, seam, smooth, select, hide)
+        #     faces: (verts, smooth, material_index, normal, select, hide)
+
+    @staticmethod
+    def from_checkpoint(rftarget):
+        delta = RFTargetDelta()
+        delta.checkpoint = rftarget
+        return delta
+
+    def __len__(self):
+        ''' number of recorded elements '''
+        return (
+            len(self.verts) + len(self.edges) + len(self.faces) + sum(map(len, self.select)) +
+            sum(map(len, self.created)) + sum(map(len, self.removed)) +
+            len(self._verts) + len(self._edges) + len(self._faces) + len(self._select) +
+            len(self._created) + sum(map(len, self._removed))
+        )
+
+    @property
+    def recording(self):
+        return self.checkpoint is None
+
+    @property
+    def changes_topology(self):
+        return any(self.created) or any(self.removed)
+
+    def get_size(self):
+        ''' rough estimate of memory used (bytes) '''
+        size = 160 * len(self) + 8 * len(self.flipped)
+        if self.checkpoint is not None: size += estimate_bmesh_size(self.checkpoint.bme)
+        return size
+
+    ##########################################################
+    # recording (see RFTarget journal_* methods)
+
+    @staticmethod
+    def _get_pin(bmv, layer):
+        return bmv[layer] if layer is not None else 0
+
+    def record_vert(self, bmv, bm):
+        if bmv in self._verts: return
+        layer_pin = bm.verts.layers.int.get('pin')
+        self._verts[bmv] = (bmv.co.copy(), bmv.normal.copy(), self._get_pin(bmv, layer_pin))
+
+    def record_edge(self, bme):
+        if bme in self._edges: return
+        self._edges[bme] = (bme.seam, bme.smooth)
+
+    def record_face(self, bmf):
+        if bmf in self._faces: return
+        self._faces[bmf] = (bmf.smooth, bmf.material_index, bmf.normal.copy())
+
+    def record_flip(self, bmf):
+        self._flipped ^= {bmf}
+
+    def record_select(self, bmelem):
+        '''
+        selecting (deselecting) a face also selects (deselects) its edges and verts, and
+        an edge its verts, so these are recorded with bmelem
+        '''
+        select = self._select
+        if bmelem in select: return
+        select[bmelem] = bmelem.select
+        t = type(bmelem)
+        if t is BMVert: return
+        for bmv in bmelem.verts: select.setdefault(bmv, bmv.select)
+        if t is BMFace:
+            for bme in bmelem.edges: select.setdefault(bme, bme.select)
+
+    def can_record_topology(self, bm):
+        '''
+        True if changes to topology can be recorded as created and removed elements.
+        if not, caller must take a checkpoint.  indices of closed entries would shift,
+        so only deltas without any (ex: not reopened after undo) qualify
+        '''
+        if self._topology: return True
+        if self.verts or self.edges or self.faces or self.flipped or any(self.select): return False
+        if self.changes_topology or not can_journal_topology(bm): return False
+        self._topology = True
+        return True
+
+    def record_created(self, bmelems):
+        self._created.update(bmelems)
+
+    @profiler.function
+    def record_removed(self, bmelems, bm):
+        ''' records bmelems, and the edges and faces removed with them, just before removing them '''
+        verts, edges, faces = set(), set(), set()
+        for bmelem in bmelems:
+            if not bmelem.is_valid: continue
+            t = type(bmelem)
+            if t is BMVert:
+                verts.add(bmelem)
+                edges.update(bmelem.link_edges)
+                faces.update(bmelem.link_faces)
+            elif t is BMEdge:
+                edges.add(bmelem)
+                faces.update(bmelem.link_faces)
+            elif t is BMFace:
+                faces.add(bmelem)
+        # elements created by this delta are forgotten.  records are dropped before
+        # elements are removed, because removed bmelems no longer hash the same
+        created = [ bmelem for bmelem in chain(verts, edges, faces) if bmelem in self._created ]
+        verts, edges, faces = ([bmelem for bmelem in s if bmelem not in self._created] for s in (verts, edges, faces))
+        if verts or edges or faces: self._record_removed(verts, edges, faces, bm)
+        for bmelem in created:
+            self._created.remove(bmelem)
+            self._drop(bmelem)
+
+    def _record_removed(self, verts, edges, faces, bm):
+        # elements that existed when delta was opened only refer to verts that did, too
+        refs = set(verts)
+        refs.update(bmv for bme in edges for bmv in bme.verts)
+        refs.update(bmv for bmf in faces for bmv in bmf.verts)
+        vidx = self._get_indices_before(bm.verts, refs)
+        eidx = self._get_indices_before(bm.edges, edges)
+        fidx = self._get_indices_before(bm.faces, faces)
+
+        layer_pin = bm.verts.layers.int.get('pin')
+        removed_verts, removed_edges, removed_faces = self._removed
+        for bmv in verts:
+            co, normal, pin = self._verts.pop(bmv, None) or (bmv.co.copy(), bmv.normal.copy(), self._get_pin(bmv, layer_pin))
+            removed_verts[vidx[bmv]] = (co, normal, pin, self._select.pop(bmv, bmv.select), bmv.hide)
+        for bme in edges:
+            seam, smooth = self._edges.pop(bme, None) or (bme.seam, bme.smooth)
+            bmvs = tuple(vidx[bmv] for bmv in bme.verts)
+            removed_edges[eidx[bme]] = (bmvs, seam, smooth, self._select.pop(bme, bme.select), bme.hide)
+        for bmf in faces:
+            smooth, material_index, normal = self._faces.pop(bmf, None) or (bmf.smooth, bmf.material_index, bmf.normal.copy())
+            bmvs = [vidx[bmv] for bmv in bmf.verts]
+            if bmf in self._flipped:
+                # flipping reversed winding
+                self._flipped.remove(bmf)
+                bmvs.reverse()
+            removed_faces[fidx[bmf]] = (tuple(bmvs), smooth, material_index, normal, self._select.pop(bmf, bmf.select), bmf.hide)
+
+    def _drop(self, bmelem):
+        self._verts.pop(bmelem, None)
+        self._edges.pop(bmelem, None)
+        self._faces.pop(bmelem, None)
+        self._select.pop(bmelem, None)
+        self._flipped.discard(bmelem)
+
+    def _get_indices_before(self, seq, bmelems):
+        ''' returns dict of bmelem -> index when delta was opened, for bmelems of seq that existed then '''
+        if not bmelems: return {}
+        bmelems = list(bmelems)
+        seq.index_update()
+        t = type(bmelems[0])
+        created = sorted(bmelem.index for bmelem in self._created if type(bmelem) is t)
+        removed = sorted(self._removed[_seq_index[t]])
+        indices = _remap_survivors([bmelem.index for bmelem in bmelems], created, removed)
+        return dict(zip(bmelems, indices.tolist()))
+
+    ##########################################################
+    # open / close
+
+    def open(self, rftarget):
+        self.counts = rftarget._get_counts()
+
+    @profiler.function
+    def close(self, rftarget):
+        ''' converts recorded bmelems to indices '''
+        if self.checkpoint is not None: return
+        created = ([], [], [])
+        for bmelem in self._created:
+            if not bmelem.is_valid: continue
+            # created elements are removed when reverting, so their previous values are not needed
+            self._drop(bmelem)
+            created[_seq_index[type(bmelem)]].append(bmelem)
+        self._created.clear()
+        if self.counts is not None:
+            expected = tuple(n + len(c) - len(r) for (n, c, r) in zip(self.counts, created, self._removed))
+            if rftarget._get_counts() != expected:
+                # topology changed through a path that did not record it or call journal_checkpoint
+                print(f'RetopoFlow: untracked topology change ({expected} -> {rftarget._get_counts()}), undo will restore last checkpoint')
+                self.untracked = True
+        bm, selection = rftarget.bme, bool(self._select)
+        if self._verts or selection or created[0]: bm.verts.index_update()
+        if self._edges or selection or created[1]: bm.edges.index_update()
+        if self._faces or self._flipped or selection or created[2]: bm.faces.index_update()
+        for (src, dst) in ((self._verts, self.verts), (self._edges, self.edges), (self._faces, self.faces)):
+            for (bmelem, values) in src.items():
+                if bmelem.is_valid: dst.setdefault(bmelem.index, values)
+            src.clear()
+        self.flipped ^= { bmf.index for bmf in self._flipped if bmf.is_valid }
+        self._flipped.clear()
+        for (bmelem, select) in self._select.items():
+            if bmelem.is_valid: self.select[_seq_index[type(bmelem)]].setdefault(bmelem.index, select)
+        self._select.clear()
+        if self._topology:
+            # topology is only recorded by deltas without closed entries (see can_record_topology)
+            self.created = tuple(sorted(bmelem.index for bmelem in c) for c in created)
+            self.removed, self._removed = self._removed, ({}, {}, {})
+            self._topology = False
+
+    @profiler.function
+    def take_checkpoint(self, rftarget):
+        ''' copies rftarget and rewinds the copy to the state when delta was opened '''
+        if self.checkpoint is not None: return
+        self.close(rftarget)
+        checkpoint = copy.deepcopy(rftarget)
+        self.apply(checkpoint)
+        self.checkpoint = checkpoint
+        self.verts, self.edges, self.faces = {}, {}, {}
+        self.flipped, self.select = set(), ({}, {}, {})
+        self.created, self.removed = ([], [], []), ({}, {}, {})
+
+    ##########################################################
+    # packing (delta must be closed)
+
+    @profiler.function
+    def to_arrays(self):
+        ''' packs delta into dict of arrays, or returns None if checkpoint cannot be packed '''
+        arrays = {}
+        if self.checkpoint is not None:
+            packed = pack_bmesh(self.checkpoint.bme)
+            if packed is None: return None
+            arrays.update({ f'checkpoint_{k}': v for (k, v) in packed.items() })
+        verts, edges, faces = list(self.verts.items()), list(self.edges.items()), list(self.faces.items())
+        arrays.update({
+            'counts':         np.array(self.counts or (-1, -1, -1), dtype=np.int64),
+            'untracked':      np.array(self.untracked),
+            'vert_index':     np.array([i for (i, _) in verts], dtype=np.int32),
+            'vert_co':        np.array([v[0] for (_, v) in verts], dtype=np.float32).reshape((-1, 3)),
+            'vert_normal':    np.array([v[1] for (_, v) in verts], dtype=np.float32).reshape((-1, 3)),
+            'vert_pin':       np.array([v[2] for (_, v) in verts], dtype=np.int32),
+            'edge_index':     np.array([i for (i, _) in edges], dtype=np.int32),
+            'edge_flags':     np.array([v[0] | (v[1] << 1) for (_, v) in edges], dtype=np.uint8),
+            'face_index':     np.array([i for (i, _) in faces], dtype=np.int32),
+            'face_smooth':    np.array([v[0] for (_, v) in faces], dtype=bool),
+            'face_material':  np.array([v[1] for (_, v) in faces], dtype=np.int16),
+            'face_normal':    np.array([v[2] for (_, v) in faces], dtype=np.float32).reshape((-1, 3)),
+            'flipped':        np.array(sorted(self.flipped), dtype=np.int32),
+        })
+        for (name, select) in zip(('verts', 'edges', 'faces'), self.select):
+            arrays[f'select_{name}_index'] = np.array(list(select.keys()), dtype=np.int32)
+            arrays[f'select_{name}']       = np.array(list(select.values()), dtype=bool)
+        for (name, created) in zip(('verts', 'edges', 'faces'), self.created):
+            arrays[f'created_{name}'] = np.array(created, dtype=np.int32)
+        rverts, redges, rfaces = (sorted(removed.items()) for removed in self.removed)
+        arrays.update({
+            'removed_vert_index':    np.array([i for (i, _) in rverts], dtype=np.int32),
+            'removed_vert_co':       np.array([v[0] for (_, v) in rverts], dtype=np.float32).reshape((-1, 3)),
+            'removed_vert_normal':   np.array([v[1] for (_, v) in rverts], dtype=np.float32).reshape((-1, 3)),
+            'removed_vert_pin':      np.array([v[2] for (_, v) in rverts], dtype=np.int32),
+            'removed_vert_flags':    np.array([v[3] | (v[4] << 1) for (_, v) in rverts], dtype=np.uint8),
+            'removed_edge_index':    np.array([i for (i, _) in redges], dtype=np.int32),
+            'removed_edge_verts':    np.array([v[0] for (_, v) in redges], dtype=np.int32).reshape((-1, 2)),
+            'removed_edge_flags':    np.array([v[1] | (v[2] << 1) | (v[3] << 2) | (v[4] << 3) for (_, v) in redges], dtype=np.uint8),
+            'removed_face_index':    np.array([i for (i, _) in rfaces], dtype=np.int32),
+            'removed_face_verts':    np.array([j for (_, v) in rfaces for j in v[0]], dtype=np.int32),
+            'removed_face_sizes':    np.array([len(v[0]) for (_, v) in rfaces], dtype=np.int32),
+            'removed_face_flags':    np.array([v[1] | (v[4] << 1) | (v[5] << 2) for (_, v) in rfaces], dtype=np.uint8),
+            'removed_face_material': np.array([v[2] for (_, v) in rfaces], dtype=np.int16),
+            'removed_face_normal':   np.array([v[3] for (_, v) in rfaces], dtype=np.float32).reshape((-1, 3)),
+        })
+        return arrays
+
+    @staticmethod
+    @profiler.function
+    def from_arrays(arrays, rftarget):
+        '''
+        unpacks delta from arrays created by to_arrays.
+        checkpoint is created as copy of rftarget with packed geometry
+        '''
+        delta = RFTargetDelta()
+        counts = arrays['counts'].tolist()
+        delta.counts = None if counts[0] < 0 else tuple(counts)
+        delta.untracked = bool(arrays['untracked'])
+        if 'checkpoint_meta' in arrays:
+            packed = { k[len('checkpoint_'):]: v for (k, v) in arrays.items() if k.startswith('checkpoint_') }
+            delta.checkpoint = rftarget.copy_with_bmesh(unpack_bmesh(packed))
+        delta.verts = {
+            i: (tuple(co), tuple(no), pin)
+            for (i, co, no, pin) in zip(
+                arrays['vert_index'].tolist(), arrays['vert_co'].tolist(),
+                arrays['vert_normal'].tolist(), arrays['vert_pin'].tolist(),
+            )
+        }
+        delta.edges = {
+            i: (bool(f & 1), bool(f & 2))
+            for (i, f) in zip(arrays['edge_index'].tolist(), arrays['edge_flags'].tolist())
+        }
+        delta.faces = {
+            i: (smooth, material, tuple(no))
+            for (i, smooth, material, no) in zip(
+                arrays['face_index'].tolist(), arrays['face_smooth'].tolist(),
+                arrays['face_material'].tolist(), arrays['face_normal'].tolist(),
+            )
+        }
+        delta.flipped = set(arrays['flipped'].tolist())
+        delta.select = tuple(
+            dict(zip(arrays[f'select_{name}_index'].tolist(), arrays[f'select_{name}'].tolist()))
+            for name in ('verts', 'edges', 'faces')
+        )
+        delta.created = tuple(arrays[f'created_{name}'].tolist() for name in ('verts', 'edges', 'faces'))
+        face_verts = np.split(arrays['removed_face_verts'], np.cumsum(arrays['removed_face_sizes'])[:-1])
+        delta.removed = (
+            {
+                i: (tuple(co), tuple(no), pin, bool(f & 1), bool(f & 2))
+                for (i, co, no, pin, f) in zip(
+                    arrays['removed_vert_index'].tolist(), arrays['removed_vert_co'].tolist(),
+                    arrays['removed_vert_normal'].tolist(), arrays['removed_vert_pin'].tolist(),
+                    arrays['removed_vert_flags'].tolist(),
+                )
+            },
+            {
+                i: (tuple(bmvs), bool(f & 1), bool(f & 2), bool(f & 4), bool(f & 8))
+                for (i, bmvs, f) in zip(
+                    arrays['removed_edge_index'].tolist(), arrays['removed_edge_verts'].tolist(),
+                    arrays['removed_edge_flags'].tolist(),
+                )
+            },
+            {
+                i: (tuple(bmvs.tolist()), bool(f & 1), material, tuple(no), bool(f & 2), bool(f & 4))
+                for (i, bmvs, f, material, no) in zip(
+                    arrays['removed_face_index'].tolist(), face_verts,
+                    arrays['removed_face_flags'].tolist(), arrays['removed_face_material'].tolist(),
+                    arrays['removed_face_normal'].tolist(),
+                )
+            },
+        )
+        return delta
+
+    ##########################################################
+    # replay
+
+    @staticmethod
+    def _get_values(bm, bmvs, bmes, bmfs):
+        ''' returns values of bmelems as recorded for removed elements, keyed by (current) index '''
+        layer_pin = bm.verts.layers.int.get('pin')
+        get_pin = RFTargetDelta._get_pin
+        return (
+            { bmv.index: (bmv.co.copy(), bmv.normal.copy(), get_pin(bmv, layer_pin), bmv.select, bmv.hide) for bmv in bmvs },
+            { bme.index: (tuple(bmv.index for bmv in bme.verts), bme.seam, bme.smooth, bme.select, bme.hide) for bme in bmes },
+            {
+                bmf.index: (tuple(bmv.index for bmv in bmf.verts), bmf.smooth, bmf.material_index, bmf.normal.copy(), bmf.select, bmf.hide)
+                for bmf in bmfs
+            },
+        )
+
+    @profiler.function
+    def apply(self, rftarget):
+        '''
+        reverts changes recorded in (closed) delta to rftarget, which must not have
+        changed since delta was closed.  returns delta that reverts this apply
+        '''
+        assert self.checkpoint is None, 'RFTargetDelta.apply: cannot apply checkpoint in place'
+        bm = rftarget.bme
+        bmvs, bmes, bmfs = bm.verts, bm.edges, bm.faces
+        seqs = (bmvs, bmes, bmfs)
+        for seq in seqs:
+            if self.changes_topology: seq.index_update()
+            seq.ensure_lookup_table()
+        inverse = RFTargetDelta()
+        touched, update_faces = set(), set()
+
+        if self.changes_topology:
+            # values of created elements are taken before anything changes, so inverse can recreate them
+            created = [ [seq[i] for i in indices] for (seq, indices) in zip(seqs, self.created) ]
+            inverse.removed = self._get_values(bm, *created)
+            inverse.created = tuple(sorted(removed) for removed in self.removed)
+
+        layer_pin = bmvs.layers.int.get('pin')
+        for (i, (co, normal, pin)) in self.verts.items():
+            bmv = bmvs[i]
+            inverse.verts[i] = (bmv.co.copy(), bmv.normal.copy(), self._get_pin(bmv, layer_pin))
+            bmv.co, bmv.normal = co, normal
+            if pin or layer_pin is not None:
+                bmv[rftarget.layer_pin] = pin
+                layer_pin = rftarget.layer_pin
+            touched.add(bmv)
+            touched.update(bmv.link_edges)
+            update_faces.update(bmv.link_faces)
+
+        for (i, (seam, smooth)) in self.edges.items():
+            bme = bmes[i]
+            inverse.edges[i] = (bme.seam, bme.smooth)
+            bme.seam, bme.smooth = seam, smooth
+            touched.add(bme)
+
+        for i in self.flipped:
+            bmfs[i].normal_flip()
+            update_faces.add(bmfs[i])
+        inverse.flipped = set(self.flipped)
+        for bmf in update_faces: bmf.normal_update()
+        touched |= update_faces
+
+        for (i, (smooth, material_index, normal)) in self.faces.items():
+            bmf = bmfs[i]
+            inverse.faces[i] = (bmf.smooth, bmf.material_index, bmf.normal.copy())
+            bmf.smooth, bmf.material_index, bmf.normal = smooth, material_index, normal
+            touched.add(bmf)
+
+        # setting selection of face (edge) also sets selection of its edges and verts (verts),
+        # which are recorded with it, so record all before restoring from faces down to verts
+        for (seq, select, inv) in zip(seqs, self.select, inverse.select):
+            for i in select: inv[i] = seq[i].select
+        for (seq, select, inv) in zip(reversed(seqs), reversed(self.select), reversed(inverse.select)):
+            for (i, sel) in select.items():
+                seq[i].select = sel
+                if sel != inv[i]: touched.add(seq[i])
+            rftarget.selection_added(seq[i] for (i, sel) in select.items() if sel)
+
+        if self.flipped: rftarget.touch_topology()
+        if self.edges or self.faces or any(pin != inverse.verts[i][2] for (i, (_, _, pin)) in self.verts.items()):
+            rftarget.touch_attributes()
+        rftarget.touch(touched)
+
+        if self.changes_topology:
+            self._apply_topology(rftarget, created)
+            # entries of inverse are keyed by indices from before created elements were removed
+            remap = lambda t, indices: _remap_survivors(indices, self.created[t], inverse.created[t]).tolist()
+            inverse.verts = dict(zip(remap(0, list(inverse.verts)), inverse.verts.values()))
+            inverse.edges = dict(zip(remap(1, list(inverse.edges)), inverse.edges.values()))
+            inverse.faces = dict(zip(remap(2, list(inverse.faces)), inverse.faces.values()))
+            inverse.flipped = set(remap(2, sorted(inverse.flipped)))
+            inverse.select = tuple(dict(zip(remap(t, list(s)), s.values())) for (t, s) in enumerate(inverse.select))
+        return inverse
+
+    @profiler.function
+    def _apply_topology(self, rftarget, created):
+        '''
+        removes created elements and recreates removed elements at their previous indices,
+        so that older (closed) deltas still apply
+        '''
+        bm = rftarget.bme
+        created_verts, created_edges, created_faces = created
+        for bmf in created_faces: bm.faces.remove(bmf)
+        for bme in created_edges:
+            if bme.is_valid: bm.edges.remove(bme)
+        for bmv in created_verts:
+            if bmv.is_valid: bm.verts.remove(bmv)
+
+        # surviving verts keep their order, so vert that had index i is at i - (removed verts before i)
+        removed_verts, removed_edges, removed_faces = self.removed
+        refs = { i for (bmvs, *_) in chain(removed_edges.values(), removed_faces.values()) for i in bmvs }
+        refs = sorted(refs - removed_verts.keys())
+        ranks = np.asarray(refs, dtype=np.int64) - np.searchsorted(np.array(sorted(removed_verts), dtype=np.int64), refs)
+        bm.verts.ensure_lookup_table()
+        bmv_at = { i: bm.verts[j] for (i, j) in zip(refs, ranks.tolist()) }
+
+        recreated = ([], [], [])
+        layer_pin = bm.verts.layers.int.get('pin')
+        for (i, (co, normal, pin, _, _)) in sorted(removed_verts.items()):
+            bmv = bm.verts.new(co)
+            bmv.normal = normal
+            if pin or layer_pin is not None:
+                bmv[rftarget.layer_pin] = pin
+                layer_pin = rftarget.layer_pin
+            bmv_at[i] = bmv
+            recreated[0].append(bmv)
+        for (i, (bmvs, seam, smooth, _, _)) in sorted(removed_edges.items()):
+            bmvs = [bmv_at[j] for j in bmvs]
+            bme = bm.edges.get(bmvs) or bm.edges.new(bmvs)
+            bme.seam, bme.smooth = seam, smooth
+            recreated[1].append(bme)
+        for (i, (bmvs, smooth, material_index, normal, _, _)) in sorted(removed_faces.items()):
+            bmvs = [bmv_at[j] for j in bmvs]
+            bmf = bm.faces.get(bmvs) or bm.faces.new(bmvs)
+            bmf.smooth, bmf.material_index, bmf.normal = smooth, material_index, normal
+            recreated[2].append(bmf)
+        for (bmelems, removed) in zip(recreated, self.removed):
+            for (bmelem, i) in zip(bmelems, sorted(removed)):
+                *_, select, hide = removed[i]
+                if select: bmelem.select = True
+                if hide: bmelem.hide = True
+            rftarget.selection_added(bmelem for bmelem in bmelems if bmelem.select)
+
+        for (seq, bmelems, removed) in zip((bm.verts, bm.edges, bm.faces), recreated, self.removed):
+            self._restore_order(seq, bmelems, sorted(removed))
+
+        # restoring order moves elements under existing bmelem references, so dependents must rebuild
+        rftarget.touch_topology()
+        rftarget.touch_attributes()
+        rftarget.touch_untracked()
+
+    @staticmethod
+    def _restore_order(seq, bmelems, indices):
+        '''
+        moves bmelems (just created) to indices, keeping order of all other elements.
+        BMesh reuses slots of removed elements, so often nothing or only bmelems move
+        '''
+        if not bmelems: return
+        seq.index_update()
+        current = [bmelem.index for bmelem in bmelems]
+        if current == indices: return
+        if sorted(current) == indices:
+            # other elements are already in place
+            for (bmelem, i) in zip(bmelems, indices): bmelem.index = i
+        else:
+            order = np.empty(len(seq), dtype=np.int64)
+            others = np.ones(len(seq), dtype=bool)
+            others[current] = False
+            order[current] = indices
+            order[others] = _kth_unused(indices, np.arange(np.count_nonzero(others)))
+            for (bmelem, i) in zip(seq, order.tolist()): bmelem.index = i
+        # without key, sort reorders elements by index
+        seq.sort()
@@ -0,0 +1,235 @@
+'''
+Copyright (C) 2023 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import numpy as np
+from mathutils import Vector
+
+from ...addon_common.common.profiler import profiler
+from .rfmesh_snapshot import xform_points
+
+
+'''
+Batched visibility (occlusion) testing.
+
+Everything here works on NumPy arrays and mathutils BVHTrees only, so it
+runs in Blender's background mode (no GPU, no region/space data), which
+makes it usable from tests and benchmarks.
+
+The view is described by a 4x4 perspective matrix (same as
+RegionView3D.perspective_matrix) and the region size, and rays match
+those built by RetopoFlow_Spaces.Point_to_Ray.
+'''
+
+
+class VisibilityView:
+    '''
+    view needed to project points and to build rays from the view to points.
+    see bpy_extras.view3d_utils region_2d_to_origin_3d and region_2d_to_vector_3d
+    '''
+
+    def __init__(self, perspective_matrix, view_matrix, is_perspective, width, height):
+        self.matrix = np.array(perspective_matrix, dtype=np.float64)
+        self.matrix_inv = np.linalg.inv(self.matrix)
+        self.view_inv = np.linalg.inv(np.array(view_matrix, dtype=np.float64))
+        self.is_perspective = bool(is_perspective)
+        self.size = np.array((width, height), dtype=np.float64)
+        self.half = self.size / 2.0
+
+    @staticmethod
+    def from_region(region, r3d):
+        return VisibilityView(r3d.perspective_matrix, r3d.view_matrix, r3d.is_perspective, region.width, region.height)
+
+    def project(self, co):
+        ''' returns (xy, valid); see ViewProjection.project '''
+        co = np.asarray(co, dtype=np.float64).reshape((-1, 3))
+        prj = co @ self.matrix[:, :3].T + self.matrix[:, 3]
+        w = prj[:, 3]
+        valid = w > 0.0
+        xy = self.half + self.half * (prj[:, :2] / np.where(valid, w, 1.0)[:, None])
+        return (xy, valid)
+
+    def in_area(self, xy):
+        x, y = xy[..., 0], xy[..., 1]
+        return (0 <= x) & (x <= self.size[0]) & (0 <= y) & (y <= self.size[1])
+
+    def forward(self):
+        ''' view direction (see RetopoFlow_Spaces.Vec_forward) '''
+        fwd = -self.view_inv[:3, 2]
+        return fwd / np.linalg.norm(fwd)
+
+    def rays_from(self, xy):
+        '''
+        returns (origins, directions) of rays from view through screen positions xy.
+        batched version of region_2d_to_origin_3d and region_2d_to_vector_3d
+        '''
+        xy = np.asarray(xy, dtype=np.float64).reshape((-1, 2))
+        ndc = xy / self.half - 1.0
+        mi = self.matrix_inv
+        if self.is_perspective:
+            o = np.broadcast_to(self.view_inv[:3, 3], (len(xy), 3))
+            p = ndc[:, 0:1] * mi[:3, 0] + ndc[:, 1:2] * mi[:3, 1] - 0.5 * mi[:3, 2] + mi[:3, 3]
+            w = ndc[:, 0] * mi[3, 0] + ndc[:, 1] * mi[3, 1] - 0.5 * mi[3, 2] + mi[3, 3]
+            d = p / w[:, None] - o
+            d /= np.maximum(np.linalg.norm(d, axis=1), 1e-30)[:, None]
+            return (o, d)
+        o = ndc[:, 0:1] * mi[:3, 0] + ndc[:, 1:2] * mi[:3, 1] + mi[:3, 3] - mi[:3, 2]
+        return (o, np.broadcast_to(self.forward(), o.shape))
+
+    def rays_to(self, co, xy):
+        '''
+        returns (origins, directions, distances) of rays from view through screen
+        positions xy to world points co
+        '''
+        if self.is_perspective:
+            o = np.broadcast_to(self.view_inv[:3, 3], co.shape)
+            v = co - o
+            dist = np.linalg.norm(v, axis=1)
+            return (o, v / np.where(dist > 0, dist, 1.0)[:, None], dist)
+        ndc = xy / self.half - 1.0
+        mi = self.matrix_inv
+        o = ndc[:, 0:1] * mi[:3, 0] + ndc[:, 1:2] * mi[:3, 1] + mi[:3, 3] - mi[:3, 2]
+        d = np.broadcast_to(self.forward(), co.shape)
+        return (o, d, np.linalg.norm(co - o, axis=1))
+
+
+class VisibilitySource:
+    '''
+    occluder for VisibilityPass: a BVHTree in local space with its world transform
+    and world-space bounding box corners
+    '''
+
+    def __init__(self, bvh, mx_p, corners):
+        self.bvh = bvh
+        self.imx = np.linalg.inv(np.array(mx_p, dtype=np.float64))
+        self.corners = np.array([tuple(c) for c in corners], dtype=np.float64).reshape((-1, 3))
+
+    def screen_rect(self, view, *, padding=1.0):
+        '''
+        returns (x0, y0, x1, y1) screen-space bounds, grown by padding pixels so rays
+        through the rect border are not culled; unbounded if any corner is behind view
+        '''
+        xy, valid = view.project(self.corners)
+        if not len(xy) or not valid.all(): return (-np.inf, -np.inf, np.inf, np.inf)
+        (x0, y0), (x1, y1) = xy.min(axis=0) - padding, xy.max(axis=0) + padding
+        return (x0, y0, x1, y1)
+
+    def segment_hit(self, o, d, dist, ignore_backface, *, backface_push=0.00001, max_backface_pushes=20):
+        ''' same as RFMesh.raycast_hit, but with local-space origin, direction, and distance '''
+        o, d = Vector(o), Vector(d)
+        for _ in range(max_backface_pushes):
+            p, n, _, _ = self.bvh.ray_cast(o, d, dist)
+            if not p: return False
+            if not (ignore_backface and n.dot(d) > 0): return True
+            dist -= (p - o).length
+            o = p + d * backface_push
+        return False
+
+
+class VisibilityPass:
+    '''
+    tests arrays of world-space points (with normals) for visibility: point must
+    project inside the view, face the view (backface test), and not be occluded by
+    any source (occlusion test).  rays are bucketed by screen tile, and each tile
+    only tests the sources whose screen-space bounds overlap it.
+    '''
+
+    def __init__(self, view, sources, *, clip_start, max_dist_offset, ignore_backface, backface_test=True, occlusion_test=True, tile_size=64):
+        self.view = view
+        self.sources = list(sources)
+        self.clip_start = clip_start
+        self.max_dist_offset = max_dist_offset
+        self.ignore_backface = ignore_backface
+        self.backface_test = backface_test
+        self.occlusion_test = occlusion_test
+        self.tile_size = max(1, int(tile_size))
+        self.rects = np.array([ src.screen_rect(view) for src in self.sources ], dtype=np.float64).reshape((-1, 4))
+
+    @profiler.function
+    def mask(self, co, no=None):
+        ''' returns (N,) bool array, True if co[i] is visible '''
+        co = np.asarray(co, dtype=np.float64).reshape((-1, 3))
+        xy, valid = self.view.project(co)
+        mask = valid & self.view.in_area(xy)
+        if self.backface_test and no is not None:
+            no = np.asarray(no, dtype=np.float64).reshape((-1, 3))
+            mask &= (no @ self.view.forward()) <= 0
+        if self.occlusion_test and self.sources:
+            idx = np.flatnonzero(mask)
+            mask[idx[self.occluded(co[idx], xy[idx])]] = False
+        return mask
+
+    def mask_offset(self, co, no, offset):
+        '''
+        point is visible if either it or the point pushed out along normal by offset is
+        visible (see RFMesh._gen_is_vis).  pushed points are only tested when needed
+        '''
+        co = np.asarray(co, dtype=np.float64).reshape((-1, 3))
+        no = np.asarray(no, dtype=np.float64).reshape((-1, 3))
+        mask = self.mask(co, no)
+        retry = np.flatnonzero(~mask)
+        if len(retry):
+            mask[retry] = self.mask(co[retry] + offset * no[retry], no[retry])
+        return mask
+
+    def occluded(self, co, xy):
+        ''' returns (N,) bool array, True if segment from view to co[i] hits any source '''
+        occluded = np.zeros(len(co), dtype=bool)
+        if not len(co): return occluded
+
+        # build segments, matching Ray(o, d, min_dist=clip_start, max_dist=dist-max_dist_offset)
+        o, d, dist = self.view.rays_to(co, xy)
+        start = o + d * self.clip_start
+        length = np.abs(dist - self.max_dist_offset - self.clip_start)
+        end = start + d * length[:, None]
+
+        # transform segments into local space of each source
+        local = []
+        for src in self.sources:
+            s_l, e_l = xform_points(src.imx, start), xform_points(src.imx, end)
+            v_l = e_l - s_l
+            l_l = np.linalg.norm(v_l, axis=1)
+            d_l = v_l / np.where(l_l > 0, l_l, 1.0)[:, None]
+            local.append((s_l.tolist(), d_l.tolist(), l_l.tolist()))
+
+        # bucket rays by screen tile
+        tiles = np.floor(xy / self.tile_size).astype(np.int64)
+        keys = tiles[:, 0] * (int(self.view.size[1]) // self.tile_size + 2) + tiles[:, 1]
+        order = np.argsort(keys, kind='stable')
+        _, starts = np.unique(keys[order], return_index=True)
+        bounds = np.append(starts, len(order))
+
+        ts = self.tile_size
+        for (b0, b1) in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            rays = order[b0:b1].tolist()
+            tx, ty = tiles[rays[0]].tolist()
+            x0, y0, x1, y1 = tx * ts, ty * ts, (tx + 1) * ts, (ty + 1) * ts
+            srcs = [
+                (src, local[i])
+                for (i, (src, (rx0, ry0, rx1, ry1))) in enumerate(zip(self.sources, self.rects.tolist()))
+                if rx0 <= x1 and x0 <= rx1 and ry0 <= y1 and y0 <= ry1
+            ]
+            if not srcs: continue
+            for r in rays:
+                occluded[r] = any(
+                    src.segment_hit(s_l[r], d_l[r], l_l[r], self.ignore_backface)
+                    for (src, (s_l, d_l, l_l)) in srcs
+                )
+        return occluded
@@ -60,6 +60,13 @@ user-writable properties:
     common: hide, index. select, tag
 
 NOTE: RFVert, RFEdge, RFFace do NOT mark RFMesh as dirty!
+      but setting co, normal, or hide does record the element as touched
+      (see RFTarget.touch) so dependents can update incrementally.
+      setting pinned, seam, smooth, or material_index only records that
+      some attribute changed (see RFTarget.touch_attributes).
+
+NOTE: setters and topology-changing methods record previous values in
+      the undo journal before changing anything (see RFTarget.journal_*).
 '''
 
 
@@ -112,7 +119,10 @@ class BMElemWrapper:
 
     @hide.setter
     def hide(self, v) -> None:
+        # hiding also hides linked elements and changes selection
+        self.rftarget.journal_checkpoint()
         self.bmelem.hide = v
+        self.rftarget.touch_bmelem(self.bmelem)
 
     @property
     def index(self) -> int:
@@ -128,7 +138,9 @@ class BMElemWrapper:
 
     @select.setter
     def select(self, v) -> None:
+        self.rftarget.journal_selection([self.bmelem])
         self.bmelem.select = v
+        if v: self.rftarget.selection_added([self.bmelem])
 
     @property
     def unselect(self) -> bool:
@@ -178,14 +190,18 @@ class RFVert(BMElemWrapper):
         #     nx,ny,nz = (mm.x and abs(ox) <= th),(mm.y and abs(oy) <= th),(mm.z and abs(oz) <= th)
         #     if nx or ny or nz:
         #         co = rft.snap_to_symmetry(co, mm._symmetry, to_world=False, from_world=False)
+        self.rftarget.journal_bmelem(self.bmelem)
         self.bmelem.co = co
+        self.rftarget.touch_bmelem(self.bmelem)
 
     @property
     def pinned(self):
         return bool(self.bmelem[self.rftarget.layer_pin])
     @pinned.setter
     def pinned(self, v):
+        self.rftarget.journal_bmelem(self.bmelem)
         self.bmelem[self.rftarget.layer_pin] = 1 if bool(v) else 0
+        self.rftarget.touch_attributes()
 
     @property
     def seam(self):
@@ -197,7 +213,9 @@ class RFVert(BMElemWrapper):
 
     @normal.setter
     def normal(self, norm):
+        self.rftarget.journal_bmelem(self.bmelem)
         self.bmelem.normal = self.w2l_normal(norm)
+        self.rftarget.touch_bmelem(self.bmelem)
 
     @property
     def co_normal(self):
@@ -263,6 +281,7 @@ class RFVert(BMElemWrapper):
         if not (self.is_valid and f and f.is_valid): return None
         bmv = BMElemWrapper._unwrap(self)
         bmf = BMElemWrapper._unwrap(f)
+        self.rftarget.journal_checkpoint()
         new_bmv = face_vert_separate(bmf, bmv)
         return RFVert(new_bmv)
 
@@ -275,6 +294,7 @@ class RFVert(BMElemWrapper):
         try:
             bmv0 = BMElemWrapper._unwrap(self)
             bmv1 = BMElemWrapper._unwrap(other)
+            self.rftarget.journal_checkpoint()
             vert_splice(bmv1, bmv0)
             return RFVert(bmv0)
         except Exception as e:
@@ -320,6 +340,7 @@ class RFVert(BMElemWrapper):
 
     def dissolve(self):
         bmv = BMElemWrapper._unwrap(self)
+        self.rftarget.journal_checkpoint()
         vert_dissolve(bmv)
 
     def compute_normal(self):
@@ -338,7 +359,9 @@ class RFEdge(BMElemWrapper):
 
     @seam.setter
     def seam(self, v):
+        self.rftarget.journal_bmelem(self.bmelem)
         self.bmelem.seam = v
+        self.rftarget.touch_attributes()
 
     @property
     def smooth(self):
@@ -346,7 +369,9 @@ class RFEdge(BMElemWrapper):
 
     @smooth.setter
     def smooth(self, v):
+        self.rftarget.journal_bmelem(self.bmelem)
         self.bmelem.smooth = v
+        self.rftarget.touch_attributes()
 
     def first_vert(self):
         return RFVert(self.bmelem.verts[0])
@@ -534,6 +559,7 @@ class RFEdge(BMElemWrapper):
     def split(self, vert=None, fac=0.5):
         bme = BMElemWrapper._unwrap(self)
         bmv = BMElemWrapper._unwrap(vert) or bme.verts[0]
+        self.rftarget.journal_checkpoint()
         bme_new, bmv_new = edge_split(bme, bmv, fac)
         return RFEdge(bme_new), RFVert(bmv_new)
 
@@ -541,6 +567,7 @@ class RFEdge(BMElemWrapper):
         bme = BMElemWrapper._unwrap(self)
         bmv0, bmv1 = bme.verts
         del_faces = [f for f in bme.link_faces if len(f.verts) == 3]
+        self.rftarget.journal_checkpoint()
         for bmf in del_faces:
             self.rftarget.bme.faces.remove(bmf)
         bmesh.ops.collapse(self.rftarget.bme, edges=[bme], uvs=True)
@@ -570,7 +597,9 @@ class RFFace(BMElemWrapper):
 
     @material_index.setter
     def material_index(self, v):
+        self.rftarget.journal_bmelem(self.bmelem)
         self.bmelem.material_index = v
+        self.rftarget.touch_attributes()
 
     @property
     def normal(self):
@@ -578,6 +607,7 @@ class RFFace(BMElemWrapper):
 
     @normal.setter
     def normal(self, v):
+        self.rftarget.journal_bmelem(self.bmelem)
         self.bmelem.normal = self.w2l_normal(v)
 
     @property
@@ -586,7 +616,9 @@ class RFFace(BMElemWrapper):
 
     @smooth.setter
     def smooth(self, v):
+        self.rftarget.journal_bmelem(self.bmelem)
         self.bmelem.smooth = v
+        self.rftarget.touch_attributes()
 
     @property
     def edges(self):
@@ -730,6 +762,7 @@ class RFFace(BMElemWrapper):
         verts0, verts1 = list(self.bmelem.verts), list(other.bmelem.verts)
         l = len(verts0)
         assert l == len(verts1), 'RFFaces must have same vert count'
+        self.rftarget.journal_checkpoint()
         self.rftarget.bme.faces.remove(self._unwrap(other))
         offset = min(range(l), key=lambda i: (
             verts1[i].co - verts0[0].co).length)
@@ -758,6 +791,7 @@ class RFFace(BMElemWrapper):
         bmva = BMElemWrapper._unwrap(vert_a)
         bmvb = BMElemWrapper._unwrap(vert_b)
         coords = [BMElemWrapper.w2l_point(c) for c in coords]
+        self.rftarget.journal_checkpoint()
         bmf_new, bml_new = face_split(bmf, bmva, bmvb, coords=coords)
         return RFFace(bmf_new)
 
@@ -801,7 +835,9 @@ class RFFace(BMElemWrapper):
                 continue
             for bmv_old in path[1:-1]:
                 bmv_new,_ = min(((bmv,(bmv.co-bmv_old.co).length) for bmv in nbmf.verts), key=lambda d:d[1])
-                if bmv_old.select: bmv_new.select = True
+                if bmv_old.select:
+                    bmv_new.select = True
+                    self.rftarget.selection_added([bmv_new])
                 bmv_new.merge(bmv_old)
             for bmv in bmf.verts + nbmf.verts:
                 self.rftarget.clean_duplicate_bmedges(bmv)
@@ -104,8 +104,17 @@ class Contours(RFTool, Contours_Ops, Contours_Props, Contours_Utils):
             self.ui_initial_count.disabled = bool(self.sel_edges)
 
         # find verts along selected loops and strings
-        sel_loops = find_loops(self.sel_edges)
-        sel_strings = find_strings(self.sel_edges)
+        # (only reruns on connected components of selection that changed)
+        sel_loops = [
+            loop
+            for loops in self.rfcontext.analyze_topology('contours loops', self.sel_edges, find_loops)
+            for loop in loops
+        ]
+        sel_strings = [
+            string
+            for strings in self.rfcontext.analyze_topology('contours strings', self.sel_edges, find_strings)
+            for string in strings
+        ]
 
         # filter out any loops or strings that are in the middle of a selected patch
         def in_middle(bmvs, is_loop):
@@ -328,7 +337,6 @@ class Contours(RFTool, Contours_Ops, Contours_Props, Contours_Utils):
         self.mousedown = self.rfcontext.actions.mouse
 
         self._timer = self.actions.start_timer(120.0)
-        self.rfcontext.split_target_visualization(verts=[v for vs in self.move_verts for v in vs])
         self.rfcontext.set_accel_defer(True)
 
     @FSM.on_state('rotate plane')
@@ -389,7 +397,6 @@ class Contours(RFTool, Contours_Ops, Contours_Props, Contours_Utils):
     @FSM.on_state('rotate plane', 'exit')
     def rotateplane_exit(self):
         self._timer.done()
-        self.rfcontext.clear_split_target_visualization()
         self.rfcontext.set_accel_defer(False)
         tag_redraw_all('Contours finish rotate')
 
@@ -457,7 +464,6 @@ class Contours(RFTool, Contours_Ops, Contours_Props, Contours_Utils):
             'mousedown': self.actions.mouse,
             'timer': self.actions.start_timer(120.0),
         }
-        self.rfcontext.split_target_visualization(verts=[v for vs in self.move_verts for v in vs])
         self.rfcontext.set_accel_defer(True)
 
 
@@ -534,7 +540,6 @@ class Contours(RFTool, Contours_Ops, Contours_Props, Contours_Utils):
     def grab_exit(self):
         self.grab_opts['timer'].done()
         self.rfcontext.set_accel_defer(False)
-        self.rfcontext.clear_split_target_visualization()
         tag_redraw_all('Contours finish grab')
 
 
@@ -569,7 +574,6 @@ class Contours(RFTool, Contours_Ops, Contours_Props, Contours_Utils):
         self.rotate_start = math.atan2(self.rotate_about.y - self.mousedown.y, self.rotate_about.x - self.mousedown.x)
 
         self._timer = self.actions.start_timer(120.0)
-        self.rfcontext.split_target_visualization(verts=[v for vs in self.move_verts for v in vs])
         self.rfcontext.set_accel_defer(True)
 
     @FSM.on_state('rotate screen')
@@ -641,7 +645,6 @@ class Contours(RFTool, Contours_Ops, Contours_Props, Contours_Utils):
     @FSM.on_state('rotate screen', 'exit')
     def rotatescreen_exit(self):
         self._timer.done()
-        self.rfcontext.clear_split_target_visualization()
         self.rfcontext.set_accel_defer(False)
         tag_redraw_all('Contours finish rotate')
 
@@ -200,7 +200,6 @@ class Knife(RFTool, Knife_Insert):
         self.bmverts_xys = [(bmv, xy) for (bmv, xy) in self.bmverts_xys if bmv and bmv.is_valid and xy]
         self.bmverts = [bmv for (bmv, _) in self.bmverts_xys]
         self.last_delta = None
-        self.rfcontext.split_target_visualization_selected()
         self.rfcontext.set_accel_defer(True)
         self.rfcontext.fast_update_timer.enable(True)
 
@@ -250,7 +249,6 @@ class Knife(RFTool, Knife_Insert):
     def move_exit(self):
         self.rfcontext.fast_update_timer.enable(False)
         self.rfcontext.set_accel_defer(False)
-        self.rfcontext.clear_split_target_visualization()
 
 
     # def _get_edge_quad_verts(self):
@@ -380,7 +380,6 @@ class Loops(RFTool, Loops_Insert):
 
     @FSM.on_state('slide', 'enter')
     def slide_enter(self):
-        self.rfcontext.split_target_visualization_selected()
         self.rfcontext.set_accel_defer(True)
         self.set_widget('hidden' if options['hide cursor on tweak'] else 'hover')
         tag_redraw_all('entering slide')
@@ -422,7 +421,6 @@ class Loops(RFTool, Loops_Insert):
     def slide_exit(self):
         self.rfcontext.fast_update_timer.enable(False)
         self.rfcontext.set_accel_defer(False)
-        self.rfcontext.clear_split_target_visualization()
 
 
     @DrawCallbacks.on_draw('post2d')
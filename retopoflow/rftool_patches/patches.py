@@ -21,6 +21,7 @@ Created by Jonathan Denning, Jonathan Williamson, and Patrick Moore
 
 import os
 import math
+from functools import partial
 from itertools import chain
 
 from ..rftool import RFTool
@@ -414,23 +415,9 @@ class Patches(RFTool):
         }
         self.previz = []
 
-    def _recompute(self):
-        min_angle = options['patches angle']
-        def nearest_sources_Point(p):
-            p,n,i,d = self.rfcontext.nearest_sources_Point(p)
-            return self.rfcontext.clamp_point_to_symmetry(p)
-
-        self._clear_shapes()
-        # remove old corners that are no longer valid or selected
-        self.corners = {v:corner for (v, corner) in self.corners.items() if v.is_valid and v.select}
-
-        ##############################################
-        # find edges that could be part of a strip
-        edges = set(e for e in self.rfcontext.get_selected_edges() if len(e.link_faces) < 2)
-
-
-        ###################
-        # find strips
+    @staticmethod
+    def _find_strips(edges, *, corners, min_angle):
+        ''' returns strips (sets of edges) of edges, and neighboring edges of each edge within its strip '''
         remaining_edges = set(edges)
         strips = []
         neighbors = { e:[] for e in edges }
@@ -445,17 +432,47 @@ class Patches(RFTool):
                 for e in chain(v0.link_edges, v1.link_edges):
                     if e not in remaining_edges: continue
                     bmv1 = edge.shared_vert(e)
-                    if self.corners.get(bmv1, False): continue
+                    if corners.get(bmv1, False): continue
                     bmv0 = edge.other_vert(bmv1)
                     bmv2 = e.other_vert(bmv1)
                     d10 = Direction(bmv0.co-bmv1.co)
                     d12 = Direction(bmv2.co-bmv1.co)
                     angle = math.degrees(math.acos(mid(-1,1,d10.dot(d12))))
-                    if self.corners.get(bmv1, True) and angle < min_angle: continue
+                    if corners.get(bmv1, True) and angle < min_angle: continue
                     neighbors[edge].append(e)
                     neighbors[e].append(edge)
                     working.add(e)
             strips += [strip]
+        return (strips, neighbors)
+
+    def _recompute(self):
+        min_angle = options['patches angle']
+        def nearest_sources_Point(p):
+            p,n,i,d = self.rfcontext.nearest_sources_Point(p)
+            return self.rfcontext.clamp_point_to_symmetry(p)
+
+        self._clear_shapes()
+        # remove old corners that are no longer valid or selected
+        self.corners = {v:corner for (v, corner) in self.corners.items() if v.is_valid and v.select}
+
+        ##############################################
+        # find edges that could be part of a strip
+        edges = set(e for e in self.rfcontext.get_selected_edges() if len(e.link_faces) < 2)
+
+
+        ###################
+        # find strips
+        # (only recomputed for connected components of edges that changed.  strips
+        # depend on angles and on corners, so coords and corners are part of the key)
+        strips = []
+        neighbors = {}
+        corners_key = frozenset(self.corners.items())
+        for (c_strips, c_neighbors) in self.rfcontext.analyze_topology(
+            'patches strips', edges, partial(self._find_strips, corners=self.corners, min_angle=min_angle),
+            coords=True, params=(min_angle, corners_key),
+        ):
+            strips += c_strips
+            neighbors.update(c_neighbors)
 
 
         ##############################################
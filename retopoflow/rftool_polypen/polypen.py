@@ -226,7 +226,6 @@ class PolyPen(RFTool, PolyPen_Insert):
         self.move_vis_accel = self.rfcontext.get_accel_visible(selected_only=False)
         # if not self.move_done_released and options['hide cursor on tweak']: self.set_widget('hidden')
         if options['hide cursor on tweak']: self.set_widget('hidden')
-        self.rfcontext.split_target_visualization_selected()
         self.rfcontext.fast_update_timer.start()
         self.rfcontext.set_accel_defer(True)
         self.last_delta = None
@@ -272,7 +271,6 @@ class PolyPen(RFTool, PolyPen_Insert):
     def move_exit(self):
         self.rfcontext.fast_update_timer.stop()
         self.rfcontext.set_accel_defer(False)
-        self.rfcontext.clear_split_target_visualization()
 
 
 
@@ -119,6 +119,33 @@ class PolyStrips(RFTool, PolyStrips_Props, PolyStrips_Ops):
         bmquads = set(bmf for bmf in self.rfcontext.get_selected_faces() if len(bmf.verts) == 4)
         if not bmquads: return
 
+        # strips are found per connected component of selected quads, and only
+        # recomputed for components that changed (strips fit curves to quads, so coords matter)
+        self.strips = [
+            strip
+            for strips in self.rfcontext.analyze_topology(
+                'polystrips strips', bmquads, self.find_strips,
+                coords=True, params=options['polystrips max strips'],
+            )
+            for strip in strips
+        ]
+        if options['polystrips max strips'] and len(self.strips) > options['polystrips max strips']:
+            self.strips = []
+
+        self.update_strip_viz()
+        if len(self.strips) == 1:
+            self._var_cut_count.set(len(self.strips[0]))
+            self._var_cut_count.disabled = False
+
+        if self.rfcontext.get_last_action() != 'change segment count':
+            self.setup_change_count()
+
+    @staticmethod
+    def find_strips(bmquads):
+        ''' returns list of strips of quads in bmquads '''
+        bmquads = set(bmquads)
+        strips = []
+
         # find junctions at corners
         junctions = set()
         for bmf in bmquads:
@@ -153,23 +180,16 @@ class PolyStrips(RFTool, PolyStrips_Props, PolyStrips_Ops):
                 if len(strip) > 1 and hash_face_pair(bmf0, bmf1) not in touched:
                     touched.add(hash_face_pair(bmf0,bmf1))
                     touched.add(hash_face_pair(bmf1,bmf0))
-                    self.strips.append(RFTool_PolyStrips_Strip(strip))
+                    strips.append(RFTool_PolyStrips_Strip(strip))
 
             if not edge0: add_strip(bme0)
             if not edge1: add_strip(bme1)
             if not edge2: add_strip(bme2)
             if not edge3: add_strip(bme3)
-            if options['polystrips max strips'] and len(self.strips) > options['polystrips max strips']:
-                self.strips = []
+            if options['polystrips max strips'] and len(strips) > options['polystrips max strips']:
                 break
 
-        self.update_strip_viz()
-        if len(self.strips) == 1:
-            self._var_cut_count.set(len(self.strips[0]))
-            self._var_cut_count.disabled = False
-
-        if self.rfcontext.get_last_action() != 'change segment count':
-            self.setup_change_count()
+        return strips
 
     @profiler.function
     def update_strip_viz(self):
@@ -295,7 +315,6 @@ class PolyStrips(RFTool, PolyStrips_Props, PolyStrips_Ops):
         self.set_widget('hidden' if options['hide cursor on tweak'] else 'move')
 
         self._timer = self.actions.start_timer(120.0)
-        self.rfcontext.split_target_visualization(verts=self.rfcontext.get_selected_verts())
         self.rfcontext.set_accel_defer(True)
 
 
@@ -334,7 +353,6 @@ class PolyStrips(RFTool, PolyStrips_Props, PolyStrips_Ops):
     @FSM.on_state('move handle', 'exit')
     def movehandle_exit(self):
         self._timer.done()
-        self.rfcontext.clear_split_target_visualization()
         self.rfcontext.set_accel_defer(False)
         self.update_target(force=True)
         tag_redraw_all('PolyStrips done moving handles')
@@ -380,7 +398,6 @@ class PolyStrips(RFTool, PolyStrips_Props, PolyStrips_Ops):
         self.set_widget('hidden' if options['hide cursor on tweak'] else 'move')
 
         self._timer = self.actions.start_timer(120.0)
-        self.rfcontext.split_target_visualization(verts=self.rfcontext.get_selected_verts())
         self.rfcontext.set_accel_defer(True)
 
     @FSM.on_state('rotate')
@@ -419,7 +436,6 @@ class PolyStrips(RFTool, PolyStrips_Props, PolyStrips_Ops):
     def rotate_exit(self):
         self._timer.done()
         self.rfcontext.set_accel_defer(False)
-        self.rfcontext.clear_split_target_visualization()
         self.update_target(force=True)
 
 
@@ -488,7 +504,6 @@ class PolyStrips(RFTool, PolyStrips_Props, PolyStrips_Ops):
         self.set_widget('hidden' if options['hide cursor on tweak'] else 'default') # None
 
         self._timer = self.actions.start_timer(120.0)
-        self.rfcontext.split_target_visualization(verts=self.rfcontext.get_selected_verts())
         self.rfcontext.set_accel_defer(True)
 
 
@@ -526,7 +541,6 @@ class PolyStrips(RFTool, PolyStrips_Props, PolyStrips_Ops):
     def scale_exit(self):
         self._timer.done()
         self.rfcontext.set_accel_defer(False)
-        self.rfcontext.clear_split_target_visualization()
         self.update_target(force=True)
 
 
@@ -550,7 +564,6 @@ class PolyStrips(RFTool, PolyStrips_Props, PolyStrips_Ops):
             'move_cancelled': 'cancel',
             'timer': self.actions.start_timer(120.0),
         }
-        self.rfcontext.split_target_visualization_selected()
         self.rfcontext.set_accel_defer(True)
         self.set_widget('hidden' if options['hide cursor on tweak'] else 'default')  # None
 
@@ -571,10 +584,10 @@ class PolyStrips(RFTool, PolyStrips_Props, PolyStrips_Ops):
         if self.actions.mousemove or not self.actions.mousemove_prev: return
 
         delta = Vec2D(self.actions.mouse - opts['mousedown'])
-        set2D_vert = self.rfcontext.set2D_vert
-        for bmv,xy in self.bmverts:
-            if not bmv.is_valid: continue
-            set2D_vert(bmv, xy + delta)
+        self.rfcontext.snap_verts(
+            [ bmv for (bmv, _) in self.bmverts ],
+            'raycast', xys=[ xy + delta for (_, xy) in self.bmverts ],
+        )
         self.rfcontext.update_verts_faces(v for v,_ in self.bmverts)
         self.rfcontext.dirty()
         #self.update()
@@ -583,7 +596,6 @@ class PolyStrips(RFTool, PolyStrips_Props, PolyStrips_Ops):
     def moveall_exit(self):
         self.moveall_opts['timer'].done()
         self.rfcontext.set_accel_defer(False)
-        self.rfcontext.clear_split_target_visualization()
         self.update_target(force=True)
 
 
@@ -21,6 +21,10 @@ Created by Jonathan Denning, Jonathan Williamson, and Patrick Moore
 
 import math
 import time
+
+import numpy as np
+
+from .relax_packed import RelaxSubmesh, relax_forces
 from ..rftool import RFTool
 from ..rfwidgets.rfwidget_default import RFWidget_Default_Factory
 from ..rfwidgets.rfwidget_brushfalloff import RFWidget_BrushFalloff_Factory
@@ -30,7 +34,6 @@ from ...addon_common.common.maths import (
     Point, Point2D,
     Direction,
     Color,
-    closest_point_segment,
 )
 from ...addon_common.common.blender import tag_redraw_all
 from ...addon_common.common.boundvar import BoundBool, BoundInt, BoundFloat, BoundString
@@ -225,7 +228,6 @@ class Relax(RFTool):
         is_bmvert_hidden = lambda bmv: not is_visible(bmv.co, bmv.normal)
 
         self._bmverts = []
-        self._boundary = []
         for bmv in self.rfcontext.iter_verts():
             if self.sel_only and not bmv.select: continue
             if opt_mask_boundary == 'exclude' and bmv.is_on_boundary(): continue
@@ -237,18 +239,15 @@ class Relax(RFTool):
 
         print(f'Relax {len(self._bmverts)} bmverts')
 
-        if opt_mask_boundary == 'slide':
-            # find all boundary edges
-            self._boundary = [(bme.verts[0].co, bme.verts[1].co) for bme in self.rfcontext.iter_edges() if not bme.is_manifold]
+        # index all boundary edges
+        self._boundary = self.rfcontext.get_accel_boundary() if opt_mask_boundary == 'slide' else None
 
         # print(f'Relaxing max of {len(self._bmverts)} bmverts')
         self._timer = self.actions.start_timer(120)
-        self.rfcontext.split_target_visualization(verts=self._bmverts)
 
     @FSM.on_state('relax', 'exit')
     def relax_exit(self):
         self.rfcontext.update_verts_faces(self._bmverts)
-        self.rfcontext.clear_split_target_visualization()
         self._timer.done()
 
     @FSM.on_state('relax')
@@ -303,6 +302,12 @@ class Relax(RFTool):
         strength = (5.0 / opt_steps) * self.rfwidgets['brushstroke'].strength * time_delta
         radius = self.rfwidgets['brushstroke'].get_scaled_radius()
 
+        if options['relax backend'] == 'packed':
+            self.relax_packed(verts, vert_strength, strength, radius)
+            self.rfcontext.dirty()
+            tag_redraw_all('Relax new frame')
+            return
+
         # capture all verts involved in relaxing
         chk_verts = set(verts)
         chk_verts.update(self.rfcontext.get_edges_verts(edges))
@@ -438,14 +443,10 @@ class Relax(RFTool):
                     snap_to_symmetry = self.rfcontext.symmetry_planes_for_point(bmv.co)
                     co = self.rfcontext.snap_to_symmetry(co, snap_to_symmetry)
 
-                if opt_mask_boundary == 'slide' and bmv.is_on_boundary():
-                    p, d = None, None
-                    for (v0, v1) in self._boundary:
-                        p_ = closest_point_segment(co, v0, v1)
-                        d_ = (p_ - co).length
-                        if p is None or d_ < d: p, d = p_, d_
+                if opt_mask_boundary == 'slide' and self._boundary and bmv.is_on_boundary():
+                    p, _, _ = self._boundary.nearest(co)
                     if p is not None:
-                        co = p
+                        co = Point(p)
 
                 bmv.co = co
                 self.rfcontext.snap_vert(bmv)
@@ -454,3 +455,57 @@ class Relax(RFTool):
 
         self.rfcontext.dirty()
         tag_redraw_all('Relax new frame')
+
+    @profiler.function
+    def relax_packed(self, verts, vert_strength, strength, radius):
+        '''
+        same as the BMesh backend of relax_doit, but forces are computed with
+        vectorized operations on the packed brush-local submesh
+        '''
+        if options['relax algorithm'] != '3D': return
+
+        opt_mask_boundary   = options['relax mask boundary']
+        opt_mask_symmetry   = options['relax mask symmetry']
+        opt_mult            = options['relax force multiplier']
+        opt_forces = {
+            'edge_length':     options['relax edge length'],
+            'face_radius':     options['relax face radius'],
+            'face_sides':      options['relax face sides'],
+            'face_angles':     options['relax face angles'],
+            'correct_flipped': options['relax correct flipped faces'],
+            'straight_edges':  options['relax straight edges'],
+        }
+
+        sub = RelaxSubmesh(verts, vert_strength, self.rfcontext.rftarget.xform, with_flipped=opt_forces['correct_flipped'])
+        vert_mult = opt_mult * sub.strength
+
+        for step in range(options['relax steps']):
+            displace = relax_forces(sub, strength, **opt_forces)
+            rows = np.flatnonzero(np.any(displace != 0, axis=1))
+            if len(rows) <= 1: continue
+
+            # limit the max displacement
+            displace = displace[rows] * vert_mult[rows, None]
+            displace_max = np.linalg.norm(displace, axis=1).max()
+            mult = (radius * 0.125 / displace_max) if displace_max > radius * 0.125 else 1.0
+            cos = sub.co[rows] + displace * mult
+
+            # update
+            moved = [sub.verts[i] for i in rows.tolist()]
+            points = []
+            for bmv, co in zip(moved, cos.tolist()):
+                co = Point(co)
+
+                if opt_mask_symmetry == 'maintain' and bmv.is_on_symmetry_plane():
+                    snap_to_symmetry = self.rfcontext.symmetry_planes_for_point(bmv.co)
+                    co = self.rfcontext.snap_to_symmetry(co, snap_to_symmetry)
+
+                if opt_mask_boundary == 'slide' and self._boundary and bmv.is_on_boundary():
+                    p, _, _ = self._boundary.nearest(co)
+                    if p is not None:
+                        co = Point(p)
+
+                points.append(co)
+            self.rfcontext.snap_verts(moved, 'nearest', points=points)
+            sub.refresh(rows)
+            self.rfcontext.update_verts_faces(moved)
@@ -0,0 +1,210 @@
+'''
+Copyright (C) 2023 CG Cookie
+http://cgcookie.com
+hello@cgcookie.com
+
+Created by Jonathan Denning, Jonathan Williamson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+import math
+
+import numpy as np
+
+from ..rfmesh.rfmesh_snapshot import gather_co, gather_normal, xform_points
+
+from ...addon_common.common.profiler import profiler
+
+
+'''
+Packed (vectorized) backend of the Relax solver.
+
+RelaxSubmesh packs the verts under the brush along with their one-ring into
+index arrays once per frame.  Rows [0, nmove) are the verts under the brush,
+which are the only verts that receive forces; the remaining rows are their
+neighbors.  Edges are the link edges of the brushed verts, stored as (E,2)
+row pairs.  Faces are the link faces of the brushed verts, stored in a padded
+(F,S) table of rows, where S is the largest face size.  Padded entries repeat
+the first vert of the face and are masked out.
+
+relax_forces evaluates the same forces as Relax.relax_3d, but for all
+elements at once.
+
+NOTE: forces only depend on elements incident to the brushed verts, so
+      unlike the BMesh backend the submesh does not need the two-ring of
+      verts (chk_verts) and their link edges and faces.
+'''
+
+
+class RelaxSubmesh:
+    @profiler.function
+    def __init__(self, verts, vert_strength, xform, *, with_flipped=False):
+        '''
+        verts is list of (wrapped) verts under the brush, vert_strength maps
+        each to its brush strength.  set with_flipped to gather what is needed
+        to correct flipped faces (vert normals and edge-face adjacency)
+        '''
+        self.xform = xform
+        self.verts = list(verts)
+        self.nmove = len(self.verts)
+        self.strength = np.array([vert_strength[v] for v in self.verts], dtype=np.float64)
+
+        bmvs = [v.bmelem for v in self.verts]
+        rows = { bmv: i for (i, bmv) in enumerate(bmvs) }
+        def row(bmv):
+            i = rows.get(bmv)
+            if i is None:
+                i = rows[bmv] = len(bmvs)
+                bmvs.append(bmv)
+            return i
+
+        bmes = list({ bme for bmv in bmvs[:self.nmove] for bme in bmv.link_edges })
+        bmfs = list({ bmf for bmv in bmvs[:self.nmove] for bmf in bmv.link_faces })
+        self.edges = np.array([(row(bme.verts[0]), row(bme.verts[1])) for bme in bmes], dtype=np.int64).reshape((-1, 2))
+
+        sides = np.array([len(bmf.verts) for bmf in bmfs], dtype=np.int64)
+        nsides = int(sides.max()) if len(sides) else 0
+        self.face_sides = sides
+        self.face_mask = np.arange(nsides)[None, :] < sides[:, None]
+        self.faces = np.array([
+            [row(bmv) for bmv in bmf.verts] + [row(bmf.verts[0])] * (nsides - len(bmf.verts))
+            for bmf in bmfs
+        ], dtype=np.int64).reshape((-1, nsides))
+        # next corner of each corner (wrapping at the face size, not at the padded size)
+        cols = np.arange(nsides)[None, :]
+        self.face_next = np.take_along_axis(self.faces, (cols + 1) % np.maximum(sides, 1)[:, None], axis=1) if nsides else self.faces
+        self.face_prev = np.take_along_axis(self.faces, (cols - 1) % np.maximum(sides, 1)[:, None], axis=1) if nsides else self.faces
+
+        self.bmverts = bmvs
+        self.is_boundary = np.array([bmv.is_boundary for bmv in bmvs[:self.nmove]], dtype=bool)
+
+        self.edge_faces = None
+        if with_flipped:
+            face_rows = { bmf: i for (i, bmf) in enumerate(bmfs) }
+            self.edge_faces = np.array([
+                [face_rows[bmf] for bmf in bme.link_faces] if len(bme.link_faces) == 2 else [-1, -1]
+                for bme in bmes
+            ], dtype=np.int64).reshape((-1, 2))
+
+        self.co_local = gather_co(bmvs, len(bmvs))
+        self.normal = gather_normal(bmvs, len(bmvs)) if with_flipped else None
+        self.co = xform_points(xform.mx_p, self.co_local)
+
+    def __len__(self):
+        return len(self.bmverts)
+
+    def refresh(self, rows):
+        ''' re-gathers coordinates (and normals) of given rows, ex: after writing back and snapping '''
+        if not len(rows): return
+        bmvs = [self.bmverts[i] for i in rows]
+        self.co_local[rows] = gather_co(bmvs, len(bmvs))
+        self.co[rows] = xform_points(self.xform.mx_p, self.co_local[rows])
+        if self.normal is not None:
+            self.normal[rows] = gather_normal(bmvs, len(bmvs))
+
+
+def _normalized(v):
+    l = np.linalg.norm(v, axis=-1, keepdims=True)
+    return v / np.where(l > 0, l, 1.0)
+
+def _accumulate(force, rows, f, mask=None):
+    if mask is not None: rows, f = rows[mask], f[mask]
+    np.add.at(force, rows.reshape(-1), f.reshape((-1, 3)))
+
+@profiler.function
+def relax_forces(sub, strength, *, edge_length=True, face_radius=True, face_sides=False, face_angles=True, correct_flipped=False, straight_edges=True):
+    '''
+    returns (nmove,3) array of forces on brushed verts of RelaxSubmesh sub,
+    matching Relax.relax_3d
+    '''
+    co = sub.co
+    force = np.zeros_like(co)
+    e0, e1 = sub.edges[:, 0], sub.edges[:, 1]
+
+    if edge_length and len(sub.edges):
+        # push edges closer to average edge length
+        vec = co[e1] - co[e0]
+        edge_len = np.linalg.norm(vec, axis=1)
+        f = vec * (0.1 * (edge_len.mean() - edge_len) * strength)[:, None]
+        _accumulate(force, e0, -f)
+        _accumulate(force, e1, f)
+
+    fv, fn, mask, sides = sub.faces, sub.face_next, sub.face_mask, sub.face_sides
+    nfaces = len(fv)
+    if nfaces:
+        cnt = sides.astype(np.float64)
+        ctr = (co[fv] * mask[:, :, None]).sum(axis=1) / cnt[:, None]
+        rels = co[fv] - ctr[:, None, :]
+        rel_len = np.linalg.norm(rels, axis=2)
+
+    if correct_flipped and nfaces and len(sub.edges):
+        # push verts if neighboring faces seem flipped (still WiP!)
+        cl = sub.co_local
+        an = np.cross(cl[sub.face_prev] - cl[fv], cl[fn] - cl[fv])
+        an = (an * mask[:, :, None]).sum(axis=1)
+        flipped = ((np.einsum('fsi,fi->fs', sub.normal[fv], an) <= 0) & mask).any(axis=1)
+        ef = sub.edge_faces
+        valid = ef[:, 0] >= 0
+        fl0 = np.where(valid, flipped[ef[:, 0]], False)
+        fl1 = np.where(valid, flipped[ef[:, 1]], False)
+        use = valid & (fl0 != fl1)
+        other = np.where(fl0, ef[:, 1], ef[:, 0])[use]
+        vec = (ctr[other] - (co[e0[use]] + co[e1[use]]) / 2) * (strength * 5)
+        _accumulate(force, e0[use], vec)
+        _accumulate(force, e1[use], vec)
+
+    if straight_edges and len(sub.edges):
+        # push verts to straighten edges (still WiP!)
+        total = np.zeros_like(co)
+        _accumulate(total, e0, co[e1])
+        _accumulate(total, e1, co[e0])
+        degree = np.bincount(sub.edges.reshape(-1), minlength=len(co))[:sub.nmove]
+        use = ~sub.is_boundary & (degree > 0)
+        center = total[:sub.nmove][use] / degree[use][:, None]
+        force[:sub.nmove][use] += (center - co[:sub.nmove][use]) * 0.1
+
+    if nfaces and face_radius:
+        # push verts toward average dist from verts to face center
+        avg_rel_len = (rel_len * mask).sum(axis=1) / cnt
+        f = rels * ((avg_rel_len[:, None] - rel_len) * strength * 2)[:, :, None]
+        _accumulate(force, fv, f, mask)
+
+    if nfaces and face_sides:
+        # push verts toward equal edge lengths
+        vec = co[fn] - co[fv]
+        edge_len = np.linalg.norm(vec, axis=2)
+        avg_face_edge_len = (edge_len * mask).sum(axis=1) / cnt
+        f = vec * (((avg_face_edge_len[:, None] - edge_len) * strength) / np.where(edge_len > 0, edge_len, 1.0))[:, :, None]
+        _accumulate(force, fv, f * -0.5, mask)
+        _accumulate(force, fn, f * 0.5, mask)
+
+    if nfaces and face_angles:
+        # push verts toward equal spread
+        cols = np.arange(fv.shape[1])[None, :]
+        rel0, len0 = rels, rel_len
+        rel1 = np.take_along_axis(rels, ((cols + 1) % sides[:, None])[:, :, None], axis=1)
+        len1 = np.take_along_axis(rel_len, (cols + 1) % sides[:, None], axis=1)
+        use = mask & (len0 >= 0.00001) & (len1 >= 0.00001)
+        vec = co[fn] - co[fv]
+        fvec0 = _normalized(np.cross(np.cross(rel0, vec), rel0))
+        fvec1 = _normalized(np.cross(rel1, np.cross(rel1, vec)))
+        cos = np.einsum('fsi,fsi->fs', rel0, rel1) / np.where(use, len0 * len1, 1.0)
+        angle = np.arccos(np.clip(cos, -1.0, 1.0))
+        avg_angle = 2.0 * math.pi / cnt
+        f_mag = (0.05 * (avg_angle[:, None] - angle) * strength) / cnt[:, None]
+        _accumulate(force, fv, fvec0 * -f_mag[:, :, None], use)
+        _accumulate(force, fn, fvec1 * -f_mag[:, :, None], use)
+
+    return force[:sub.nmove]
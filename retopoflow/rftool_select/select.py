@@ -194,7 +194,6 @@ class Select(RFTool):
                 symmetry=False,
             )
 
-        self.rfcontext.split_target_visualization_selected()
         self.rfcontext.fast_update_timer.start()
         self.rfcontext.set_accel_defer(True)
 
@@ -234,5 +233,4 @@ class Select(RFTool):
     def move_exit(self):
         self.rfcontext.set_accel_defer(False)
         self.rfcontext.fast_update_timer.stop()
-        self.rfcontext.clear_split_target_visualization()
 
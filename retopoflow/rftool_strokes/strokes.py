@@ -380,7 +380,6 @@ class Strokes(RFTool, Strokes_Insert):
         self.vis_bmverts = [(bmv, Point_to_Point2D(bmv.co)) for bmv in vis_verts if bmv.is_valid and bmv not in sel_verts]
         self.mousedown = self.rfcontext.actions.mouse
         self.defer_recomputing = True
-        self.rfcontext.split_target_visualization_selected()
         self.rfcontext.set_accel_defer(True)
         self._timer = self.actions.start_timer(120)
 
@@ -433,5 +432,4 @@ class Strokes(RFTool, Strokes_Insert):
     def move_exit(self):
         self._timer.done()
         self.rfcontext.set_accel_defer(False)
-        self.rfcontext.clear_split_target_visualization()
 
@@ -19,6 +19,8 @@ Created by Jonathan Denning, Jonathan Williamson, and Patrick Moore
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
+import numpy as np
+
 from ..rftool import RFTool
 from ..rfwidgets.rfwidget_default import RFWidget_Default_Factory
 from ..rfwidgets.rfwidget_brushfalloff import RFWidget_BrushFalloff_Factory
@@ -32,7 +34,7 @@ from ...addon_common.common.drawing import (
 
 from ...addon_common.common.boundvar import BoundBool, BoundInt, BoundFloat, BoundString
 from ...addon_common.common.profiler import profiler
-from ...addon_common.common.maths import Point, Point2D, Vec2D, Color, closest_point_segment
+from ...addon_common.common.maths import Point, Point2D, Vec2D, Color
 from ...addon_common.common.fsm import FSM
 from ...addon_common.common.globals import Globals
 from ...addon_common.common.utils import iter_pairs, delay_exec
@@ -170,16 +172,12 @@ class Tweak(RFTool):
             for bmv in self.bmverts
         ]
 
-        if opt_mask_boundary == 'slide':
-            self._boundary = [(bme.verts[0].co, bme.verts[1].co) for bme in self.rfcontext.iter_edges() if not bme.is_manifold]
-        else:
-            self._boundary = []
+        self._boundary = self.rfcontext.get_accel_boundary() if opt_mask_boundary == 'slide' else None
 
         self.bmfaces = set([f for bmv,_ in nearest for f in bmv.link_faces])
         self.mousedown = self.rfcontext.actions.mouse
         self._timer = self.actions.start_timer(120.0)
 
-        self.rfcontext.split_target_visualization(verts=self.bmverts)
         self.rfcontext.undo_push('tweak move')
 
     @FSM.on_state('move')
@@ -204,34 +202,37 @@ class Tweak(RFTool):
         opt_mask_boundary = options['tweak mask boundary']
 
         delta = Vec2D(self.rfcontext.actions.mouse - self.mousedown)
-        set2D_vert = self.rfcontext.set2D_vert
-        snap_vert = self.rfcontext.snap_vert
         update_face_normal = self.rfcontext.update_face_normal
 
-        for (bmv, sympl, xy, xyz, strength) in self.bmvert_data:
-            if not bmv.is_valid: continue
-            co2D = xy + delta * strength
+        data = [ d for d in self.bmvert_data if d[0].is_valid ]
+        if data:
+            bmvs     = [ bmv for (bmv, _, _, _, _) in data ]
+            sympls   = [ sympl for (_, sympl, _, _, _) in data ]
+            co2Ds    = np.array([ tuple(xy + delta * strength) for (_, _, xy, _, strength) in data ], dtype=np.float64)
             match options['tweak mode']:
                 case 'snap':
-                    dist = self.rfcontext.Point_to_depth(xyz)
-                    bmv.co = self.rfcontext.Point2D_to_Point(co2D, dist)
-                    snap_vert(bmv, snap_to_symmetry=sympl)
+                    # move each vert within plane parallel to view at its original depth, then snap to nearest
+                    xyzs = np.array([ tuple(xyz) for (_, _, _, xyz, _) in data ], dtype=np.float64)
+                    xys, valid = self.rfcontext.Points_to_Point2Ds(xyzs)
+                    origins, _ = self.rfcontext.Point2Ds_to_Rays(xys)
+                    depths = np.linalg.norm(xyzs - origins, axis=1)
+                    origins, directions = self.rfcontext.Point2Ds_to_Rays(co2Ds)
+                    points = np.where(valid[:, None], origins + directions * depths[:, None], xyzs)
+                    self.rfcontext.snap_verts(bmvs, 'nearest', points=points, symmetry=sympls)
                 case 'raycast':
-                    set2D_vert(bmv, co2D, sympl)
+                    self.rfcontext.snap_verts(bmvs, 'raycast', xys=co2Ds, symmetry=sympls)
                 case _:
                     assert False, f'Invalid tweak mode {options["tweak mode"]}'
 
-
-            if opt_mask_boundary == 'slide' and bmv.is_on_boundary():
-                co = bmv.co
-                p, d = None, None
-                for (v0, v1) in self._boundary:
-                    p_ = closest_point_segment(co, v0, v1)
-                    d_ = (p_ - co).length
-                    if p is None or d_ < d: p, d = p_, d_
-                if p is not None:
-                    bmv.co = p
-                    self.rfcontext.snap_vert(bmv)
+            if opt_mask_boundary == 'slide' and self._boundary:
+                slide, points = [], []
+                for bmv in bmvs:
+                    if not bmv.is_on_boundary(): continue
+                    p, _, _ = self._boundary.nearest(bmv.co)
+                    if p is None: continue
+                    slide.append(bmv)
+                    points.append(p)
+                if slide: self.rfcontext.snap_verts(slide, 'nearest', points=points)
 
         for bmf in self.bmfaces:
             if not bmf.is_valid: continue
@@ -241,5 +242,4 @@ class Tweak(RFTool):
 
     @FSM.on_state('move', 'exit')
     def move_exit(self):
-        self.rfcontext.clear_split_target_visualization()
         self._timer.done()
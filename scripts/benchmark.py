@@ -0,0 +1,311 @@
+#!/usr/bin/python3
+
+'''
+Headless benchmark of RetopoFlow hot paths on synthetic meshes.
+
+    blender -b --factory-startup --python scripts/benchmark.py -- --faces 10000 100000
+    blender -b --factory-startup --python scripts/benchmark.py -- --faces 1000000 -o bench.json
+    blender -b --factory-startup --python scripts/benchmark.py -- --baseline bench.json --tolerance 0.2
+
+Runs in Blender's background mode (no GPU, no 3D View).  For each size, a UV
+sphere source and a slightly larger UV sphere target are built with bmesh, and
+the 3D View is replaced by a VisibilityView (see rfmesh/rfmesh_visibility.py)
+looking down at both.  Reports the median time (seconds) of each stage as
+JSON.  With --baseline, exits with status 1 if any stage is slower than the
+baseline by more than the tolerance.
+'''
+
+import os
+import sys
+import copy
+import json
+import math
+import time
+import argparse
+import statistics
+import importlib
+import importlib.util
+from queue import Queue
+
+import numpy as np
+
+import bpy
+import bmesh
+from mathutils import Matrix, Vector
+
+# load addon under a fixed name, so this works no matter what the addon folder is called.
+# addon skips registration in background mode, so only the modules are loaded
+path_root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+spec = importlib.util.spec_from_file_location('retopoflow_benchmark', os.path.join(path_root, '__init__.py'), submodule_search_locations=[path_root])
+addon = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = addon
+spec.loader.exec_module(addon)
+
+def load(name): return importlib.import_module(f'{spec.name}.{name}')
+rfmesh_module  = load('retopoflow.rfmesh.rfmesh')
+rfmesh_render  = load('retopoflow.rfmesh.rfmesh_render')
+rfmesh_vis     = load('retopoflow.rfmesh.rfmesh_visibility')
+relax_packed   = load('retopoflow.rftool_relax.relax_packed')
+maths          = load('addon_common.common.maths')
+maths_accel    = load('addon_common.common.maths_accel')
+options        = load('config.options').options
+
+RFSource, RFTarget = rfmesh_module.RFSource, rfmesh_module.RFTarget
+RFMeshRender = rfmesh_render.RFMeshRender
+VisibilityView = rfmesh_vis.VisibilityView
+RelaxSubmesh, relax_forces = relax_packed.RelaxSubmesh, relax_packed.relax_forces
+Accel2D = maths_accel.Accel2D
+Point, Point2D, Direction, Normal, Ray, Plane = maths.Point, maths.Point2D, maths.Direction, maths.Normal, maths.Ray, maths.Plane
+
+
+stages = [
+    'source setup',         # RFSource.new (RFMesh.__setup__ or packed setup)
+    'target setup',         # RFTarget.new (RFMesh.__setup__)
+    'target deepcopy',      # RFTarget.__deepcopy__
+    'accel2d build',        # Accel2D.__init__ over all target geometry
+    'accel2d get',          # Accel2D.get at a grid of screen positions
+    'is_vis',               # RFMesh._gen_is_vis over all target verts, with occlusion test against source
+    'render gather',        # RFMeshRender._gather_data of target (GPU upload skipped)
+    'relax',                # packed relax of one brush stroke frame (RelaxSubmesh + relax_forces)
+    'plane crawl',          # RFSource.plane_intersection_crawl with walk to plane
+]
+
+
+##########################################################
+# synthetic scene
+
+view_width, view_height = 1920, 1080
+view_distance = 4.0
+
+def new_view():
+    ''' perspective view from (0,0,view_distance) looking down -Z at origin '''
+    fov, near, far = math.radians(50), 0.1, 100.0
+    aspect = view_width / view_height
+    f = 1.0 / math.tan(fov / 2)
+    proj = Matrix((
+        (f / aspect, 0, 0, 0),
+        (0, f, 0, 0),
+        (0, 0, (far + near) / (near - far), (2 * far * near) / (near - far)),
+        (0, 0, -1, 0),
+    ))
+    view = Matrix.Translation((0, 0, -view_distance))
+    return VisibilityView(proj @ view, view, True, view_width, view_height)
+
+def new_uvsphere(name, faces, radius):
+    ''' returns mesh object of UV sphere with about faces faces '''
+    v = max(3, round(math.sqrt(faces / 2)))
+    bme = bmesh.new()
+    bmesh.ops.create_uvsphere(bme, u_segments=2*v, v_segments=v, radius=radius)
+    me = bpy.data.meshes.new(name)
+    bme.to_mesh(me)
+    bme.free()
+    obj = bpy.data.objects.new(name, me)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+def remove_object(obj):
+    me = obj.data
+    bpy.data.objects.remove(obj)
+    bpy.data.meshes.remove(me)
+
+def new_render(rfmesh):
+    '''
+    RFMeshRender.__init__ needs the drawing context (GPU buffers, DPI), which does
+    not exist in background mode, so only the parts used by _gather_data are set up.
+    gathered chunk data is dropped rather than uploaded to the GPU
+    '''
+    render = RFMeshRender.__new__(RFMeshRender)
+    render.async_load = False
+    render.always_dirty = False
+    render.load_verts = render.load_edges = render.load_faces = True
+    render.buf_data_queue = Queue()
+    render.buffered_renders_static = []
+    render.replace_rfmesh(rfmesh)
+    render._set_chunk_data = lambda chunk, data: None
+    return render
+
+
+##########################################################
+# timing
+
+def run_stage(fn, *, setup=None, repeat=5, warmup=1):
+    ''' returns median time of fn(setup()) over repeat runs, after warmup runs '''
+    times = []
+    for i in range(warmup + repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg)
+        elapsed = time.perf_counter() - start
+        if i >= warmup: times.append(elapsed)
+        del arg
+    return statistics.median(times)
+
+def run_size(source_faces, target_faces, args):
+    view = new_view()
+    fwd = view.forward()
+    obj_source = new_uvsphere('Benchmark Source', source_faces, 1.0)
+    obj_target = new_uvsphere('Benchmark Target', target_faces, 1.01)
+    bpy.context.view_layer.objects.active = obj_target     # RFTarget adds modifiers with bpy.ops
+    results = {}
+
+    def stage(name, fn, **kwargs):
+        if args.stages and name not in args.stages: return
+        results[name] = run_stage(fn, repeat=args.repeat, warmup=args.warmup, **kwargs)
+        print(f'  {name:20s} {results[name]*1000:10.2f}ms')
+
+    stage('source setup', lambda _: RFSource.new(obj_source))
+    stage('target setup', lambda _: RFTarget.new(obj_target, 1.0))
+
+    rfsource = RFSource.new(obj_source)
+    rftarget = RFTarget.new(obj_target, 1.0)
+    stage('target deepcopy', lambda _: copy.deepcopy(rftarget))
+
+    # stand-ins for RetopoFlow_Spaces / RetopoFlow_Target projections (no symmetry)
+    def Point_to_Point2Ds(co, normal):
+        xy, valid = view.project(np.array(co, dtype=np.float64))
+        if not valid[0] or not view.in_area(xy)[0] or np.dot(normal, fwd) > 0: return []
+        return [Point2D(xy[0])]
+    def project2D(co, normal):
+        xy, valid = view.project(co)
+        valid &= view.in_area(xy) & (normal @ fwd <= 0)
+        return (xy[:, None, :], valid[:, None])
+
+    verts = rftarget.get_verts()
+    edges = rftarget.get_edges()
+    rffaces = [rftarget._wrap_bmface(bmf) for bmf in rftarget.bme.faces if bmf.is_valid and not bmf.hide]
+    new_accel = lambda _: Accel2D('benchmark', verts, edges, rffaces, Point_to_Point2Ds, project2D=project2D)
+    stage('accel2d build', new_accel)
+
+    accel = new_accel(None)
+    queries = [
+        Point2D((view_width * (i + 0.5) / 16, view_height * (j + 0.5) / 9))
+        for i in range(16) for j in range(9)
+    ]
+    stage('accel2d get', lambda _: [accel.get(q, 15) for q in queries])
+
+    # stand-in for RetopoFlow_Sources.gen_is_visible (synthetic objects have identity transforms)
+    bvh = rfsource.get_bvh()
+    clip_start = 0.1
+    max_dist_offset = 2.0 * options['visible bbox factor'] + options['visible dist offset']
+    def is_visible(point, normal=None):
+        xy, valid = view.project(np.array(point, dtype=np.float64))
+        if not valid[0] or not view.in_area(xy)[0]: return False
+        if normal and np.dot(normal, fwd) > 0: return False
+        o, d, dist = view.rays_to(np.array([point], dtype=np.float64), xy)
+        o, d = Vector(o[0]), Vector(d[0])
+        hit, _, _, _ = bvh.ray_cast(o + d * clip_start, d, dist[0] - clip_start - max_dist_offset)
+        return hit is None
+    def count_visible(_):
+        is_vis = rftarget._gen_is_vis(is_visible)
+        return sum(1 for bmv in rftarget.bme.verts if is_vis(bmv))
+    stage('is_vis', count_visible)
+
+    rfcopy = copy.deepcopy(rftarget)
+    render = new_render(rfcopy)
+    def gather_render():
+        render.dirty()
+        return render
+    stage('render gather', lambda render: render._gather_data(), setup=gather_render)
+    del render, rfcopy
+
+    # one frame of brushing the top of the target
+    radius = 0.25
+    rftarget.bme.verts.ensure_lookup_table()
+    center = np.array((0, 0, 1.01))
+    co = np.array([tuple(bmv.co) for bmv in rftarget.bme.verts], dtype=np.float64)
+    dist = np.linalg.norm(co - center, axis=1)
+    brushed = [rftarget._wrap_bmvert(rftarget.bme.verts[i]) for i in np.flatnonzero(dist < radius).tolist()]
+    vert_strength = { v: 1.0 - float(d) / radius for (v, d) in zip(brushed, dist[dist < radius].tolist()) }
+    steps = options['relax steps']
+    strength = (5.0 / steps) * 0.5 / 60     # brush strength 0.5, one 60 Hz frame
+    forces = {
+        'edge_length':     options['relax edge length'],
+        'face_radius':     options['relax face radius'],
+        'face_sides':      options['relax face sides'],
+        'face_angles':     options['relax face angles'],
+        'correct_flipped': options['relax correct flipped faces'],
+        'straight_edges':  options['relax straight edges'],
+    }
+    def relax(_):
+        sub = RelaxSubmesh(brushed, vert_strength, rftarget.xform, with_flipped=forces['correct_flipped'])
+        vert_mult = options['relax force multiplier'] * sub.strength
+        for _ in range(steps):
+            displace = relax_forces(sub, strength, **forces)
+            sub.co[:sub.nmove] += displace * vert_mult[:, None]
+    stage('relax', relax)
+
+    ray = Ray(Point((0, 0, view_distance)), Direction((0, 0, -1)))
+    plane = Plane(Point((0.3, 0, 0)), Normal((1, 0, 0)))
+    stage('plane crawl', lambda _: rfsource.plane_intersection_crawl(ray, plane, walk_to_plane=True))
+
+    del rfsource, rftarget, accel, verts, edges, rffaces, brushed, vert_strength
+    remove_object(obj_source)
+    remove_object(obj_target)
+    return results
+
+
+##########################################################
+# baseline comparison
+
+def compare(report, baseline, tolerance, min_delta):
+    ''' prints comparison against baseline, returns list of (size, stage) that regressed '''
+    regressed = []
+    for (size, result) in report['sizes'].items():
+        base = baseline.get('sizes', {}).get(size)
+        if not base: continue
+        print(f'{size} faces')
+        for (name, t) in result['stages'].items():
+            t0 = base['stages'].get(name)
+            if t0 is None: continue
+            bad = t > t0 * (1 + tolerance) and (t - t0) > min_delta
+            if bad: regressed.append((size, name))
+            change = (t - t0) / t0 if t0 > 0 else 0.0
+            print(f'  {name:20s} {t0*1000:10.2f}ms -> {t*1000:10.2f}ms  {change*100:+7.1f}%{"  REGRESSED" if bad else ""}')
+    return regressed
+
+
+def main():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(prog='benchmark.py', description='Benchmark RetopoFlow hot paths on synthetic meshes (run with blender -b)')
+    parser.add_argument('--faces', type=int, nargs='+', default=[10000, 100000], help='source face counts to benchmark')
+    parser.add_argument('--target-faces', type=int, default=None, help='target face count (default: same as source)')
+    parser.add_argument('--stages', nargs='+', choices=stages, default=None, help='only run these stages')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per stage')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed runs per stage')
+    parser.add_argument('-o', '--output', default=None, help='write report as JSON (default: print)')
+    parser.add_argument('--baseline', default=None, help='JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown against baseline (fraction)')
+    parser.add_argument('--min-delta', type=float, default=0.001, help='ignore slowdowns smaller than this (seconds)')
+    args = parser.parse_args(argv)
+
+    report = {
+        'blender': bpy.app.version_string,
+        'source packed': options['source packed'],
+        'repeat': args.repeat,
+        'sizes': {},
+    }
+    for faces in args.faces:
+        target_faces = args.target_faces or faces
+        print(f'source {faces} faces, target {target_faces} faces')
+        report['sizes'][str(faces)] = {
+            'target faces': target_faces,
+            'stages': run_size(faces, target_faces, args),
+        }
+
+    if args.output:
+        with open(args.output, 'wt') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, 'rt') as f:
+            baseline = json.load(f)
+        regressed = compare(report, baseline, args.tolerance, args.min_delta)
+        if regressed:
+            print(f'{len(regressed)} stage(s) regressed: ' + ', '.join(f'{name} ({size})' for (size, name) in regressed))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
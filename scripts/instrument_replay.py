@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+
+'''
+Reads RetopoFlow instrumentation log (see retopoflow/rf/instrument_log.py),
+reports per-action timings, and rebuilds target at any action.
+
+    instrument_replay.py RetopoFlow_instrument.rfil                     # list sessions
+    instrument_replay.py RetopoFlow_instrument.rfil -s -1 --timings     # timings of last session
+    instrument_replay.py RetopoFlow_instrument.rfil -s 0 --at 25 -o mesh.json
+
+Runs outside of Blender; only needs NumPy.
+'''
+
+import os
+import json
+import argparse
+import importlib.util
+
+path_log = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'retopoflow', 'rf', 'instrument_log.py')
+spec = importlib.util.spec_from_file_location('instrument_log', path_log)
+instrument_log = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(instrument_log)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Read and replay RetopoFlow instrumentation log')
+    parser.add_argument('log', help='path to instrumentation log')
+    parser.add_argument('-s', '--session', type=int, default=None, help='session index (negative counts from end)')
+    parser.add_argument('--timings', action='store_true', help='print per-action timings of session')
+    parser.add_argument('--at', type=int, default=None, help='rebuild target after this action (record index)')
+    parser.add_argument('-o', '--output', default=None, help='write rebuilt target as JSON (same layout as RFTarget.to_json)')
+    args = parser.parse_args()
+
+    sessions = instrument_log.InstrumentLogReader(args.log).sessions()
+    if args.session is None:
+        for (i, records) in enumerate(sessions):
+            head = records[0]
+            name = head.action if head.kind == b'SESS' else '(unknown)'
+            print(f'session {i:3d}: {name}  {len(records) - 1} actions')
+        return
+
+    replay = instrument_log.InstrumentReplay(sessions[args.session])
+
+    if args.timings:
+        print(f'{"rec":>5s} {"action #":>8s} {"duration":>10s} {"record":>10s}  action')
+        for (i, index, action, duration, cost) in replay.timings():
+            duration = f'{duration*1000:8.1f}ms' if duration is not None else f'{"-":>10s}'
+            print(f'{i:5d} {index:8d} {duration} {cost*1000:8.2f}ms  {action}')
+        costs = [ t[4] for t in replay.timings() ]
+        if costs:
+            print(f'recording cost: total {sum(costs)*1000:0.1f}ms, max {max(costs)*1000:0.2f}ms')
+
+    if args.at is not None:
+        mesh = replay.mesh_at(args.at)
+        counts = f'{len(mesh["verts"])} verts, {len(mesh["edges"])} edges, {len(mesh["faces"])} faces'
+        print(f'record {args.at} ({replay.records[args.at].action}): {counts}')
+        if args.output:
+            with open(args.output, 'wt') as f:
+                json.dump(mesh, f)
+
+
+if __name__ == '__main__':
+    main()